@@ -0,0 +1,115 @@
+"""
+Export brut des événements analytics (CSV / JSON lines, gzip optionnel).
+
+Les lignes sont lues par values_list().iterator() (curseur côté serveur sous
+PostgreSQL) et écrites en streaming : la mémoire du worker ne dépend pas de la
+taille de la boutique. Un seul export à la fois par utilisateur : un verrou
+Redis est pris avant la première ligne et libéré à la fermeture de la réponse
+(ou à l'expiration du verrou si le worker meurt entre-temps).
+"""
+import logging
+import secrets
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from analytics.models import AnalyticsEvent
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = "analytics:export_lock"
+
+VENDOR_COLUMNS = (
+    ("id", "id"),
+    ("created_at", "created_at"),
+    ("event_type", "event_type"),
+    ("source", "source"),
+    ("business_id", "business_id"),
+    ("listing_id", "listing_id"),
+    ("metadata", "metadata"),
+    ("user_agent", "user_agent"),
+)
+# L'adresse IP des visiteurs n'est exportée que pour les admins
+ADMIN_COLUMNS = VENDOR_COLUMNS + (("ip_address", "ip_address"),)
+
+# Ne supprime le verrou que s'il appartient encore à cet export
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def lock_key(owner_id):
+    return f"{LOCK_PREFIX}:{owner_id}"
+
+
+def acquire_export_lock(owner_id):
+    """
+    Retourne une fonction de libération, ou None si un export est déjà en cours.
+    En cas d'indisponibilité de Redis, l'export est autorisé.
+    """
+    key = lock_key(owner_id)
+    token = secrets.token_hex(8)
+    timeout = getattr(settings, "ANALYTICS_EXPORT_LOCK_SECONDS", 30 * 60)
+    try:
+        conn = get_redis_connection("default")
+        if not conn.set(key, token, nx=True, ex=timeout):
+            return None
+    except RedisError as exc:
+        logger.warning("Analytics export lock unavailable for %s: %s", owner_id, exc)
+        return lambda: None
+
+    def release():
+        try:
+            conn.register_script(_RELEASE_SCRIPT)(keys=[key], args=[token])
+        except RedisError as exc:
+            logger.warning("Analytics export lock not released for %s: %s", owner_id, exc)
+
+    return release
+
+
+def _day_start(value, param):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"{param} doit être une date AAAA-MM-JJ")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_export_events(queryset, params):
+    """
+    Filtres : business, listing (ids), event_type, date_from / date_to
+    (AAAA-MM-JJ, bornes incluses). Lève ValueError pour une valeur invalide.
+    """
+    for param in ("business", "listing"):
+        value = params.get(param)
+        if value:
+            if not value.isdigit():
+                raise ValueError(f"{param} doit être un identifiant numérique")
+            queryset = queryset.filter(**{f"{param}_id": int(value)})
+
+    event_type = params.get("event_type")
+    if event_type:
+        if event_type not in dict(AnalyticsEvent.EVENT_TYPES):
+            raise ValueError(f"Type d'événement inconnu : {event_type}")
+        queryset = queryset.filter(event_type=event_type)
+
+    # Bornes en datetime (et non created_at__date) : l'index sur created_at reste utilisable
+    if params.get("date_from"):
+        queryset = queryset.filter(created_at__gte=_day_start(params["date_from"], "date_from"))
+    if params.get("date_to"):
+        queryset = queryset.filter(created_at__lt=_day_start(params["date_to"], "date_to") + timedelta(days=1))
+    return queryset
+
+
+def export_rows(queryset, columns, chunk_size):
+    return (
+        queryset.order_by("id")
+        .values_list(*(field for _, field in columns))
+        .iterator(chunk_size=chunk_size)
+    )
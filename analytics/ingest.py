@@ -0,0 +1,111 @@
+"""
+Filtre d'ingestion des événements analytics (robots + doublons).
+
+Le filtre passe avant toute requête SQL : un événement rejeté ne coûte qu'un
+aller-retour Redis et n'alimente ni la table ni les agrégations.
+"""
+import hashlib
+import logging
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+DEDUP_PREFIX = "analytics:dedup"
+STATS_PREFIX = "analytics:ingest"
+STATS_TTL = 60 * 60 * 24 * 30
+
+REASON_BOT = "bot"
+REASON_DUPLICATE = "duplicate"
+ACCEPTED = "accepted"
+
+BOT_USER_AGENT_TOKENS = (
+    "crawl", "spider", "slurp", "scrapy", "curl/", "wget/",
+    "python-requests", "python-urllib", "httpclient", "okhttp", "go-http-client",
+    "headlesschrome", "phantomjs", "lighthouse", "pingdom", "uptimerobot",
+    "facebookexternalhit", "whatsapp/", "telegrambot",
+)
+
+# Compilé une seule fois au chargement du module.
+# "bot" seul est borné pour ne pas attraper les téléphones CUBOT.
+BOT_USER_AGENT_RE = re.compile(
+    r"(?<!cu)bot\b|" + "|".join(re.escape(token) for token in BOT_USER_AGENT_TOKENS),
+    re.IGNORECASE,
+)
+
+
+def is_bot_user_agent(user_agent):
+    if not user_agent:
+        return False
+    return BOT_USER_AGENT_RE.search(user_agent) is not None
+
+
+def _dedup_key(*, event_type, ip_address, user_agent, target):
+    raw = f"{ip_address or ''}|{user_agent or ''}|{event_type}|{target or ''}"
+    return f"{DEDUP_PREFIX}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+def _stats_key(day=None):
+    return f"{STATS_PREFIX}:{(day or timezone.localdate()):%Y%m%d}"
+
+
+def filter_event(*, event_type, ip_address, user_agent, listing_slug=None, business_slug=None):
+    """
+    Retourne None si l'événement doit être enregistré, sinon la raison du rejet.
+    En cas d'indisponibilité de Redis, l'événement est accepté.
+    """
+    event = {"event_type": event_type, "listing_slug": listing_slug, "business_slug": business_slug}
+    return filter_events([event], ip_address=ip_address, user_agent=user_agent)[0]
+
+
+def filter_events(events, *, ip_address, user_agent):
+    """
+    Version lot de filter_event : un seul pipeline Redis pour tous les
+    événements d'un même client. Retourne une raison (ou None) par événement.
+    """
+    is_bot = is_bot_user_agent(user_agent)
+    reasons = [REASON_BOT if is_bot else None] * len(events)
+
+    try:
+        conn = get_redis_connection("default")
+        if not is_bot:
+            window = getattr(settings, "ANALYTICS_DEDUP_WINDOW", 30)
+            pipe = conn.pipeline(transaction=False)
+            for event in events:
+                key = _dedup_key(
+                    event_type=event["event_type"],
+                    ip_address=ip_address,
+                    user_agent=user_agent,
+                    target=event.get("listing_slug") or event.get("business_slug"),
+                )
+                pipe.set(key, 1, nx=True, ex=window)
+            reasons = [None if created else REASON_DUPLICATE for created in pipe.execute()]
+
+        pipe = conn.pipeline(transaction=False)
+        for reason, count in Counter(reasons).items():
+            pipe.hincrby(_stats_key(), reason or ACCEPTED, count)
+        pipe.expire(_stats_key(), STATS_TTL)
+        pipe.execute()
+    except RedisError as exc:
+        logger.warning("Analytics ingest filter unavailable: %s", exc)
+
+    return reasons
+
+
+def get_ingest_stats(day=None):
+    try:
+        raw = get_redis_connection("default").hgetall(_stats_key(day))
+    except RedisError as exc:
+        logger.warning("Analytics ingest stats unavailable: %s", exc)
+        raw = {}
+
+    stats = {ACCEPTED: 0, REASON_BOT: 0, REASON_DUPLICATE: 0}
+    for field, value in raw.items():
+        field = field.decode() if isinstance(field, bytes) else field
+        stats[field] = int(value)
+    return stats
@@ -0,0 +1,32 @@
+# Generated by Django 5.0 on 2026-10-19 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_alter_analyticsevent_event_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUniqueVisitors',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('listing', 'Listing'), ('business', 'Business')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('day', models.DateField()),
+                ('unique_visitors', models.PositiveIntegerField(default=0)),
+                ('sketch', models.BinaryField(blank=True, default=b'')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyuniquevisitors',
+            constraint=models.UniqueConstraint(fields=('scope', 'object_id', 'day'), name='analytics_unique_visitors_scope_object_day'),
+        ),
+    ]
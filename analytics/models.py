@@ -44,3 +44,33 @@ class AnalyticsEvent(models.Model):
     def __str__(self):
         target = self.listing or self.business or "unknown"
         return f"{self.event_type} from {self.source} on {target}"
+
+
+class DailyUniqueVisitors(models.Model):
+    """
+    Sketch HyperLogLog journalier (listing ou business) persisté à la clôture.
+    """
+    SCOPES = [
+        ("listing", "Listing"),
+        ("business", "Business"),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPES)
+    object_id = models.PositiveBigIntegerField()
+    day = models.DateField()
+    unique_visitors = models.PositiveIntegerField(default=0)
+    # Sérialisation Redis (DUMP) du sketch pour pouvoir refaire des unions
+    sketch = models.BinaryField(blank=True, default=b"")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["scope", "object_id", "day"],
+                name="analytics_unique_visitors_scope_object_day",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.object_id} {self.day} ({self.unique_visitors})"
@@ -0,0 +1,9 @@
+from rest_framework.parsers import JSONParser
+
+
+class BeaconJSONParser(JSONParser):
+    """
+    navigator.sendBeacon envoie une chaîne en text/plain (type "safelisted",
+    donc sans preflight CORS) : on le lit comme du JSON.
+    """
+    media_type = "text/plain"
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 
@@ -9,3 +10,13 @@ class AnalyticsEventCreateSerializer(serializers.Serializer):
     listing_slug = serializers.SlugField(required=False, allow_blank=True)
     business_slug = serializers.SlugField(required=False, allow_blank=True)
     metadata = serializers.DictField(required=False)
+
+
+class AnalyticsEventBatchSerializer(serializers.Serializer):
+    events = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_events(self, value):
+        max_events = getattr(settings, "ANALYTICS_BATCH_MAX_EVENTS", 50)
+        if len(value) > max_events:
+            raise serializers.ValidationError(f"{max_events} événements maximum par lot.")
+        return value
@@ -1,17 +1,27 @@
 from datetime import timedelta
 
+from django.db import IntegrityError, transaction
 from django.db.models import Count, Q
 from django.utils import timezone
 
 from analytics.models import AnalyticsEvent
+from analytics.sketches import (
+    SCOPE_BUSINESS,
+    SCOPE_LISTING,
+    get_unique_views,
+    record_unique_visit,
+    record_unique_visits,
+)
+from core.utils.slug_resolver import business_slugs, listing_slugs
 from listing.models import Listing
+from listing.services.trending import record_engagements
 
 
 def create_analytics_event(*, event_type, source, listing=None, business=None, metadata=None, ip_address=None, user_agent=""):
     if listing and not business:
         business = listing.business
 
-    return AnalyticsEvent.objects.create(
+    event = AnalyticsEvent.objects.create(
         event_type=event_type,
         source=source,
         listing=listing,
@@ -20,6 +30,78 @@ def create_analytics_event(*, event_type, source, listing=None, business=None, m
         ip_address=ip_address,
         user_agent=(user_agent or "")[:255],
     )
+    record_unique_visit(
+        event_type=event_type,
+        listing_id=event.listing_id,
+        business_id=event.business_id,
+        ip_address=ip_address,
+        user_agent=event.user_agent,
+    )
+    record_engagements([(event.listing_id, event.event_type)])
+    return event
+
+
+def create_analytics_events_bulk(events, *, ip_address=None, user_agent=""):
+    """
+    Enregistre un lot d'événements déjà validés. Les slugs sont résolus par
+    le cache slug -> id (aucune lecture SQL dans le cas courant), puis un seul
+    INSERT.
+    """
+    user_agent = (user_agent or "")[:255]
+    listing_ids, business_ids = _resolve_event_slugs(events)
+
+    try:
+        with transaction.atomic():
+            created = AnalyticsEvent.objects.bulk_create(
+                _build_events(events, listing_ids, business_ids, ip_address, user_agent)
+            )
+    except IntegrityError:
+        # Id périmé dans le cache (annonce supprimée entre-temps) : on relit la base
+        listing_slugs.invalidate(*listing_ids)
+        business_slugs.invalidate(*business_ids)
+        listing_ids, business_ids = _resolve_event_slugs(events)
+        created = AnalyticsEvent.objects.bulk_create(
+            _build_events(events, listing_ids, business_ids, ip_address, user_agent)
+        )
+
+    record_unique_visits([
+        {
+            "event_type": event.event_type,
+            "listing_id": event.listing_id,
+            "business_id": event.business_id,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+        }
+        for event in created
+    ])
+    record_engagements((event.listing_id, event.event_type) for event in created)
+    return created
+
+
+def _resolve_event_slugs(events):
+    listing_ids = listing_slugs.resolve(event.get("listing_slug") for event in events)
+    business_ids = business_slugs.resolve(event.get("business_slug") for event in events)
+    return listing_ids, business_ids
+
+
+def _build_events(events, listing_ids, business_ids, ip_address, user_agent):
+    objects = []
+    for event in events:
+        listing_id, business_id = listing_ids.get(event.get("listing_slug"), (None, None))
+        if business_id is None:
+            business_id = business_ids.get(event.get("business_slug"))
+        objects.append(
+            AnalyticsEvent(
+                event_type=event["event_type"],
+                source=event["source"],
+                listing_id=listing_id,
+                business_id=business_id,
+                metadata=event.get("metadata") or {},
+                ip_address=ip_address,
+                user_agent=user_agent,
+            )
+        )
+    return objects
 
 
 def get_vendor_analytics_summary(user):
@@ -28,6 +110,7 @@ def get_vendor_analytics_summary(user):
         return {
             "active_listings": 0,
             "listing_views_total": 0,
+            "unique_views": 0,
             "business_views_total": 0,
             "whatsapp_clicks_total": 0,
             "whatsapp_clicks_7d": 0,
@@ -64,10 +147,13 @@ def get_vendor_analytics_summary(user):
         .order_by("-whatsapp_clicks", "-updated_at")[:5]
     )
     whatsapp_clicks_total = whatsapp_events.count()
+    top_listings = list(top_listings)
+    listing_unique_views = get_unique_views(SCOPE_LISTING, [listing.id for listing in top_listings])
 
     return {
         "active_listings": Listing.objects.filter(business=business, is_active=True).count(),
         "listing_views_total": listing_views_total,
+        "unique_views": get_unique_views(SCOPE_BUSINESS, [business.id]).get(business.id, 0),
         "business_views_total": business_views_total,
         "whatsapp_clicks_total": whatsapp_clicks_total,
         "whatsapp_clicks_7d": whatsapp_events.filter(created_at__gte=since_7d).count(),
@@ -79,6 +165,7 @@ def get_vendor_analytics_summary(user):
                 "slug": listing.slug,
                 "title": listing.title,
                 "listing_views": listing.listing_views,
+                "unique_views": listing_unique_views.get(listing.id, 0),
                 "whatsapp_clicks": listing.whatsapp_clicks,
             }
             for listing in top_listings
@@ -0,0 +1,228 @@
+"""
+Comptage des visiteurs uniques par HyperLogLog (Redis).
+
+Chaque listing / business a un sketch journalier (persisté en base à la
+clôture) et un sketch cumulatif. Un sketch HLL occupe au plus ~12 Ko quel que
+soit le trafic, pour une erreur standard de ~0.81 %.
+"""
+import logging
+from datetime import timedelta
+
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from analytics.models import DailyUniqueVisitors
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "analytics:hll"
+# Marge pour que la tâche de clôture puisse rattraper un jour manqué
+DAILY_KEY_TTL = 60 * 60 * 24 * 3
+# Objets sans aucun sketch persisté : évite une requête par lecture
+EMPTY_MARKER_TTL = 60 * 60 * 6
+
+SCOPE_LISTING = "listing"
+SCOPE_BUSINESS = "business"
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def daily_key(scope, object_id, day):
+    return f"{KEY_PREFIX}:{scope}:{object_id}:{day:%Y%m%d}"
+
+
+def total_key(scope, object_id):
+    return f"{KEY_PREFIX}:{scope}:{object_id}:total"
+
+
+def empty_marker_key(scope, object_id):
+    return f"{total_key(scope, object_id)}:empty"
+
+
+def visitor_fingerprint(ip_address=None, user_agent=""):
+    if not ip_address and not user_agent:
+        return None
+    return f"{ip_address or ''}|{user_agent or ''}"
+
+
+def record_unique_visit(*, event_type, listing_id=None, business_id=None, ip_address=None, user_agent=""):
+    """
+    Ajoute le visiteur aux sketches concernés. Seules les vues sont comptées.
+    """
+    record_unique_visits([
+        {
+            "event_type": event_type,
+            "listing_id": listing_id,
+            "business_id": business_id,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+        }
+    ])
+
+
+def record_unique_visits(visits):
+    """
+    Version lot de record_unique_visit (un seul pipeline Redis).
+    """
+    today = timezone.localdate()
+    targets = []
+    for visit in visits:
+        if visit["event_type"] not in ("listing_view", "business_view"):
+            continue
+        visitor = visitor_fingerprint(visit.get("ip_address"), visit.get("user_agent"))
+        if visitor is None:
+            continue
+        if visit["event_type"] == "listing_view" and visit.get("listing_id"):
+            targets.append((SCOPE_LISTING, visit["listing_id"], visitor))
+        if visit.get("business_id"):
+            targets.append((SCOPE_BUSINESS, visit["business_id"], visitor))
+
+    if not targets:
+        return
+
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for scope, object_id, visitor in targets:
+            key = daily_key(scope, object_id, today)
+            pipe.pfadd(key, visitor)
+            pipe.expire(key, DAILY_KEY_TTL)
+            pipe.pfadd(total_key(scope, object_id), visitor)
+        pipe.execute()
+    except RedisError as exc:
+        logger.warning("HLL record failed for %s visits: %s", len(targets), exc)
+
+
+def get_unique_views(scope, object_ids):
+    """
+    Retourne {object_id: visiteurs uniques cumulés} en un seul aller-retour.
+    """
+    object_ids = [object_id for object_id in object_ids if object_id]
+    if not object_ids:
+        return {}
+
+    counts = {}
+    try:
+        conn = _redis()
+        pipe = conn.pipeline(transaction=False)
+        for object_id in object_ids:
+            pipe.exists(total_key(scope, object_id), empty_marker_key(scope, object_id))
+            pipe.pfcount(total_key(scope, object_id))
+        results = pipe.execute()
+
+        missing = []
+        for index, object_id in enumerate(object_ids):
+            exists, count = results[2 * index], results[2 * index + 1]
+            counts[object_id] = count
+            if not exists:
+                missing.append(object_id)
+
+        if missing:
+            # Redis a été vidé : on reconstruit le cumul depuis les sketches persistés
+            persisted = set(
+                DailyUniqueVisitors.objects.filter(scope=scope, object_id__in=missing)
+                .exclude(sketch=b"")
+                .order_by()
+                .values_list("object_id", flat=True)
+                .distinct()
+            )
+            for object_id in persisted:
+                counts[object_id] = rebuild_total_sketch(scope, object_id)
+            never_viewed = [object_id for object_id in missing if object_id not in persisted]
+            counts.update(_mark_empty_totals(conn, scope, never_viewed))
+    except RedisError as exc:
+        logger.warning("HLL count failed for %s: %s", scope, exc)
+        return _persisted_unique_views(scope, object_ids)
+
+    return counts
+
+
+def _persisted_unique_views(scope, object_ids):
+    # Approximation sans Redis : meilleur jour connu (borne basse)
+    counts = dict.fromkeys(object_ids, 0)
+    rows = DailyUniqueVisitors.objects.filter(scope=scope, object_id__in=object_ids)
+    for row in rows.only("object_id", "unique_visitors"):
+        counts[row.object_id] = max(counts[row.object_id], row.unique_visitors)
+    return counts
+
+
+def _open_day_keys(scope, object_id):
+    # Les journées pas encore clôturées sont encore dans Redis
+    today = timezone.localdate()
+    return [daily_key(scope, object_id, today - timedelta(days=offset)) for offset in range(2)]
+
+
+def _mark_empty_totals(conn, scope, object_ids):
+    """
+    Objets sans sketch persisté : cumul limité aux journées ouvertes, et un
+    marqueur temporaire pour ne pas réinterroger la base à chaque lecture.
+    """
+    if not object_ids:
+        return {}
+    pipe = conn.pipeline(transaction=False)
+    for object_id in object_ids:
+        destination = total_key(scope, object_id)
+        pipe.pfmerge(destination, destination, *_open_day_keys(scope, object_id))
+        pipe.set(empty_marker_key(scope, object_id), 1, ex=EMPTY_MARKER_TTL)
+        pipe.pfcount(destination)
+    results = pipe.execute()
+    return {object_id: results[3 * index + 2] for index, object_id in enumerate(object_ids)}
+
+
+def rebuild_total_sketch(scope, object_id):
+    """
+    Recrée le sketch cumulatif par union (PFMERGE) des sketches journaliers.
+    """
+    sketches = list(
+        DailyUniqueVisitors.objects.filter(scope=scope, object_id=object_id)
+        .exclude(sketch=b"")
+        .values_list("sketch", flat=True)
+    )
+    if not sketches:
+        return 0
+
+    conn = _redis()
+    destination = total_key(scope, object_id)
+    tmp_keys = [f"{destination}:rebuild:{index}" for index in range(len(sketches))]
+    pipe = conn.pipeline(transaction=True)
+    for tmp_key, sketch in zip(tmp_keys, sketches):
+        pipe.restore(tmp_key, 60 * 1000, bytes(sketch), replace=True)
+    pipe.pfmerge(destination, destination, *tmp_keys, *_open_day_keys(scope, object_id))
+    pipe.delete(*tmp_keys)
+    pipe.pfcount(destination)
+    return pipe.execute()[-1]
+
+
+def persist_daily_sketches(day=None):
+    """
+    Clôture d'une journée : copie les sketches Redis en base puis les libère.
+    """
+    day = day or timezone.localdate() - timedelta(days=1)
+    conn = _redis()
+    persisted = 0
+
+    for scope in (SCOPE_LISTING, SCOPE_BUSINESS):
+        pattern = f"{KEY_PREFIX}:{scope}:*:{day:%Y%m%d}"
+        for key in conn.scan_iter(match=pattern, count=500):
+            key = key.decode() if isinstance(key, bytes) else key
+            object_id = int(key.split(":")[3])
+
+            pipe = conn.pipeline(transaction=False)
+            pipe.dump(key)
+            pipe.pfcount(key)
+            sketch, count = pipe.execute()
+            if sketch is None:
+                continue
+
+            DailyUniqueVisitors.objects.update_or_create(
+                scope=scope,
+                object_id=object_id,
+                day=day,
+                defaults={"unique_visitors": count, "sketch": sketch},
+            )
+            conn.delete(key)
+            persisted += 1
+
+    return persisted
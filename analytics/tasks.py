@@ -0,0 +1,10 @@
+from celery import shared_task
+
+from analytics.sketches import persist_daily_sketches
+
+
+@shared_task
+def persist_unique_visitors_task():
+    # Clôture de la veille : sketches HLL Redis -> DailyUniqueVisitors
+    persisted = persist_daily_sketches()
+    return f"{persisted} sketches de visiteurs uniques persistés"
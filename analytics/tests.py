@@ -1,11 +1,22 @@
 import datetime
+import gzip
+import json
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from redis.exceptions import RedisError
 from rest_framework.test import APITestCase
 
-from analytics.models import AnalyticsEvent
+from analytics.models import AnalyticsEvent, DailyUniqueVisitors
+from analytics.services import create_analytics_event
+from analytics.sketches import SCOPE_LISTING, get_unique_views, persist_daily_sketches
+from core.utils.rate_limit import reset_local_state
+from core.utils.slug_resolver import business_slugs, listing_slugs
 from listing.models import Listing
 
 User = get_user_model()
@@ -53,6 +64,9 @@ class AnalyticsEventModelTest(TestCase):
 
 class AnalyticsAPITest(APITestCase):
     def setUp(self):
+        cache.clear()
+        listing_slugs.local.clear()
+        business_slugs.local.clear()
         self.user = User.objects.create_user(
             phone_whatsapp="243899530506",
             password="testpassword123",
@@ -182,3 +196,285 @@ class AnalyticsAPITest(APITestCase):
         self.assertEqual(data["top_listings"][0]["slug"], self.listing.slug)
         self.assertEqual(data["top_listings"][0]["listing_views"], 2)
         self.assertEqual(data["top_listings"][0]["whatsapp_clicks"], 3)
+
+    def test_unique_views_ignore_repeated_visitor(self):
+        for ip_address in ["127.0.0.1", "127.0.0.1", "127.0.0.1", "10.0.0.2"]:
+            create_analytics_event(
+                event_type="listing_view",
+                source="listing_detail",
+                listing=self.listing,
+                ip_address=ip_address,
+                user_agent="Mozilla/5.0",
+            )
+
+        self.client.force_authenticate(user=self.user)
+        data = self.client.get("/api/analytics/vendor-summary/").data
+        self.assertEqual(data["listing_views_total"], 4)
+        self.assertEqual(data["unique_views"], 2)
+        self.assertEqual(data["top_listings"][0]["unique_views"], 2)
+
+        detail = self.client.get(f"/api/v2/public/listings/{self.listing.slug}/").data
+        self.assertEqual(detail["unique_views"], 2)
+
+    def test_unique_views_rebuilt_from_persisted_sketches(self):
+        self.client.post(
+            "/api/analytics/events/",
+            {"event_type": "listing_view", "source": "listing_detail", "listing_slug": self.listing.slug},
+            format="json",
+        )
+
+        self.assertEqual(persist_daily_sketches(timezone.localdate()), 2)
+        self.assertEqual(
+            DailyUniqueVisitors.objects.get(scope=SCOPE_LISTING, object_id=self.listing.id).unique_visitors,
+            1,
+        )
+
+        cache.clear()
+        self.assertEqual(get_unique_views(SCOPE_LISTING, [self.listing.id]), {self.listing.id: 1})
+
+    def test_unique_views_without_sketches_queried_once(self):
+        other = Listing.objects.create(
+            business=self.business,
+            title="Samsung A54",
+            description="Neuf",
+            price=300.00,
+            currency="USD",
+            category="Phones",
+        )
+        ids = [self.listing.id, other.id]
+
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(get_unique_views(SCOPE_LISTING, ids), dict.fromkeys(ids, 0))
+        self.assertEqual(len(first), 1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unique_views(SCOPE_LISTING, ids), dict.fromkeys(ids, 0))
+
+    def test_unique_views_fall_back_when_rebuild_fails(self):
+        create_analytics_event(
+            event_type="listing_view",
+            source="listing_detail",
+            listing=self.listing,
+            ip_address="10.0.0.3",
+            user_agent="Mozilla/5.0",
+        )
+        persist_daily_sketches(timezone.localdate())
+        cache.clear()
+
+        with patch("analytics.sketches.rebuild_total_sketch", side_effect=RedisError("down")):
+            self.assertEqual(get_unique_views(SCOPE_LISTING, [self.listing.id]), {self.listing.id: 1})
+
+    def test_duplicate_event_dropped_within_window(self):
+        payload = {
+            "event_type": "listing_view",
+            "source": "listing_detail",
+            "listing_slug": self.listing.slug,
+        }
+
+        first = self.client.post("/api/analytics/events/", payload, format="json", HTTP_USER_AGENT="Mozilla/5.0")
+        second = self.client.post("/api/analytics/events/", payload, format="json", HTTP_USER_AGENT="Mozilla/5.0")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data["reason"], "duplicate")
+        self.assertEqual(AnalyticsEvent.objects.count(), 1)
+
+    def test_forwarded_clients_counted_separately(self):
+        payload = {
+            "event_type": "listing_view",
+            "source": "listing_detail",
+            "listing_slug": self.listing.slug,
+        }
+
+        first = self.client.post(
+            "/api/analytics/events/", payload, format="json",
+            HTTP_USER_AGENT="Mozilla/5.0", HTTP_X_FORWARDED_FOR="41.243.0.10",
+        )
+        second = self.client.post(
+            "/api/analytics/events/", payload, format="json",
+            HTTP_USER_AGENT="Mozilla/5.0", HTTP_X_FORWARDED_FOR="41.243.0.11",
+        )
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(
+            sorted(AnalyticsEvent.objects.values_list("ip_address", flat=True)),
+            ["41.243.0.10", "41.243.0.11"],
+        )
+        self.assertEqual(get_unique_views(SCOPE_LISTING, [self.listing.id]), {self.listing.id: 2})
+
+    def test_bot_user_agent_dropped(self):
+        response = self.client.post(
+            "/api/analytics/events/",
+            {"event_type": "listing_view", "source": "listing_detail", "listing_slug": self.listing.slug},
+            format="json",
+            HTTP_USER_AGENT="Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+        )
+
+        self.assertEqual(response.data["reason"], "bot")
+        self.assertEqual(AnalyticsEvent.objects.count(), 0)
+
+        admin = User.objects.create_superuser(phone_whatsapp="243800000000", password="adminpassword123")
+        self.client.force_authenticate(user=admin)
+        stats = self.client.get("/api/analytics/ingest-stats/").data
+        self.assertEqual(stats["bot"], 1)
+        self.assertEqual(stats["duplicate"], 0)
+
+    def test_batch_events_resolved_and_inserted_in_bulk(self):
+        events = [
+            {"event_type": "listing_view", "source": "listing_card", "listing_slug": self.listing.slug},
+            {"event_type": "whatsapp_click", "source": "listing_detail", "listing_slug": self.listing.slug},
+            {"event_type": "business_view", "source": "business_page", "business_slug": self.business.slug},
+            {"event_type": "listing_view", "source": "listing_card", "listing_slug": self.listing.slug},
+            {"event_type": "invalid_type", "source": "listing_card"},
+        ]
+
+        # 2 requêtes IN (listings, businesses) + 1 bulk INSERT
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/analytics/events/batch/", events, format="json", HTTP_USER_AGENT="Mozilla/5.0"
+            )
+        statements = [query["sql"].split()[0] for query in queries.captured_queries]
+        self.assertEqual(statements.count("SELECT"), 2)
+        self.assertEqual(statements.count("INSERT"), 1)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["accepted"], 3)
+        self.assertEqual(response.data["dropped"], 1)
+        self.assertEqual(response.data["invalid"], 1)
+        self.assertEqual(AnalyticsEvent.objects.filter(listing=self.listing, business=self.business).count(), 2)
+        self.assertEqual(AnalyticsEvent.objects.filter(event_type="business_view", business=self.business).count(), 1)
+
+    def test_batch_events_accept_send_beacon_payload(self):
+        body = json.dumps({"events": [
+            {"event_type": "share_click", "source": "listing_detail", "listing_slug": self.listing.slug},
+        ]})
+
+        response = self.client.post(
+            "/api/analytics/events/batch/", body, content_type="text/plain;charset=UTF-8",
+            HTTP_USER_AGENT="Mozilla/5.0",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(AnalyticsEvent.objects.get().event_type, "share_click")
+
+    @override_settings(ANALYTICS_BATCH_MAX_EVENTS=2)
+    def test_batch_events_size_limit(self):
+        event = {"event_type": "listing_view", "source": "listing_card", "listing_slug": self.listing.slug}
+
+        response = self.client.post("/api/analytics/events/batch/", [event] * 3, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(AnalyticsEvent.objects.count(), 0)
+
+    def test_event_slugs_resolved_from_cache(self):
+        payload = {"event_type": "whatsapp_click", "source": "listing_card", "listing_slug": self.listing.slug}
+        self.client.post("/api/analytics/events/", payload, format="json", HTTP_USER_AGENT="Mozilla/5.0")
+
+        listing_slugs.local.clear()  # autre worker : seul Redis est chaud
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/analytics/events/", payload, format="json", HTTP_USER_AGENT="Mozilla/5.0 (iPhone)"
+            )
+
+        self.assertEqual(response.status_code, 201)
+        statements = [query["sql"].split()[0] for query in queries.captured_queries]
+        self.assertNotIn("SELECT", statements)
+        self.assertEqual(AnalyticsEvent.objects.filter(listing=self.listing, business=self.business).count(), 2)
+
+    def test_listing_slug_invalidated_on_delete(self):
+        self.assertEqual(listing_slugs.resolve_one(self.listing.slug), (self.listing.id, self.business.id))
+
+        self.listing.delete()
+
+        self.assertIsNone(listing_slugs.resolve_one("iphone-13-pro"))
+
+    def test_previous_slugs_invalidated_on_rename(self):
+        old_listing_slug, old_business_slug = self.listing.slug, self.business.slug
+        self.assertIsNotNone(listing_slugs.resolve_one(old_listing_slug))
+        self.assertEqual(business_slugs.resolve_one(old_business_slug), self.business.id)
+
+        self.listing.slug = "iphone-13-pro-max"
+        self.listing.save()
+        self.business.name = "Boutique Renommee"
+        self.business.save()
+
+        self.assertIsNone(listing_slugs.resolve_one(old_listing_slug))
+        self.assertIsNone(business_slugs.resolve_one(old_business_slug))
+        listing_slugs.local.clear()  # autre worker : seul Redis est chaud
+        business_slugs.local.clear()
+        self.assertIsNone(listing_slugs.resolve_one(old_listing_slug))
+        self.assertIsNone(business_slugs.resolve_one(old_business_slug))
+        self.assertEqual(business_slugs.resolve_one("boutique-renommee"), self.business.id)
+
+    @override_settings(RATE_LIMITS={"analytics_batch_ip": "2/m"})
+    def test_batch_ingest_throttled_per_ip(self):
+        reset_local_state()
+        self.addCleanup(reset_local_state)
+        event = {"event_type": "listing_view", "source": "listing_card", "listing_slug": self.listing.slug}
+
+        statuses = [
+            self.client.post("/api/analytics/events/batch/", [event], format="json", REMOTE_ADDR=ip).status_code
+            for ip in ("10.0.0.1", "10.0.0.1", "10.0.0.1", "10.0.0.2")
+        ]
+
+        self.assertEqual(statuses, [201, 201, 429, 201])
+
+
+class AnalyticsExportTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(phone_whatsapp="243899530506", password="testpassword123")
+        self.business = self.user.business
+        self.listing = Listing.objects.create(
+            business=self.business, title="iPhone 13 Pro", price=1200, currency="USD", category="Phones",
+        )
+        other = User.objects.create_user(phone_whatsapp="243899530507", password="testpassword123")
+        for event_type in ("listing_view", "listing_view", "whatsapp_click"):
+            create_analytics_event(event_type=event_type, source="listing_card", listing=self.listing, ip_address="10.0.0.1")
+        create_analytics_event(event_type="listing_view", source="listing_card", business=other.business)
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params):
+        response = self.client.get("/api/analytics/events/export/", params)
+        content = b"".join(response.streaming_content) if response.streaming else b""
+        return response, content
+
+    def test_vendor_exports_own_events_without_ip(self):
+        response, content = self.export(event_type="listing_view", date_from=f"{timezone.localdate():%Y-%m-%d}")
+        lines = content.decode().splitlines()
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(len(lines), 3)
+        self.assertNotIn("ip_address", lines[0])
+        self.assertTrue(all(f",{self.business.id},{self.listing.id}," in line for line in lines[1:]))
+
+    def test_jsonl_gzip_export_and_filters(self):
+        response, content = self.export(output="jsonl", gzip="1", listing=str(self.listing.id))
+        rows = [json.loads(line) for line in gzip.decompress(content).decode().splitlines()]
+        empty, _ = self.export(date_to="2020-01-01")
+        invalid, _ = self.export(event_type="purchase")
+
+        self.assertTrue(response["Content-Disposition"].endswith('.jsonl.gz"'))
+        self.assertEqual(sorted(row["event_type"] for row in rows), ["listing_view", "listing_view", "whatsapp_click"])
+        self.assertEqual(empty.status_code, 200)
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_admin_export_includes_ip_and_filters_business(self):
+        self.client.force_authenticate(User.objects.create_user(phone_whatsapp="33600000000", password="x", is_staff=True))
+
+        _, content = self.export(output="jsonl", business=str(self.business.id))
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["ip_address"], "10.0.0.1")
+
+    def test_single_export_per_vendor(self):
+        running = self.client.get("/api/analytics/events/export/")
+        blocked = self.client.get("/api/analytics/events/export/")
+        running.close()
+        after, _ = self.export()
+
+        self.assertEqual(blocked.status_code, 429)
+        self.assertIn("error", blocked.data)
+        self.assertEqual(after.status_code, 200)
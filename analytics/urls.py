@@ -1,9 +1,18 @@
 from django.urls import path
 
-from analytics.views import AnalyticsEventCreateView, VendorAnalyticsSummaryView
+from analytics.views import (
+    AnalyticsEventBatchCreateView,
+    AnalyticsEventCreateView,
+    AnalyticsEventExportView,
+    AnalyticsIngestStatsView,
+    VendorAnalyticsSummaryView,
+)
 
 
 urlpatterns = [
     path("events/", AnalyticsEventCreateView.as_view(), name="analytics-event-create"),
+    path("events/batch/", AnalyticsEventBatchCreateView.as_view(), name="analytics-event-batch-create"),
+    path("events/export/", AnalyticsEventExportView.as_view(), name="analytics-event-export"),
+    path("ingest-stats/", AnalyticsIngestStatsView.as_view(), name="analytics-ingest-stats"),
     path("vendor-summary/", VendorAnalyticsSummaryView.as_view(), name="vendor-analytics-summary"),
 ]
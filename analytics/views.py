@@ -1,49 +1,143 @@
-from rest_framework import permissions
+from django.utils import timezone
+from rest_framework import permissions, status
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from analytics.serializers import AnalyticsEventCreateSerializer
-from analytics.services import create_analytics_event, get_vendor_analytics_summary
-from base_api.models import Business
-from listing.models import Listing
+from analytics.export import ADMIN_COLUMNS, VENDOR_COLUMNS, acquire_export_lock, export_rows, filter_export_events
+from analytics.ingest import filter_event, filter_events, get_ingest_stats
+from analytics.parsers import BeaconJSONParser
+from analytics.serializers import AnalyticsEventBatchSerializer, AnalyticsEventCreateSerializer
+from analytics.models import AnalyticsEvent
+from analytics.services import create_analytics_events_bulk, get_vendor_analytics_summary
+from base_api.authentication import request_business_id
+from core.utils.rate_limit import client_ip, throttle
+from core.utils.streaming_export import CHUNK_SIZE, EXPORT_FORMATS, export_response
 
 
 class AnalyticsEventCreateView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [throttle("analytics_event_ip")]
 
     def post(self, request):
         serializer = AnalyticsEventCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
+        ip_address = client_ip(request)
+        user_agent = request.META.get("HTTP_USER_AGENT", "")
 
-        listing = None
-        business = None
-
-        listing_slug = data.get("listing_slug")
-        if listing_slug:
-            listing = Listing.objects.select_related("business").filter(slug=listing_slug).first()
-            if listing:
-                business = listing.business
-
-        business_slug = data.get("business_slug")
-        if business_slug and business is None:
-            business = Business.objects.filter(slug=business_slug).first()
-
-        create_analytics_event(
+        dropped = filter_event(
             event_type=data["event_type"],
-            source=data["source"],
-            listing=listing,
-            business=business,
-            metadata=data.get("metadata", {}),
-            ip_address=request.META.get("REMOTE_ADDR"),
-            user_agent=request.META.get("HTTP_USER_AGENT", ""),
+            ip_address=ip_address,
+            user_agent=user_agent,
+            listing_slug=data.get("listing_slug"),
+            business_slug=data.get("business_slug"),
         )
+        if dropped:
+            # 200 pour que le client ne réessaie pas
+            return Response({"status": "dropped", "reason": dropped}, status=200)
+
+        # Slugs résolus via le cache slug -> id : pas de lecture SQL en temps normal
+        create_analytics_events_bulk([data], ip_address=ip_address, user_agent=user_agent)
 
         return Response({"status": "accepted"}, status=201)
 
 
+class AnalyticsEventBatchCreateView(APIView):
+    """
+    Lot d'événements (file d'attente côté client, navigator.sendBeacon).
+    Accepte une liste JSON ou {"events": [...]}.
+    """
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [throttle("analytics_batch_ip")]
+    parser_classes = [JSONParser, BeaconJSONParser]
+
+    def post(self, request):
+        payload = request.data
+        if isinstance(payload, list):
+            payload = {"events": payload}
+
+        batch = AnalyticsEventBatchSerializer(data=payload)
+        batch.is_valid(raise_exception=True)
+
+        # Un événement invalide n'invalide pas tout le lot
+        valid_events = []
+        invalid = 0
+        for raw_event in batch.validated_data["events"]:
+            serializer = AnalyticsEventCreateSerializer(data=raw_event)
+            if serializer.is_valid():
+                valid_events.append(serializer.validated_data)
+            else:
+                invalid += 1
+
+        ip_address = client_ip(request)
+        user_agent = request.META.get("HTTP_USER_AGENT", "")
+        reasons = filter_events(valid_events, ip_address=ip_address, user_agent=user_agent)
+        accepted_events = [event for event, reason in zip(valid_events, reasons) if not reason]
+
+        if accepted_events:
+            create_analytics_events_bulk(accepted_events, ip_address=ip_address, user_agent=user_agent)
+
+        return Response({
+            "status": "accepted",
+            "accepted": len(accepted_events),
+            "dropped": len(valid_events) - len(accepted_events),
+            "invalid": invalid,
+        }, status=201)
+
+
 class VendorAnalyticsSummaryView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         return Response(get_vendor_analytics_summary(request.user))
+
+
+class AnalyticsIngestStatsView(APIView):
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_ingest_stats())
+
+
+class AnalyticsEventExportView(APIView):
+    """
+    Export brut des événements en streaming : ?output=csv|jsonl, ?gzip=1,
+    filtres business (admins), listing, event_type, date_from, date_to.
+    Un vendeur n'exporte que les événements de sa boutique.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        queryset = AnalyticsEvent.objects.all()
+        columns = ADMIN_COLUMNS
+        if not request.user.is_staff:
+            business_id = request_business_id(request)
+            if business_id is None:
+                return Response({"error": "Aucune boutique associée à ce compte"}, status=status.HTTP_404_NOT_FOUND)
+            queryset = queryset.filter(business_id=business_id)
+            columns = VENDOR_COLUMNS
+
+        try:
+            queryset = filter_export_events(queryset, params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        export_format = params.get("output", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return Response({"error": "output doit valoir csv ou jsonl"}, status=status.HTTP_400_BAD_REQUEST)
+
+        release = acquire_export_lock(request.user.pk)
+        if release is None:
+            return Response(
+                {"error": "Un export est déjà en cours. Réessayez une fois celui-ci terminé."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+        return export_response(
+            [column for column, _ in columns],
+            export_rows(queryset, columns, CHUNK_SIZE),
+            export_format,
+            filename=f"analytics-{timezone.now():%Y%m%d}",
+            compress=params.get("gzip", "").lower() in ("1", "true"),
+            on_close=release,
+        )
@@ -0,0 +1,128 @@
+"""
+Authentification JWT sans requête SQL par appel.
+
+Le user (et sa boutique) est résolu depuis un LRU en mémoire par process puis
+le cache Redis, indexés par user id ; la base n'est lue qu'en cas de double
+miss. Les signaux post_save / post_delete de User et Business invalident
+l'entrée. Le mot de passe n'est jamais mis en cache : il reste un champ
+différé, chargé à la demande, et un save() sur l'instance ne l'écrase pas.
+
+Les tokens portent aussi business_id (non sensible, fixe pour un user) : les
+vues du dashboard filtrent dessus sans charger la boutique.
+"""
+from django.core.cache import cache
+from django.db.models.fields.files import FieldFile
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from base_api.models import Business, User
+from core.utils.slug_resolver import LocalLRUCache
+
+CACHE_PREFIX = "auth_user"
+REDIS_TTL = 5 * 60
+# Court : borne le délai de prise en compte d'une désactivation entre workers
+LOCAL_TTL = 10
+BUSINESS_ID_CLAIM = "business_id"
+# Jamais mis en cache (ni en mémoire ni dans Redis)
+EXCLUDED_USER_FIELDS = {"password"}
+
+local_users = LocalLRUCache(ttl=LOCAL_TTL)
+
+
+def user_cache_key(user_id):
+    return f"{CACHE_PREFIX}:{user_id}"
+
+
+def _field_values(instance, exclude=()):
+    values = {}
+    for field in instance._meta.concrete_fields:
+        if field.attname in exclude:
+            continue
+        value = getattr(instance, field.attname)
+        if isinstance(value, FieldFile):
+            value = value.name
+        values[field.attname] = value
+    return values
+
+
+def _snapshot(user_id):
+    user = User.objects.select_related("business").filter(pk=user_id).first()
+    if user is None:
+        return None
+    business = getattr(user, "business", None)
+    return {
+        "user": _field_values(user, exclude=EXCLUDED_USER_FIELDS),
+        "business": _field_values(business) if business else None,
+    }
+
+
+def _build_user(snapshot):
+    fields = snapshot["user"]
+    user = User.from_db("default", list(fields), list(fields.values()))
+    business_fields = snapshot["business"]
+    if business_fields:
+        business = Business.from_db("default", list(business_fields), list(business_fields.values()))
+        Business.owner.field.set_cached_value(business, user)
+    else:
+        business = None
+    # user.business sans requête (None : RelatedObjectDoesNotExist, comme en base)
+    User.business.related.set_cached_value(user, business)
+    return user
+
+
+def get_cached_user(user_id):
+    """User (avec sa boutique) depuis le cache, ou None s'il n'existe pas."""
+    snapshot = local_users.get(user_id)
+    if snapshot is None:
+        key = user_cache_key(user_id)
+        snapshot = cache.get(key)
+        if snapshot is None:
+            snapshot = _snapshot(user_id)
+            if snapshot is None:
+                return None
+            cache.set(key, snapshot, REDIS_TTL)
+        local_users.set(user_id, snapshot)
+    return _build_user(snapshot)
+
+
+def invalidate_user(user_id):
+    local_users.delete(user_id)
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Nécessite le hash du mot de passe, volontairement absent du cache
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+
+def tokens_for_user(user):
+    """RefreshToken (et son access token) avec les claims non sensibles du dashboard."""
+    refresh = RefreshToken.for_user(user)
+    business = getattr(user, "business", None)
+    refresh[BUSINESS_ID_CLAIM] = business.id if business else None
+    return refresh
+
+
+def request_business_id(request):
+    """Boutique de l'utilisateur connecté : claim du token, sinon request.user."""
+    token = getattr(request, "auth", None)
+    if token is not None and BUSINESS_ID_CLAIM in token:
+        return token[BUSINESS_ID_CLAIM]
+    business = getattr(request.user, "business", None)
+    return business.id if business else None
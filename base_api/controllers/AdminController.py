@@ -1,15 +1,115 @@
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from django.utils import timezone
-from rest_framework import generics, permissions
+from django.utils.dateparse import parse_date
+from rest_framework import generics, permissions, status
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from base_api.models import User, OTPCode
 from base_api.serializers import AdminUserSerializer, OTPLogAdminSerializer
+from core.utils.streaming_export import CHUNK_SIZE, export_response
+
+BOOLEAN_VALUES = {"true": True, "1": True, "false": False, "0": False}
+EXPORT_COLUMNS = (
+    ("id", "id"),
+    ("phone_whatsapp", "phone_whatsapp"),
+    ("is_active", "is_active"),
+    ("is_phone_verified", "is_phone_verified"),
+    ("is_staff", "is_staff"),
+    ("date_joined", "date_joined"),
+    ("business_id", "business__id"),
+    ("business_name", "business__name"),
+    ("business_type", "business__business_type"),
+)
+
+
+def _day_start(value, param):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"{param} doit être une date AAAA-MM-JJ")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_admin_users(queryset, params):
+    """
+    Filtres communs à la liste et à l'export : is_active, is_phone_verified,
+    business_type, joined_after / joined_before (AAAA-MM-JJ), phone (préfixe).
+    Lève ValueError pour une valeur invalide.
+    """
+    for param in ("is_active", "is_phone_verified"):
+        value = params.get(param)
+        if value is not None:
+            if value.lower() not in BOOLEAN_VALUES:
+                raise ValueError(f"{param} doit valoir true ou false")
+            queryset = queryset.filter(**{param: BOOLEAN_VALUES[value.lower()]})
+
+    if params.get("business_type"):
+        queryset = queryset.filter(business__business_type=params["business_type"].upper())
+
+    # Bornes en datetime (et non date_joined__date) : l'index sur date_joined reste utilisable
+    if params.get("joined_after"):
+        queryset = queryset.filter(date_joined__gte=_day_start(params["joined_after"], "joined_after"))
+    if params.get("joined_before"):
+        end = _day_start(params["joined_before"], "joined_before") + timedelta(days=1)
+        queryset = queryset.filter(date_joined__lt=end)
+
+    phone = (params.get("phone") or "").strip().lstrip("+")
+    if phone:
+        if not phone.isdigit():
+            raise ValueError("phone doit contenir uniquement des chiffres")
+        # LIKE 'préfixe%' : servi par l'index varchar_pattern_ops (PostgreSQL)
+        queryset = queryset.filter(phone_whatsapp__startswith=phone)
+    return queryset
+
+
+class AdminUserPagination(CursorPagination):
+    # Pas de COUNT(*) ni d'OFFSET : coût constant quelle que soit la page
+    ordering = ("-date_joined", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
 
 
 class AdminUserListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
     serializer_class = AdminUserSerializer
-    queryset = User.objects.all().order_by('-date_joined')
+    pagination_class = AdminUserPagination
+
+    def get_queryset(self):
+        return filter_admin_users(User.objects.select_related("business"), self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        try:
+            return super().list(request, *args, **kwargs)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AdminUserExportView(APIView):
+    """
+    Export CSV (?output=csv) ou JSON lines (?output=jsonl) des utilisateurs,
+    avec les mêmes filtres que la liste, en streaming.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        try:
+            queryset = filter_admin_users(User.objects.all(), request.query_params)
+            rows = (
+                queryset.order_by("-date_joined", "-id")
+                .values_list(*(field for _, field in EXPORT_COLUMNS))
+                .iterator(chunk_size=CHUNK_SIZE)
+            )
+            return export_response(
+                [column for column, _ in EXPORT_COLUMNS],
+                rows,
+                request.query_params.get("output", "csv"),
+                filename=f"users-{timezone.now():%Y%m%d}",
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
 
 class AdminOTPLogView(generics.ListAPIView):
     serializer_class = OTPLogAdminSerializer  # Use the admin version
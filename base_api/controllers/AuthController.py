@@ -1,26 +1,29 @@
 # views.py
-from django.core.cache import cache
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.conf import settings
+import logging
 import random
 import secrets
 
-from core.utils.telegram_service import (
-    send_error_to_admin, 
-    send_otp_to_admin
-    )
-from core.utils.twilio_service import send_otp
+from core.utils.rate_limit import rate_limit
 from base_api.serializers import (
     RequestOTPSerializer, 
     VerifyOTPSerializer,
     SetPasswordSerializer,
     LoginSerializer
 )
+from base_api.authentication import tokens_for_user
 from base_api.models import User, OTPCode
-from base_api.tasks import send_error_message, send_welcome_sms_task
+from base_api.otp import LOCKED, VERIFIED, consume_code, store_code, verify_code
+from base_api.tasks import (
+    send_otp_task,
+    send_otp_to_admin_task,
+    send_welcome_sms_task,
+)
+
+logger = logging.getLogger(__name__)
 
 
 # ============================================================================
@@ -63,6 +66,7 @@ class DetectUserFlowView(generics.GenericAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = RequestOTPSerializer
     
+    @rate_limit("detect_flow_ip")
     def post(self, request):
         phone = normalize_phone(request.data.get('phone_whatsapp'))
         
@@ -116,6 +120,9 @@ class NewUserRequestOTPView(generics.GenericAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = RequestOTPSerializer
     
+    # Par IP puis par numéro : le rejet se fait avant toute lecture en base
+    @rate_limit("otp_request_ip")
+    @rate_limit("otp_request_phone", key="phone")
     def post(self, request):
         phone = normalize_phone(request.data.get('phone_whatsapp'))
         hasRegistered = request.user or None
@@ -148,49 +155,81 @@ class NewUserRequestOTPView(generics.GenericAPIView):
         except User.DoesNotExist:
             pass  # Continue avec l'envoi OTP
         
-        # Rate limiting
-        cache_key = f"otp_attempts_{phone}"
-        attempts = cache.get(cache_key, 0)
-        
-        if attempts >= 3:
-            return Response(
-                {"error": "Trop de tentatives. Réessayez dans 15 minutes."},
-                status=status.HTTP_429_TOO_MANY_REQUESTS
-            )
-        
-        cache.set(cache_key, attempts + 1, timeout=900)
-        
         # Génère et stocke le code
         code = generate_otp_code()
-        otp_key = f"otp_{phone}"
-        cache.set(otp_key, code, timeout=600)
+        store_code(phone, code)
         
-        # Sauvegarde en base
-        OTPCode.objects.update_or_create(
+        # Sauvegarde en base (statut de livraison remis à zéro)
+        otp, _ = OTPCode.objects.update_or_create(
             phone_number=phone,
-            defaults={'code': code}
+            defaults={
+                'code': code,
+                'is_used': False,
+                'delivery_status': OTPCode.DELIVERY_QUEUED,
+                'delivery_channel': '',
+                'delivery_attempts': [],
+                'delivered_at': None,
+            }
         )
         
-        # Envoi
-                
-        send_otp_to_admin(phone, code)
-        result = send_otp(phone, code, sandbox=False)
-        
-        if not result.get('success'):
-            send_error_message.delay(
-                f"Erreur envoi SMS à {phone}: {result.get('error')}"
+        # Envoi asynchrone (queue "otp") : la requête n'attend ni Twilio ni Telegram
+        try:
+            send_otp_task.delay(otp.id, code)
+            send_otp_to_admin_task.delay(phone, code)
+        except Exception as e:
+            OTPCode.objects.filter(id=otp.id).update(delivery_status=OTPCode.DELIVERY_FAILED)
+            logger.error("OTP dispatch failed for %s: %s", phone, e)
+            return Response(
+                {"error": "Service d'envoi indisponible. Réessayez dans un instant."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
         
         return Response({
             "status": "success",
-            "message": "Code envoyé avec succès",
+            "message": "Code en cours d'envoi",
             "flow": "otp_verification",
             "step": "verify_otp",
+            "delivery_status": otp.delivery_status.lower(),
+            "status_endpoint": "/api/auth/register/otp-status/",
             "next_endpoint": "/api/auth/register/verify-otp/",
             "phone_whatsapp": phone
         })
 
 
+class OTPDeliveryStatusView(generics.GenericAPIView):
+    """
+    Suivi de la livraison du dernier OTP demandé pour un numéro (polling client)
+    """
+    permission_classes = [permissions.AllowAny]
+    
+    @rate_limit("otp_status_ip")
+    def get(self, request):
+        phone = normalize_phone(request.query_params.get('phone_whatsapp'))
+        
+        if not phone:
+            return Response(
+                {"error": "Numéro requis"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        otp = OTPCode.objects.filter(phone_number=phone).order_by('-updated_at').only(
+            'delivery_status', 'delivery_channel', 'delivery_attempts', 'delivered_at'
+        ).first()
+        if otp is None:
+            return Response(
+                {"error": "Aucun code demandé pour ce numéro"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response({
+            "phone_whatsapp": phone,
+            "delivery_status": otp.delivery_status.lower(),
+            "channel": otp.delivery_channel or None,
+            "attempts": len(otp.delivery_attempts),
+            "delivered_at": otp.delivered_at,
+        })
+
+
 class NewUserVerifyOTPView(generics.GenericAPIView):
     """
     Étape 2: Nouvel utilisateur - Vérifie OTP et crée le compte avec mot de passe
@@ -225,20 +264,19 @@ class NewUserVerifyOTPView(generics.GenericAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            is_phone_verified = True
-            if code:  # Permet de forcer la vérification en dev
-                otp = OTPCode.objects.get(
-                    phone_number=phone,
-                    code=code,
-                )
-            else:
-                is_phone_verified = False
-        except OTPCode.DoesNotExist:
+        # Code lu dans le cache, comparaison en temps constant
+        result = verify_code(phone, code)
+        if result == LOCKED:
+            return Response(
+                {"error": "Trop d'essais. Demandez un nouveau code."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+        if result != VERIFIED:
             return Response(
                 {"error": "Code invalide ou expiré"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        is_phone_verified = True
         
         # Crée l'utilisateur avec mot de passe
         try:
@@ -261,10 +299,7 @@ class NewUserVerifyOTPView(generics.GenericAPIView):
                 )
 
             # Nettoyage
-            if is_phone_verified:
-                otp.is_used = True
-                otp.save()
-                cache.delete(f"otp_{phone}")
+            consume_code(phone)
             
             # Welcome SMS
             send_welcome_sms_task.delay(
@@ -273,7 +308,7 @@ class NewUserVerifyOTPView(generics.GenericAPIView):
             )
             
             # Tokens
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for_user(user)
             
             return Response({
                 "status": "success",
@@ -345,7 +380,7 @@ class LegacyUserSetPasswordView(generics.GenericAPIView):
             user.save()
             
             # Tokens
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for_user(user)
             
             return Response({
                 "status": "success",
@@ -376,6 +411,8 @@ class LoginView(generics.GenericAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = LoginSerializer
     
+    @rate_limit("login_ip")
+    @rate_limit("login_phone", key="phone")
     def post(self, request):
         phone = normalize_phone(request.data.get('phone_whatsapp'))
         password = request.data.get('password')
@@ -419,7 +456,7 @@ class LoginView(generics.GenericAPIView):
             )
         
         # Génère tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for_user(user)
         
         return Response({
             "status": "success",
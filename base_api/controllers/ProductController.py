@@ -1,5 +1,6 @@
 from rest_framework import viewsets, permissions, generics
 from rest_framework.response import Response
+from base_api.authentication import request_business_id
 from base_api.models import Product
 from base_api.serializers import ProductSerializer
 from django.core.cache import cache
@@ -35,7 +36,7 @@ class MyProductViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         # Sécurité : un vendeur ne voit que ses produits
-        return Product.objects.filter(business=self.request.user.business).order_by('-id')
+        return Product.objects.filter(business_id=request_business_id(self.request)).order_by('-id')
 
     def list_response(self):
         """Helper pour renvoyer la liste complète mise à jour"""
@@ -0,0 +1,33 @@
+# Generated by Django 5.0 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_api', '0009_otpcode_is_used_alter_otpcode_phone_number_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='otpcode',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='otpcode',
+            name='delivery_attempts',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='otpcode',
+            name='delivery_channel',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='otpcode',
+            name='delivery_status',
+            field=models.CharField(choices=[('QUEUED', 'En file d’attente'), ('SENDING', 'Envoi en cours'), ('SENT', 'Envoyé'), ('FAILED', 'Échec')], default='QUEUED', max_length=10),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-19 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_api', '0010_otpcode_delivery_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='otpcode',
+            index=models.Index(fields=['updated_at'], name='base_api_ot_updated_ae3452_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('base_api', '0011_otpcode_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-date_joined', '-id'], name='user_date_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['phone_whatsapp'], name='user_phone_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
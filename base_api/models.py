@@ -4,6 +4,8 @@ from django.utils.text import slugify
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
 
+from core.utils.dirty_fields import DirtyFieldsMixin
+
 class UserManager(BaseUserManager):
     def create_user(self, phone_whatsapp, password=None, **extra_fields):
         if not phone_whatsapp:
@@ -32,7 +34,7 @@ class UserManager(BaseUserManager):
         return self.create_user(phone_whatsapp, password, **extra_fields)
 
 
-class User(AbstractUser):
+class User(DirtyFieldsMixin, AbstractUser):
     username = None
     
     phone_whatsapp = models.CharField(
@@ -58,6 +60,12 @@ class User(AbstractUser):
     class Meta:
         verbose_name = "Utilisateur"
         verbose_name_plural = "Utilisateurs"
+        indexes = [
+            # Liste admin : pagination par curseur sur (date_joined, id)
+            models.Index(fields=['-date_joined', '-id'], name='user_date_joined_idx'),
+            # Recherche par préfixe de numéro (LIKE 'xxx%') sous PostgreSQL
+            models.Index(fields=['phone_whatsapp'], name='user_phone_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.phone_whatsapp
@@ -66,7 +74,7 @@ class User(AbstractUser):
     def can_login_with_password(self):
         """Vérifie si l'utilisateur peut se connecter avec un mot de passe"""
         return not self.password_setup_required and self.has_usable_password()
-class Business(models.Model):
+class Business(DirtyFieldsMixin, models.Model):
     TYPES = [
         ('SHOP', 'Boutique / Vente'),
         ('TROC', 'Troc / Échange'),
@@ -96,7 +104,7 @@ class Business(models.Model):
         return self.name
 
 
-class Product(models.Model):
+class Product(DirtyFieldsMixin, models.Model):
     CURRENCY_CHOICES = [
         ('USD', 'US Dollar'),
         ('CDF', 'Franc Congolais'),
@@ -139,9 +147,26 @@ class Product(models.Model):
 
 
 class OTPCode(models.Model):
+    DELIVERY_QUEUED = 'QUEUED'
+    DELIVERY_SENDING = 'SENDING'
+    DELIVERY_SENT = 'SENT'
+    DELIVERY_FAILED = 'FAILED'
+    DELIVERY_STATUSES = [
+        (DELIVERY_QUEUED, 'En file d’attente'),
+        (DELIVERY_SENDING, 'Envoi en cours'),
+        (DELIVERY_SENT, 'Envoyé'),
+        (DELIVERY_FAILED, 'Échec'),
+    ]
+
     phone_number = models.CharField(max_length=20, db_index=True)
     code = models.CharField(max_length=6)
     is_used = models.BooleanField(default=False)  # Missing field referenced in React
+    # Livraison asynchrone (base_api.tasks.send_otp_task, queue "otp")
+    delivery_status = models.CharField(max_length=10, choices=DELIVERY_STATUSES, default=DELIVERY_QUEUED)
+    delivery_channel = models.CharField(max_length=20, blank=True)
+    # Une entrée par tentative : {"attempt", "channel", "success", "error", "at"}
+    delivery_attempts = models.JSONField(default=list, blank=True)
+    delivered_at = models.DateTimeField(blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -149,6 +174,8 @@ class OTPCode(models.Model):
         ordering = ['-updated_at']
         indexes = [
             models.Index(fields=['phone_number', '-updated_at']),
+            # Purge périodique (base_api.otp.purge_otp_codes)
+            models.Index(fields=['updated_at']),
         ]
 
     def __str__(self):
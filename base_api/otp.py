@@ -0,0 +1,113 @@
+"""
+Stockage et vérification des codes OTP.
+
+Le code actif d'un numéro vit dans le cache (otp_<phone>, OTP_TTL_SECONDS) :
+la vérification ne lit la base qu'en cas d'absence du cache (Redis vidé), et
+uniquement pour un code encore valide. La comparaison est en temps constant
+et chaque numéro dispose d'un nombre limité d'essais par code.
+
+OTPCode sert au suivi de livraison et au journal admin ; les lignes utilisées
+ou expirées sont purgées par lots au-delà de OTP_RETENTION_HOURS.
+"""
+import logging
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from base_api.models import OTPCode
+
+logger = logging.getLogger(__name__)
+
+VERIFIED = "verified"
+INVALID = "invalid"
+EXPIRED = "expired"
+LOCKED = "locked"
+
+PURGE_BATCH_SIZE = 1000
+
+
+def code_key(phone):
+    return f"otp_{phone}"
+
+
+def attempts_key(phone):
+    return f"otp_verify_attempts_{phone}"
+
+
+def otp_ttl():
+    return getattr(settings, "OTP_TTL_SECONDS", 600)
+
+
+def store_code(phone, code):
+    """Nouveau code : remplace l'ancien et remet le compteur d'essais à zéro."""
+    cache.set(code_key(phone), code, timeout=otp_ttl())
+    cache.delete(attempts_key(phone))
+
+
+def _count_attempt(phone):
+    key = attempts_key(phone)
+    # add + incr : compteur atomique, expirant avec le code
+    cache.add(key, 0, timeout=otp_ttl())
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Clé expirée entre add et incr
+        cache.set(key, 1, timeout=otp_ttl())
+        return 1
+
+
+def _stored_code(phone):
+    code = cache.get(code_key(phone))
+    if code is not None:
+        return code
+    # Cache perdu : dernier code non utilisé et encore valide
+    return (
+        OTPCode.objects.filter(
+            phone_number=phone,
+            is_used=False,
+            updated_at__gte=timezone.now() - timedelta(seconds=otp_ttl()),
+        )
+        .values_list("code", flat=True)
+        .first()
+    )
+
+
+def verify_code(phone, code):
+    """Retourne VERIFIED, INVALID, EXPIRED ou LOCKED (trop d'essais pour ce code)."""
+    if _count_attempt(phone) > getattr(settings, "OTP_MAX_VERIFY_ATTEMPTS", 5):
+        return LOCKED
+
+    expected = _stored_code(phone)
+    if expected is None:
+        return EXPIRED
+    if not secrets.compare_digest(str(expected).encode(), str(code).encode()):
+        return INVALID
+    return VERIFIED
+
+
+def consume_code(phone):
+    """Le code vérifié ne peut plus resservir."""
+    cache.delete_many([code_key(phone), attempts_key(phone)])
+    OTPCode.objects.filter(phone_number=phone, is_used=False).update(is_used=True, updated_at=timezone.now())
+
+
+def purge_otp_codes(batch_size=PURGE_BATCH_SIZE):
+    """
+    Supprime par lots les codes dont la dernière demande dépasse la rétention
+    (tous utilisés ou expirés). Le journal admin ne montre que les dernières
+    24 heures : la rétention par défaut les conserve.
+    """
+    cutoff = timezone.now() - timedelta(hours=getattr(settings, "OTP_RETENTION_HOURS", 48))
+    stale = OTPCode.objects.filter(updated_at__lt=cutoff).order_by()
+    deleted = 0
+    while True:
+        ids = list(stale.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += OTPCode.objects.filter(id__in=ids).delete()[0]
+    if deleted:
+        logger.info("Purged %s OTP codes older than %s", deleted, cutoff)
+    return deleted
@@ -3,6 +3,7 @@ from django.core.validators import RegexValidator
 from django.utils import timezone
 from datetime import timedelta
 from .models import OTPCode, User, Business, Product
+from .otp import otp_ttl
 
 
 # Custom field for phone validation
@@ -66,7 +67,7 @@ class OTPLogAdminSerializer(serializers.ModelSerializer):
     def get_status(self, obj):
         if obj.is_used:
             return "used"
-        if timezone.now() - obj.created_at > timedelta(minutes=5):
+        if timezone.now() - obj.updated_at > timedelta(seconds=otp_ttl()):
             return "expired"
         return "active"
     
@@ -4,6 +4,8 @@ from django.utils.text import slugify
 from .models import User, Business, Product
 from django.core.cache import cache
 from django_redis import get_redis_connection
+from core.utils.slug_resolver import business_slugs
+from .authentication import invalidate_user
 
 @receiver(post_save, sender=User)
 def create_automated_business(sender, instance, created, **kwargs):
@@ -28,11 +30,17 @@ def create_automated_business(sender, instance, created, **kwargs):
     
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, created, update_fields=None, **kwargs):
     """
     Assure la mise à jour automatique si nécessaire.
     """
-    instance.business.save()
+    # Boutique tout juste créée, ou simple mise à jour de last_login : rien à faire
+    if created or (update_fields and set(update_fields) <= {"last_login"}):
+        return
+    business = getattr(instance, "business", None)
+    if business:
+        # Sans changement, save() n'écrit rien (DirtyFieldsMixin)
+        business.save()
 
 @receiver([post_save, post_delete], sender=Product)
 def clear_product_cache(sender, **kwargs):
@@ -41,4 +49,19 @@ def clear_product_cache(sender, **kwargs):
 
     keys = redis.keys("product_list*")
     if keys:
-        redis.delete(*keys)
\ No newline at end of file
+        redis.delete(*keys)
+
+
+@receiver([post_save, post_delete], sender=Business)
+def invalidate_business_slug(sender, instance, **kwargs):
+    business_slugs.invalidate_instance(instance)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Business)
+def invalidate_cached_business_owner(sender, instance, **kwargs):
+    invalidate_user(instance.owner_id)
@@ -1,10 +1,23 @@
+import logging
+
 from celery import shared_task
+from django.utils import timezone
 
-from core.utils.twilio_service import send_welcome
-from core.utils.telegram_service import send_error_to_admin
-from .models import Product
+from core.utils.twilio_service import send_otp, send_welcome
+from core.utils.telegram_service import (
+    TelegramRateLimited,
+    flush_admin_digest,
+    notify_admin_error,
+    send_otp_to_admin,
+)
+from .models import OTPCode, Product
+from .otp import purge_otp_codes
 import time
 
+logger = logging.getLogger(__name__)
+
+OTP_MAX_RETRIES = 3
+
 @shared_task
 def notify_subscribers_task(product_id):
     product = Product.objects.get(id=product_id)
@@ -18,7 +31,7 @@ def send_welcome_sms_task(phone_number, business_name):
     print(f"Envoi du SMS à {phone_number}...")
     result = send_welcome(phone_number)
     if not result.get("success"):
-        send_error_to_admin(
+        notify_admin_error(
             f"Erreur envoi message de bienvenue a {phone_number}: {result.get('error')}"
         )
     time.sleep(5) # On simule une attente de 5 secondes (l'API répond lentement)
@@ -26,8 +39,87 @@ def send_welcome_sms_task(phone_number, business_name):
 
 @shared_task
 def send_error_message(error_message):
-    # Simuler l'envoi d'un message d'erreur à l'admin
-    print("Envoi du message d'erreur à l'admin...")
-    send_error_to_admin(error_message)
-    time.sleep(2) # Simuler une attente de 2 secondes
-    return "Message d'erreur envoyé à l'admin"  
+    # Regroupé avec les autres erreurs de la fenêtre dans un seul résumé Telegram
+    notify_admin_error(error_message)
+    return "Message d'erreur ajouté au résumé admin"
+
+
+@shared_task(bind=True, max_retries=10)
+def flush_admin_digest_task(self):
+    # Programmée par notify_admin_error à la première erreur de chaque fenêtre
+    try:
+        count = flush_admin_digest()
+    except TelegramRateLimited as exc:
+        raise self.retry(countdown=exc.retry_after)
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=30)
+    return f"Résumé admin envoyé ({count} erreurs)"
+
+
+def _delivery_attempts(result, attempt):
+    """Traduit le résultat de send_otp en une entrée par canal essayé."""
+    at = timezone.now().isoformat()
+    if result.get("success") and result.get("channel") == "sms":
+        return [{"attempt": attempt, "channel": "sms", "success": True, "error": None, "at": at}]
+    if result.get("success"):
+        return [
+            {"attempt": attempt, "channel": "sms", "success": False, "error": result.get("sms_error"), "at": at},
+            {"attempt": attempt, "channel": result.get("channel"), "success": True, "error": None, "at": at},
+        ]
+    errors = result.get("error") or {}
+    return [
+        {"attempt": attempt, "channel": channel, "success": False, "error": errors.get(channel), "at": at}
+        for channel in ("sms", "whatsapp")
+    ]
+
+
+@shared_task(bind=True, max_retries=OTP_MAX_RETRIES)
+def send_otp_task(self, otp_id, code):
+    # Routée sur la queue "otp" (CELERY_TASK_ROUTES) : jamais derrière les tâches lentes
+    otp = OTPCode.objects.filter(id=otp_id).first()
+    if otp is None or otp.is_used or otp.code != code:
+        return "OTP remplacé ou déjà utilisé"
+
+    # Filtrer sur le code : une nouvelle demande pour ce numéro n'est pas écrasée
+    current = OTPCode.objects.filter(id=otp_id, code=code)
+    current.update(delivery_status=OTPCode.DELIVERY_SENDING)
+
+    result = send_otp(otp.phone_number, code, sandbox=False)
+    attempts = otp.delivery_attempts + _delivery_attempts(result, self.request.retries + 1)
+
+    if result.get("success"):
+        current.update(
+            delivery_status=OTPCode.DELIVERY_SENT,
+            delivery_channel=result.get("channel", ""),
+            delivery_attempts=attempts,
+            delivered_at=timezone.now(),
+        )
+        return f"OTP envoyé à {otp.phone_number} ({result.get('channel')})"
+
+    if self.request.retries < self.max_retries:
+        current.update(delivery_status=OTPCode.DELIVERY_QUEUED, delivery_attempts=attempts)
+        raise self.retry(countdown=5 * 2 ** self.request.retries)
+
+    current.update(delivery_status=OTPCode.DELIVERY_FAILED, delivery_attempts=attempts)
+    notify_admin_error(f"Erreur envoi SMS à {otp.phone_number}: {result.get('error')}")
+    return f"Échec de l'envoi OTP à {otp.phone_number}"
+
+
+@shared_task(bind=True, max_retries=3)
+def send_otp_to_admin_task(self, phone_number, code):
+    # Copie Telegram pour l'admin : un échec ne bloque pas la livraison à l'utilisateur
+    try:
+        send_otp_to_admin(phone_number, code)
+    except TelegramRateLimited as exc:
+        raise self.retry(countdown=exc.retry_after)
+    except Exception as exc:
+        logger.warning("Telegram OTP copy failed for %s: %s", phone_number, exc)
+        return "Copie admin non envoyée"
+    return "Copie admin envoyée"
+
+
+@shared_task
+def purge_otp_codes_task():
+    # Codes utilisés ou expirés au-delà de OTP_RETENTION_HOURS
+    deleted = purge_otp_codes()
+    return f"{deleted} codes OTP purgés"
@@ -1,12 +1,42 @@
+import json
+import tempfile
+from datetime import datetime, time, timedelta
+from pathlib import Path
 from types import SimpleNamespace
 from unittest.mock import Mock, patch
 
-from django.test import SimpleTestCase, override_settings
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from redis.exceptions import RedisError
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
 
-from core.utils.twilio_service import normalize_phone, send_otp, send_welcome
+from base_api.authentication import CachedJWTAuthentication, tokens_for_user
+from base_api.models import Business, OTPCode, User
+from base_api.otp import EXPIRED, VERIFIED, purge_otp_codes, store_code, verify_code
+from base_api.tasks import send_otp_task
+from core.utils.messaging import get_gateway, reset_gateway
+from core.utils.rate_limit import count_hit, parse_limit, parse_rate, reset_local_state
+from core.utils.telegram_fake import FakeTelegramServer
+from core.utils.telegram_service import (
+    TelegramRateLimited,
+    acquire_send_slot,
+    flush_admin_digest,
+    get_session,
+    notify_admin_error,
+    send_error_to_admin,
+)
+from core.utils.twilio_service import normalize_phone, send_otp, send_sms, send_sms_bulk, send_welcome
 
 
 class TwilioServiceTests(SimpleTestCase):
+    def setUp(self):
+        reset_gateway()
+
     def test_normalize_phone_for_sms_and_whatsapp(self):
         self.assertEqual(normalize_phone("+243 899-530-506"), "+243899530506")
         self.assertEqual(
@@ -22,7 +52,7 @@ class TwilioServiceTests(SimpleTestCase):
         TWILIO_SMS_NUMBER="+15005550006",
         TWILIO_ALPHA_SENDER_ID=None,
     )
-    @patch("core.utils.twilio_service.Client")
+    @patch("core.utils.messaging.Client")
     def test_send_otp_uses_sms_first(self, client_class):
         client = Mock()
         client.messages.create.return_value = SimpleNamespace(sid="SM_sms")
@@ -45,7 +75,7 @@ class TwilioServiceTests(SimpleTestCase):
         TWILIO_SMS_NUMBER="+15005550006",
         TWILIO_ALPHA_SENDER_ID=None,
     )
-    @patch("core.utils.twilio_service.Client")
+    @patch("core.utils.messaging.Client")
     def test_send_otp_falls_back_to_whatsapp_when_sms_fails(self, client_class):
         client = Mock()
         client.messages.create.side_effect = [
@@ -73,7 +103,7 @@ class TwilioServiceTests(SimpleTestCase):
         TWILIO_SMS_NUMBER="+15005550006",
         TWILIO_ALPHA_SENDER_ID=None,
     )
-    @patch("core.utils.twilio_service.Client")
+    @patch("core.utils.messaging.Client")
     def test_send_welcome_uses_sms_first(self, client_class):
         client = Mock()
         client.messages.create.return_value = SimpleNamespace(sid="SM_sms")
@@ -86,3 +116,430 @@ class TwilioServiceTests(SimpleTestCase):
         client.messages.create.assert_called_once()
         payload = client.messages.create.call_args.kwargs
         self.assertEqual(payload["to"], "+243899530506")
+
+
+class MessagingGatewayTests(SimpleTestCase):
+    def setUp(self):
+        reset_gateway()
+        self.addCleanup(reset_gateway)
+
+    @override_settings(
+        MESSAGING_PROVIDER="twilio",
+        TWILIO_ACCOUNT_SID="AC_test",
+        TWILIO_AUTH_TOKEN="token",
+        TWILIO_SMS_NUMBER="+15005550006",
+    )
+    @patch("core.utils.messaging.Client")
+    def test_twilio_client_is_reused_across_messages(self, client_class):
+        client_class.return_value.messages.create.return_value = SimpleNamespace(sid="SM1")
+
+        send_sms("15551234567", "un")
+        send_sms("15551234568", "deux")
+
+        client_class.assert_called_once()
+        self.assertEqual(client_class.return_value.messages.create.call_count, 2)
+
+    def test_file_provider_bulk_send(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            outbox = Path(tmp) / "outbox.jsonl"
+            with override_settings(
+                MESSAGING_PROVIDER="file",
+                MESSAGING_FAKE_OUTBOX=str(outbox),
+                MESSAGING_MAX_CONCURRENCY=4,
+                TWILIO_SMS_NUMBER="+15005550006",
+            ):
+                results = send_sms_bulk([(f"155512345{i:02d}", f"message {i}") for i in range(10)] + [("", "vide")])
+                self.assertEqual(get_gateway().provider.name, "file")
+
+            lines = [json.loads(line) for line in outbox.read_text(encoding="utf-8").splitlines()]
+
+        self.assertEqual([result["success"] for result in results], [True] * 10 + [False])
+        self.assertEqual(results[0]["provider"], "file")
+        self.assertEqual(len(lines), 10)
+        self.assertEqual({line["sid"] for line in lines}, {result["sid"] for result in results[:10]})
+
+
+class OTPDeliveryTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch("base_api.controllers.AuthController.send_otp_to_admin_task")
+    @patch("base_api.controllers.AuthController.send_otp_task")
+    def test_request_otp_enqueues_delivery(self, otp_task, admin_task):
+        response = self.client.post("/api/auth/register/request-otp/", {"phone_whatsapp": "+243899530506"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["delivery_status"], "queued")
+        otp = OTPCode.objects.get(phone_number="243899530506")
+        otp_task.delay.assert_called_once_with(otp.id, otp.code)
+        admin_task.delay.assert_called_once_with("243899530506", otp.code)
+
+    @patch("base_api.tasks.send_otp")
+    def test_task_records_fallback_delivery(self, send):
+        send.return_value = {"success": True, "channel": "whatsapp", "sid": "SM1", "sms_error": "refusé"}
+        otp = OTPCode.objects.create(phone_number="243899530506", code="123456")
+
+        send_otp_task.apply(args=[otp.id, "123456"])
+
+        otp.refresh_from_db()
+        self.assertEqual(otp.delivery_status, OTPCode.DELIVERY_SENT)
+        self.assertEqual(otp.delivery_channel, "whatsapp")
+        self.assertEqual([(a["channel"], a["success"]) for a in otp.delivery_attempts], [("sms", False), ("whatsapp", True)])
+
+        response = self.client.get("/api/auth/register/otp-status/", {"phone_whatsapp": "243899530506"})
+        self.assertEqual(response.data["delivery_status"], "sent")
+        self.assertEqual(response.data["channel"], "whatsapp")
+
+    @patch("base_api.tasks.notify_admin_error")
+    @patch("base_api.tasks.send_otp")
+    def test_task_retries_then_fails(self, send, notify):
+        send.return_value = {"success": False, "error": {"sms": "down", "whatsapp": "down"}}
+        otp = OTPCode.objects.create(phone_number="243899530506", code="123456")
+
+        send_otp_task.apply(args=[otp.id, "123456"])
+
+        otp.refresh_from_db()
+        self.assertEqual(otp.delivery_status, OTPCode.DELIVERY_FAILED)
+        self.assertEqual(send.call_count, 4)
+        self.assertEqual(len(otp.delivery_attempts), 8)
+        notify.assert_called_once()
+
+    def test_status_unknown_phone(self):
+        response = self.client.get("/api/auth/register/otp-status/", {"phone_whatsapp": "243000000000"})
+
+        self.assertEqual(response.status_code, 404)
+
+
+@patch("base_api.controllers.AuthController.send_welcome_sms_task")
+class OTPVerificationTests(APITestCase):
+    phone = "243899530506"
+
+    def setUp(self):
+        cache.clear()
+
+    def verify(self, code):
+        return self.client.post(
+            "/api/auth/register/verify-otp/",
+            {"phone_whatsapp": self.phone, "code": code, "password": "motdepasse123"},
+        )
+
+    def test_code_verified_from_cache_then_consumed(self, welcome_task):
+        otp = OTPCode.objects.create(phone_number=self.phone, code="123456")
+        store_code(self.phone, "123456")
+
+        self.assertEqual(self.verify("123456").status_code, 201)
+        otp.refresh_from_db()
+        self.assertTrue(otp.is_used)
+        self.assertTrue(User.objects.filter(phone_whatsapp=self.phone, is_phone_verified=True).exists())
+
+        self.assertEqual(self.verify("123456").status_code, 400)
+
+    @override_settings(OTP_MAX_VERIFY_ATTEMPTS=3)
+    def test_attempts_locked_until_new_code(self, welcome_task):
+        store_code(self.phone, "123456")
+
+        statuses = [self.verify(code).status_code for code in ("000000", "111111", "222222", "123456")]
+        self.assertEqual(statuses, [400, 400, 400, 429])
+
+        store_code(self.phone, "654321")
+        self.assertEqual(self.verify("654321").status_code, 201)
+
+    def test_database_fallback_respects_expiry(self, welcome_task):
+        otp = OTPCode.objects.create(phone_number=self.phone, code="123456")
+        self.assertEqual(verify_code(self.phone, "123456"), VERIFIED)
+
+        OTPCode.objects.filter(id=otp.id).update(updated_at=timezone.now() - timedelta(minutes=11))
+        self.assertEqual(verify_code(self.phone, "123456"), EXPIRED)
+
+    @override_settings(OTP_RETENTION_HOURS=48)
+    def test_purge_keeps_recent_codes_for_admin_log(self, welcome_task):
+        old = timezone.now() - timedelta(days=3)
+        for index in range(5):
+            otp = OTPCode.objects.create(phone_number=f"24381000000{index}", code="123456", is_used=True)
+            OTPCode.objects.filter(id=otp.id).update(created_at=old, updated_at=old)
+        recent = OTPCode.objects.create(phone_number=self.phone, code="123456")
+
+        self.assertEqual(purge_otp_codes(batch_size=2), 5)
+        self.assertEqual(list(OTPCode.objects.values_list("id", flat=True)), [recent.id])
+
+        admin = User.objects.create_user(phone_whatsapp="243800000001", password="x", is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get("/api/admin/otps/")
+        self.assertEqual([row["id"] for row in response.data], [recent.id])
+        self.assertEqual(response.data[0]["status"], "active")
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(phone_whatsapp="243899530506", password="motdepasse123", is_active=True)
+        self.access = str(tokens_for_user(self.user).access_token)
+
+    def authenticate(self):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {self.access}")
+        return CachedJWTAuthentication().authenticate(request)
+
+    def test_user_and_business_resolved_without_queries(self):
+        self.authenticate()
+
+        with CaptureQueriesContext(connection) as queries:
+            user, token = self.authenticate()
+            business_id = user.business.id
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(business_id, self.user.business.id)
+        self.assertEqual(token["business_id"], business_id)
+
+    def test_cached_user_keeps_password_out_of_cache(self):
+        user, _ = self.authenticate()
+
+        self.assertIn("password", user.get_deferred_fields())
+        user.first_name = "Jean"
+        user.save()
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password("motdepasse123"))
+
+    def test_user_save_invalidates_cache(self):
+        self.authenticate()
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+
+class DirtyFieldsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(phone_whatsapp="243899530506", password="motdepasse123")
+
+    def test_unchanged_save_writes_nothing(self):
+        business = Business.objects.get(owner=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            business.save()
+
+        self.assertEqual(len(queries), 0)
+
+    def test_only_changed_fields_written(self):
+        business = Business.objects.get(owner=self.user)
+        business.metadata["horaires"] = "8h-18h"
+        self.assertEqual(business.get_dirty_fields(), {"metadata"})
+
+        business.description = "Nouvelle description"
+        with CaptureQueriesContext(connection) as queries:
+            business.save()
+
+        updates = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"description"', updates[0])
+        self.assertIn('"updated_at"', updates[0])
+        self.assertNotIn('"logo"', updates[0])
+        self.assertFalse(business.is_dirty())
+
+    def test_user_save_does_not_rewrite_business(self):
+        updated_at = Business.objects.get(owner=self.user).updated_at
+        user = User.objects.get(pk=self.user.pk)
+
+        user.first_name = "Jean"
+        user.save()
+
+        self.assertEqual(Business.objects.get(owner=self.user).updated_at, updated_at)
+
+
+class AdminUserListTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(phone_whatsapp="33600000000", password="x", is_staff=True, is_active=True)
+        for index in range(4):
+            User.objects.create_user(phone_whatsapp=f"24381000000{index}", password="x", is_active=index % 2 == 0)
+        self.client.force_authenticate(self.admin)
+
+    def test_cursor_pages_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get("/api/admin/users/", {"page_size": 2})
+        self.assertEqual(len(queries), 1)
+        second = self.client.get(first.data["next"])
+
+        self.assertEqual(len(first.data["results"]), 2)
+        self.assertIsNotNone(first.data["results"][0]["business_id"])
+        self.assertNotIn(first.data["results"][0]["id"], [row["id"] for row in second.data["results"]])
+
+    def test_filters_and_phone_prefix(self):
+        response = self.client.get("/api/admin/users/", {"phone": "+24381", "is_active": "true"})
+        invalid = self.client.get("/api/admin/users/", {"joined_after": "hier"})
+
+        self.assertEqual(
+            sorted(row["phone_whatsapp"] for row in response.data["results"]),
+            ["243810000000", "243810000002"],
+        )
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_joined_bounds_include_whole_days(self):
+        today = timezone.localdate()
+        yesterday = today - timedelta(days=1)
+        late_evening = timezone.make_aware(datetime.combine(yesterday, time(23, 30)))
+        User.objects.filter(phone_whatsapp="243810000000").update(date_joined=late_evening)
+
+        before = self.client.get("/api/admin/users/", {"joined_before": str(yesterday)})
+        after = self.client.get("/api/admin/users/", {"joined_after": str(today), "phone": "24381"})
+
+        self.assertEqual([row["phone_whatsapp"] for row in before.data["results"]], ["243810000000"])
+        self.assertEqual(len(after.data["results"]), 3)
+
+    def test_streaming_export(self):
+        csv_response = self.client.get("/api/admin/users/export/", {"phone": "24381"})
+        jsonl_response = self.client.get("/api/admin/users/export/", {"output": "jsonl", "business_type": "shop"})
+
+        self.assertTrue(csv_response.streaming)
+        lines = b"".join(csv_response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["id", "phone_whatsapp"])
+        self.assertEqual(len(lines), 5)
+        rows = [json.loads(line) for line in b"".join(jsonl_response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["business_type"], "SHOP")
+
+
+class RateLimitTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        reset_local_state()
+        self.addCleanup(reset_local_state)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("3/15m"), (3, 3 / 900))
+        self.assertEqual(parse_rate("60/m"), (60, 1.0))
+        self.assertEqual(parse_limit("3/15m fixed"), ("fixed", 3, 900))
+        with self.assertRaises(ValueError):
+            parse_rate("trois par minute")
+
+    def test_fixed_window_does_not_refill(self):
+        self.assertEqual([count_hit("ratelimit:test", 3, 900) for _ in range(3)], [0.0, 0.0, 0.0])
+        wait = count_hit("ratelimit:test", 3, 900)
+        self.assertGreater(wait, 800)
+
+        with patch("core.utils.rate_limit.get_redis_connection", side_effect=RedisError("down")):
+            hits = [count_hit("ratelimit:local", 2, 900) for _ in range(3)]
+        self.assertEqual(hits[:2], [0.0, 0.0])
+        self.assertGreater(hits[2], 800)
+
+    @override_settings(RATE_LIMITS={"login_ip": "1/m"}, REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1})
+    def test_ip_limit_uses_forwarded_client_address(self):
+        def login(forwarded_for):
+            return self.client.post(
+                "/api/auth/login/",
+                {"phone_whatsapp": "243899530506", "password": "x"},
+                REMOTE_ADDR="10.0.0.1",
+                HTTP_X_FORWARDED_FOR=forwarded_for,
+            ).status_code
+
+        self.assertEqual(login("41.243.0.1"), 401)
+        # Entrée ajoutée par le proxy = la dernière ; le reste peut être forgé
+        self.assertEqual(login("41.243.0.1, 41.243.0.2"), 401)
+        self.assertEqual(login("8.8.8.8, 41.243.0.1"), 429)
+
+    @patch("base_api.controllers.AuthController.send_otp_to_admin_task")
+    @patch("base_api.controllers.AuthController.send_otp_task")
+    def test_request_otp_limited_per_phone(self, otp_task, admin_task):
+        for _ in range(3):
+            response = self.client.post("/api/auth/register/request-otp/", {"phone_whatsapp": "+243899530506"})
+            self.assertEqual(response.status_code, 200)
+
+        response = self.client.post("/api/auth/register/request-otp/", {"phone_whatsapp": "243899530506"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Trop de tentatives", response.data["error"])
+        self.assertGreater(int(response["Retry-After"]), 0)
+        self.assertEqual(otp_task.delay.call_count, 3)
+
+        response = self.client.post("/api/auth/register/request-otp/", {"phone_whatsapp": "243811111111"})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(RATE_LIMITS={"login_ip": "2/m"})
+    def test_rejected_client_short_circuits_redis(self):
+        statuses = [
+            self.client.post("/api/auth/login/", {"phone_whatsapp": "243899530506", "password": "x"}).status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(statuses, [401, 401, 429])
+
+        with patch("core.utils.rate_limit.get_redis_connection") as redis:
+            for _ in range(3):
+                response = self.client.post("/api/auth/login/", {"phone_whatsapp": "243899530506", "password": "x"})
+                self.assertEqual(response.status_code, 429)
+            redis.assert_not_called()
+
+    @override_settings(RATE_LIMITS={"otp_status_ip": "2/m"})
+    def test_otp_status_polling_limited_per_ip(self):
+        statuses = [
+            self.client.get("/api/auth/register/otp-status/", {"phone_whatsapp": phone}).status_code
+            for phone in ("243000000001", "243000000002", "243000000003")
+        ]
+
+        self.assertEqual(statuses, [404, 404, 429])
+
+    @override_settings(RATE_LIMITS={"detect_flow_ip": "2/m"})
+    @patch("core.utils.rate_limit.get_redis_connection", side_effect=RedisError("down"))
+    def test_local_fallback_when_redis_down(self, redis):
+        statuses = [
+            self.client.post("/api/auth/detect-flow/", {"phone_whatsapp": "243899530506"}).status_code
+            for _ in range(3)
+        ]
+
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+@override_settings(
+    TELEGRAM_BOT_TOKEN="test-token",
+    TELEGRAM_ADMIN_CHAT_ID="42",
+    TELEGRAM_RATE_LIMIT_PER_MINUTE=20,
+)
+class TelegramNotifierTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fake = FakeTelegramServer().start()
+        self.addCleanup(self.fake.stop)
+        override = override_settings(TELEGRAM_API_URL=self.fake.url)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    @patch("base_api.tasks.flush_admin_digest_task")
+    def test_errors_are_coalesced_into_one_digest(self, flush_task):
+        for phone in ("243811111111", "243822222222", "243833333333"):
+            notify_admin_error(f"Erreur envoi SMS à {phone}: timeout")
+        notify_admin_error("Erreur envoi message de bienvenue a 243844444444: refusé")
+
+        flush_task.apply_async.assert_called_once()
+        self.assertEqual(flush_admin_digest(), 4)
+        self.assertEqual(flush_admin_digest(), 0)
+
+        self.assertEqual(len(self.fake.requests), 1)
+        text = self.fake.requests[0]["payload"]["text"]
+        self.assertIn("×3 Erreur envoi SMS à 243811111111: timeout", text)
+        self.assertIn("bienvenue", text)
+
+    @override_settings(TELEGRAM_RATE_LIMIT_PER_MINUTE=2)
+    def test_token_bucket_limits_per_chat(self):
+        self.assertEqual(acquire_send_slot("42"), 0)
+        self.assertEqual(acquire_send_slot("42"), 0)
+        self.assertGreater(acquire_send_slot("42"), 0)
+        self.assertEqual(acquire_send_slot("other"), 0)
+
+    @patch("base_api.tasks.flush_admin_digest_task")
+    def test_telegram_429_keeps_errors_for_next_digest(self, flush_task):
+        notify_admin_error("Erreur envoi SMS à 243811111111: timeout")
+        self.fake.fail_with_429 = 1
+
+        with self.assertRaises(TelegramRateLimited) as raised:
+            flush_admin_digest()
+
+        self.assertEqual(raised.exception.retry_after, 3)
+        self.assertEqual(flush_admin_digest(), 1)
+        self.assertEqual(len(self.fake.requests), 1)
+
+    def test_session_is_reused(self):
+        send_error_to_admin("première")
+        send_error_to_admin("seconde")
+
+        self.assertIs(get_session(), get_session())
+        self.assertEqual([r["method"] for r in self.fake.requests], ["sendMessage", "sendMessage"])
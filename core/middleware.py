@@ -0,0 +1,43 @@
+"""
+WhiteNoise, plus les fichiers régénérés à chaud (core.utils.published_files).
+
+WhiteNoise indexe STATIC_ROOT une seule fois au démarrage : un fichier réécrit
+ensuite serait servi avec des en-têtes périmés (taille, Last-Modified). Sous
+PUBLISHED_FILES_URL, le fichier est donc recherché sur le disque à chaque
+requête (un stat), avec les mêmes en-têtes, variantes .gz / .br et réponses 304
+que les fichiers statiques.
+"""
+import os
+
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.responders import IsDirectoryError, MissingFileError
+from whitenoise.string_utils import ensure_leading_trailing_slash
+
+
+class PublishedFilesMiddleware(WhiteNoiseMiddleware):
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        self.published_prefix = ensure_leading_trailing_slash(settings.PUBLISHED_FILES_URL)
+        self.published_root = os.path.abspath(settings.PUBLISHED_FILES_ROOT).rstrip(os.path.sep) + os.path.sep
+
+    def __call__(self, request):
+        if request.path_info.startswith(self.published_prefix):
+            static_file = self.find_published_file(request.path_info)
+            if static_file is not None:
+                return self.serve(static_file, request)
+        return super().__call__(request)
+
+    def find_published_file(self, url):
+        if not self.url_is_canonical(url):
+            return None
+        path = os.path.join(self.published_root, url[len(self.published_prefix):])
+        if os.path.commonprefix((self.published_root, path)) != self.published_root:
+            return None
+        if self.is_compressed_variant(path):
+            # name.gz demandé directement alors que name existe : variante interne
+            return None
+        try:
+            return self.get_static_file(path, url)
+        except (MissingFileError, IsDirectoryError):
+            return None
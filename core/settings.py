@@ -4,6 +4,7 @@ from pathlib import Path
 import dj_database_url
 from datetime import timedelta
 from dotenv import load_dotenv
+from celery.schedules import crontab
 from corsheaders.defaults import default_headers, default_methods
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -55,7 +56,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware', # Indispensable pour React
-    'whitenoise.middleware.WhiteNoiseMiddleware', # Pour les fichiers statiques
+    # WhiteNoise + fichiers régénérés à chaud (sitemaps, fil JSON) sous PUBLISHED_FILES_URL
+    'core.middleware.PublishedFilesMiddleware', # Pour les fichiers statiques
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -103,13 +105,30 @@ AUTH_USER_MODEL = 'base_api.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication avec user + boutique en cache (base_api/authentication.py)
+        'base_api.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     # AJOUTE CETTE LIGNE :
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Proxys devant l'app (Render / Koyeb) : IP client lue dans X-Forwarded-For
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+}
+
+# --- LIMITATION DE DÉBIT (core/utils/rate_limit.py) ---
+# "N/période" : N requêtes en rafale, rechargées sur la période (s, m, h, d, ex. 15m)
+# "N/période fixed" : N requêtes au plus par fenêtre fixe
+RATE_LIMITS = {
+    'otp_request_phone': '3/15m fixed',
+    'otp_request_ip': '20/h',
+    'login_phone': '10/15m',
+    'login_ip': '30/m',
+    'detect_flow_ip': '60/m',
+    'otp_status_ip': '60/m',
+    'analytics_event_ip': '120/m',
+    'analytics_batch_ip': '30/m',
 }
 
 SIMPLE_JWT = {
@@ -130,6 +149,14 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
 # Indispensable pour éviter que le build plante sur un fichier JS de l'admin
 WHITENOISE_MANIFEST_STRICT = False
 
+# Fichiers pré-générés (core/utils/published_files.py), servis par WhiteNoise
+# Dossier partagé entre le web et les workers Celery (volume published_files
+# de docker-compose.yml ; voir README)
+PUBLISHED_FILES_ROOT = os.getenv('PUBLISHED_FILES_ROOT', os.path.join(BASE_DIR, 'var', 'published'))
+PUBLISHED_FILES_URL = '/published/'
+# Hôte de l'API, pour les URLs absolues (index des sitemaps)
+PUBLISHED_FILES_BASE_URL = os.getenv('PUBLISHED_FILES_BASE_URL', 'https://moaning-barbabra-niplan-48fc75fc.koyeb.app')
+
 CLOUDINARY_STORAGE = {
     'CLOUD_NAME': os.environ.get('CLOUDINARY_NAME'),
     'API_KEY': os.environ.get('CLOUDINARY_API_KEY'),
@@ -186,6 +213,28 @@ CACHES = {
 
 CACHE_TTL = 60 * 5  # 5 minutes
 
+# --- ANALYTICS ---
+# Fenêtre (secondes) pendant laquelle un même événement d'un même visiteur est ignoré
+ANALYTICS_DEDUP_WINDOW = int(os.getenv('ANALYTICS_DEDUP_WINDOW', 30))
+# Taille maximale d'un lot envoyé à api/analytics/events/batch/
+ANALYTICS_BATCH_MAX_EVENTS = int(os.getenv('ANALYTICS_BATCH_MAX_EVENTS', 50))
+
+# --- TENDANCES ---
+TRENDING_HALF_LIFE_HOURS = int(os.getenv('TRENDING_HALF_LIFE_HOURS', 24))  # Demi-vie d'un événement
+TRENDING_WINDOW_DAYS = 7  # Historique relu lors de la reconstruction
+
+# --- PERTINENCE (recherche / filtres du fil public) ---
+# Évaluer un changement de poids avec : python manage.py evaluate_ranking --weights '{...}'
+LISTING_RANKING_WEIGHTS = {
+    'text': 1.0,        # Score plein texte (titre > description)
+    'freshness': 0.4,   # Décroissance exponentielle de l'âge de l'annonce
+    'promoted': 0.3,    # Listing.is_promoted
+    'verified': 0.15,   # Téléphone vérifié ou profil KYC vérifié
+    'conversion': 0.5,  # Taux de clics WhatsApp / vues (lissé)
+}
+LISTING_FRESHNESS_HALF_LIFE_DAYS = 14
+LISTING_RANKING_ENGAGEMENT_DAYS = 30
+
 # --- CELERY (Redis) ---
 # URL de Redis (le même que pour le cache, mais sur une DB différente, ex: DB 0)
 CELERY_BROKER_URL = REDIS_URL
@@ -199,6 +248,80 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Africa/Kinshasa' # Très important pour Niplan
 
+# Les OTP ont leur propre queue (worker dédié : celery -A core worker -Q otp)
+CELERY_TASK_ROUTES = {
+    'base_api.tasks.send_otp_task': {'queue': 'otp'},
+    'base_api.tasks.send_otp_to_admin_task': {'queue': 'otp'},
+}
+
+# Tâches périodiques (celery beat)
+CELERY_BEAT_SCHEDULE = {
+    # Clôture journalière des sketches HyperLogLog (visiteurs uniques)
+    'persist-unique-visitors': {
+        'task': 'analytics.tasks.persist_unique_visitors_task',
+        'schedule': crontab(hour=0, minute=10),
+    },
+    # Reconstruction des scores tendance (remet l'epoch de décroissance à zéro)
+    'rebuild-trending': {
+        'task': 'listing.tasks.rebuild_trending_task',
+        'schedule': crontab(minute=5),
+    },
+    # Score de pertinence statique des annonces (Listing.rank_score)
+    'refresh-rank-scores': {
+        'task': 'listing.tasks.refresh_rank_scores_task',
+        'schedule': crontab(minute='*/30'),
+    },
+    # Index des annonces similaires : incrémental + reconstruction nocturne
+    'update-similar-listings': {
+        'task': 'listing.tasks.update_similar_listings_task',
+        'schedule': crontab(minute='*/10'),
+    },
+    'rebuild-similar-listings': {
+        'task': 'listing.tasks.rebuild_similar_listings_task',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    # Suggestions de recherche (typeahead)
+    'rebuild-autocomplete': {
+        'task': 'listing.tasks.rebuild_autocomplete_task',
+        'schedule': crontab(minute=15),
+    },
+    # Compteurs d'annonces actives par localisation
+    'recount-locations': {
+        'task': 'listing.tasks.recount_locations_task',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    # Alertes des recherches sauvegardées, regroupées par destinataire
+    'send-saved-search-alerts': {
+        'task': 'listing.tasks.send_saved_search_alerts_task',
+        'schedule': crontab(minute='*/10'),
+    },
+    # Purge des codes OTP utilisés ou expirés
+    'purge-otp-codes': {
+        'task': 'base_api.tasks.purge_otp_codes_task',
+        'schedule': crontab(minute=40),
+    },
+    # Purge des suppressions d'annonces au-delà de LISTING_SYNC_TOMBSTONE_DAYS
+    'purge-listing-tombstones': {
+        'task': 'listing.tasks.purge_listing_tombstones_task',
+        'schedule': crontab(hour=4, minute=20),
+    },
+    # Purge du journal des changements publics au-delà de LISTING_CHANGES_RETENTION_DAYS
+    'purge-listing-changes': {
+        'task': 'listing.tasks.purge_listing_changes_task',
+        'schedule': crontab(hour=4, minute=25),
+    },
+    # Sitemaps (seuls les fichiers modifiés sont réécrits)
+    'build-sitemaps': {
+        'task': 'listing.tasks.build_sitemaps_task',
+        'schedule': crontab(minute=50),
+    },
+    # Instantanés du fil : rattrape les scores rafraîchis en masse (rank_score) et Redis indisponible
+    'rebuild-feed-snapshots': {
+        'task': 'listing.tasks.rebuild_feed_snapshots_task',
+        'schedule': crontab(minute='*/15'),
+    },
+}
+
 # Credentials Twilio
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
@@ -207,6 +330,57 @@ TWILIO_OTP_TEMPLATE_SID = os.getenv('TWILIO_OTP_TEMPLATE_SID')  # SID du templat
 TWILIO_SMS_NUMBER = os.getenv('TWILIO_SMS_NUMBER')  # Numéro de téléphone pour l'envoi de SMS (si fallback nécessaire)
 TWILIO_SANDBOX_WHATSAPP_NUMBER=os.getenv('TWILIO_SANDBOX_WHATSAPP_NUMBER')  # Numéro de téléphone sandbox pour les tests WhatsApp (ex: 'whatsapp:+14155238886')
 TWILIO_ALPHA_SENDER_ID=os.getenv('TWILIO_ALPHA_SENDER_ID')  # ID de l'expéditeur alphanumérique pour les messages SMS en DRC
+
+# --- RECHERCHES SAUVEGARDÉES (listing/services/saved_searches.py) ---
+SAVED_SEARCH_LISTING_URL = os.getenv('SAVED_SEARCH_LISTING_URL', 'https://niplan-market.vercel.app/listing/{slug}')
+# Annonces détaillées par message (les suivantes sont seulement comptées)
+SAVED_SEARCH_ALERT_MAX_LISTINGS = int(os.getenv('SAVED_SEARCH_ALERT_MAX_LISTINGS', 3))
+# Recherches actives maximum par utilisateur
+SAVED_SEARCH_MAX_PER_USER = int(os.getenv('SAVED_SEARCH_MAX_PER_USER', 20))
+
+# --- EXPORT ANALYTICS (analytics/export.py) ---
+# Durée maximale du verrou "un export à la fois" si le worker meurt en cours d'export
+ANALYTICS_EXPORT_LOCK_SECONDS = int(os.getenv('ANALYTICS_EXPORT_LOCK_SECONDS', 30 * 60))
+
+# --- SYNCHRONISATION DU CATALOGUE VENDEUR (listing/services/catalog_sync.py) ---
+# Au-delà, un client doit recharger tout son catalogue (reset)
+LISTING_SYNC_TOMBSTONE_DAYS = int(os.getenv('LISTING_SYNC_TOMBSTONE_DAYS', 30))
+
+# --- FLUX PUBLIC DES CHANGEMENTS (listing/services/change_feed.py) ---
+# Au-delà, un client hors ligne doit recharger le catalogue (reset)
+LISTING_CHANGES_RETENTION_DAYS = int(os.getenv('LISTING_CHANGES_RETENTION_DAYS', 30))
+
+# --- SITEMAPS (listing/services/sitemaps.py) ---
+SITEMAP_LISTING_URL = os.getenv('SITEMAP_LISTING_URL', 'https://niplan-market.vercel.app/listing/{slug}')
+SITEMAP_BUSINESS_URL = os.getenv('SITEMAP_BUSINESS_URL', 'https://niplan-market.vercel.app/business/{slug}')
+
+# --- INSTANTANÉS DU FIL (listing/services/feed_snapshots.py) ---
+# Pages pré-rendues par fil (toutes catégories + catégories les plus fournies)
+FEED_SNAPSHOT_PAGES = int(os.getenv('FEED_SNAPSHOT_PAGES', 3))
+FEED_SNAPSHOT_CATEGORIES = int(os.getenv('FEED_SNAPSHOT_CATEGORIES', 5))
+# Une seule reconstruction par rafale de modifications
+FEED_SNAPSHOT_DEBOUNCE_SECONDS = int(os.getenv('FEED_SNAPSHOT_DEBOUNCE_SECONDS', 30))
+
+# --- CODES OTP (base_api/otp.py) ---
+OTP_TTL_SECONDS = int(os.getenv('OTP_TTL_SECONDS', 600))
+# Essais de vérification par code avant d'exiger un nouveau code
+OTP_MAX_VERIFY_ATTEMPTS = int(os.getenv('OTP_MAX_VERIFY_ATTEMPTS', 5))
+# Au-delà, les lignes OTPCode sont purgées (le journal admin couvre 24 heures)
+OTP_RETENTION_HOURS = int(os.getenv('OTP_RETENTION_HOURS', 48))
+
+# --- MESSAGERIE (core/utils/messaging.py) ---
+# "twilio" en production, "file" pour les tests de charge sans Twilio
+MESSAGING_PROVIDER = os.getenv('MESSAGING_PROVIDER', 'twilio')
+MESSAGING_FAKE_OUTBOX = os.getenv('MESSAGING_FAKE_OUTBOX', str(BASE_DIR / 'var' / 'messaging_outbox.jsonl'))
+MESSAGING_FAKE_LATENCY_MS = int(os.getenv('MESSAGING_FAKE_LATENCY_MS', 0))
+# Envois simultanés maximum par process (send_bulk)
+MESSAGING_MAX_CONCURRENCY = int(os.getenv('MESSAGING_MAX_CONCURRENCY', 8))
 # Credentials Telegram pour les notifications d'erreurs critiques
 TELEGRAM_ADMIN_CHAT_ID=os.getenv('TELEGRAM_ADMIN_CHAT_ID')  # Chat ID Telegram pour les notifications d'erreurs critiques
 TELEGRAM_BOT_TOKEN=os.getenv('TELEGRAM_BOT_TOKEN')  # Token du bot Telegram pour envoyer les notifications
+# Remplaçable par le faux serveur local (python -m core.utils.telegram_fake)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+# Limite d'envoi par chat (token bucket Redis)
+TELEGRAM_RATE_LIMIT_PER_MINUTE = int(os.getenv('TELEGRAM_RATE_LIMIT_PER_MINUTE', 20))
+# Les erreurs reçues pendant cette fenêtre (secondes) partent en un seul résumé
+TELEGRAM_DIGEST_WINDOW = int(os.getenv('TELEGRAM_DIGEST_WINDOW', 30))
@@ -11,11 +11,12 @@ from base_api.controllers.AuthController import (
     DetectUserFlowView,
     NewUserRequestOTPView,
     NewUserVerifyOTPView,
+    OTPDeliveryStatusView,
     LegacyUserSetPasswordView,
     LoginView,
     # Ancien (deprecated)
 )
-from base_api.controllers.AdminController import AdminUserListView, AdminOTPLogView
+from base_api.controllers.AdminController import AdminUserExportView, AdminUserListView, AdminOTPLogView
 from base_api.controllers.BusinessController import BusinessDetailView, MyBusinessUpdateView
 
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
@@ -44,6 +45,7 @@ urlpatterns = [
     # Nouveaux utilisateurs (OTP + création compte)
     path('api/auth/register/request-otp/', NewUserRequestOTPView.as_view(), name='register-request-otp'),
     path('api/auth/register/verify-otp/', NewUserVerifyOTPView.as_view(), name='register-verify-otp'),
+    path('api/auth/register/otp-status/', OTPDeliveryStatusView.as_view(), name='register-otp-status'),
     
     # Anciens utilisateurs (setup MDP sans OTP)
     path('api/auth/legacy/set-password/', LegacyUserSetPasswordView.as_view(), name='legacy-set-password'),
@@ -70,6 +72,7 @@ urlpatterns = [
 
     # --- ADMIN ---
     path('api/admin/users/', AdminUserListView.as_view(), name='admin-users'),
+    path('api/admin/users/export/', AdminUserExportView.as_view(), name='admin-users-export'),
     path('api/admin/otps/', AdminOTPLogView.as_view(), name='admin-otps'),
 
     # --- ANALYTICS ---
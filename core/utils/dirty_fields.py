@@ -0,0 +1,83 @@
+"""
+Suivi des champs modifiés depuis le chargement d'une instance.
+
+DirtyFieldsMixin mémorise les valeurs chargées (Model.from_db) ; au save(),
+une instance existante sans changement n'écrit rien (pas de requête, pas de
+signaux ni d'invalidation de cache), sinon seuls les champs modifiés (et les
+champs auto_now) sont écrits via update_fields.
+
+Un save() explicite avec update_fields, force_insert / force_update ou des
+arguments positionnels garde le comportement standard de Django.
+"""
+import copy
+
+from django.db.models.fields.files import FieldFile
+
+
+def _comparable(value):
+    if isinstance(value, FieldFile):
+        return value.name
+    if isinstance(value, (dict, list)):
+        # JSONField : une mutation sur place doit rester détectable
+        return copy.deepcopy(value)
+    return value
+
+
+class DirtyFieldsMixin:
+    """A placer avant la classe de base du modèle : class Foo(DirtyFieldsMixin, models.Model)."""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_values()
+        return instance
+
+    def _remember_loaded_values(self, fields=None):
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        for field in self._meta.concrete_fields:
+            if fields is not None and field.attname not in fields and field.name not in fields:
+                continue
+            # Champs différés (.only / .defer) : absents de __dict__ tant qu'ils ne sont pas lus
+            if field.attname in self.__dict__:
+                loaded[field.attname] = _comparable(self.__dict__[field.attname])
+
+    def get_dirty_fields(self):
+        """Noms des champs modifiés depuis le chargement (tous pour une nouvelle instance)."""
+        loaded = self.__dict__.get("_loaded_values")
+        dirty = set()
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            if (
+                loaded is None
+                or self._state.adding
+                or field.attname not in loaded
+                or loaded[field.attname] != _comparable(self.__dict__[field.attname])
+            ):
+                dirty.add(field.name)
+        return dirty
+
+    def is_dirty(self):
+        return bool(self.get_dirty_fields())
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember_loaded_values(fields)
+
+    def save(self, *args, **kwargs):
+        tracked = (
+            not args
+            and not self._state.adding
+            and "_loaded_values" in self.__dict__
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+            and not kwargs.get("force_update")
+        )
+        if tracked:
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            auto_now = {field.name for field in self._meta.concrete_fields if getattr(field, "auto_now", False)}
+            kwargs["update_fields"] = dirty | auto_now
+        super().save(*args, **kwargs)
+        self._remember_loaded_values()
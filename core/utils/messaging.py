@@ -0,0 +1,130 @@
+"""
+Passerelle d'envoi de messages (SMS / WhatsApp).
+
+Une seule passerelle par process, qui garde un client et sa session HTTP
+(pool de connexions) au lieu de créer un twilio.rest.Client par message. Le
+fournisseur est choisi par MESSAGING_PROVIDER : "twilio" en production,
+"file" pour les tests de charge (chaque message est ajouté à un fichier
+JSON lines, sans appel réseau).
+
+Les résultats sont des dicts : {"success", "sid", "error", "provider", "to",
+"duration_ms"}.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+logger = logging.getLogger(__name__)
+
+
+class TwilioProvider:
+    name = "twilio"
+
+    def __init__(self, timeout=10):
+        if not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN:
+            raise ValueError("Configuration Twilio manquante: SID ou auth token")
+        # pool_connections : une requests.Session réutilisée pour tous les envois
+        http_client = TwilioHttpClient(pool_connections=True, timeout=timeout)
+        self.client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=http_client)
+
+    def send(self, payload):
+        return self.client.messages.create(**payload).sid
+
+
+class FileProvider:
+    """Fournisseur local : écrit les messages dans un fichier au lieu de les envoyer."""
+
+    name = "file"
+
+    def __init__(self, path, latency_ms=0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Latence simulée d'un fournisseur réel
+        self.latency = latency_ms / 1000
+        self._lock = threading.Lock()
+
+    def send(self, payload):
+        if self.latency:
+            time.sleep(self.latency)
+        sid = f"FK{uuid.uuid4().hex}"
+        line = json.dumps({"sid": sid, "at": timezone.now().isoformat(), **payload}, ensure_ascii=False, default=str)
+        with self._lock, self.path.open("a", encoding="utf-8") as outbox:
+            outbox.write(line + "\n")
+        return sid
+
+
+def build_provider():
+    provider = getattr(settings, "MESSAGING_PROVIDER", "twilio")
+    if provider == "file":
+        return FileProvider(
+            settings.MESSAGING_FAKE_OUTBOX,
+            latency_ms=getattr(settings, "MESSAGING_FAKE_LATENCY_MS", 0),
+        )
+    if provider == "twilio":
+        return TwilioProvider()
+    raise ValueError(f"MESSAGING_PROVIDER inconnu : {provider}")
+
+
+class MessagingGateway:
+    def __init__(self, provider, max_concurrency=8):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def send(self, payload):
+        """payload : arguments de messages.create (from_, to, body ou content_sid...)."""
+        started = time.monotonic()
+        result = {"provider": self.provider.name, "to": payload.get("to")}
+        try:
+            result.update(success=True, sid=self.provider.send(payload), error=None)
+        except Exception as exc:
+            logger.warning("Message to %s failed via %s: %s", payload.get("to"), self.provider.name, exc)
+            result.update(success=False, sid=None, error=str(exc))
+        result["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return result
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="messaging"
+                )
+            return self._executor
+
+    def send_bulk(self, payloads):
+        """Envois en parallèle (au plus max_concurrency à la fois), résultats dans l'ordre."""
+        return list(self._pool().map(self.send, payloads))
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Passerelle du process, créée au premier envoi (après le fork des workers)."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = MessagingGateway(
+                    build_provider(),
+                    max_concurrency=getattr(settings, "MESSAGING_MAX_CONCURRENCY", 8),
+                )
+    return _gateway
+
+
+def reset_gateway():
+    """Force la recréation (changement de configuration, tests)."""
+    global _gateway
+    with _gateway_lock:
+        _gateway = None
@@ -0,0 +1,61 @@
+"""
+Fichiers pré-générés (sitemaps, pages JSON) servis sans passer par les vues.
+
+Ils sont écrits sous PUBLISHED_FILES_ROOT (dossier partagé entre le web et les
+workers Celery) et servis sous PUBLISHED_FILES_URL par
+core.middleware.PublishedFilesMiddleware (WhiteNoise). Chaque écriture passe
+par un fichier temporaire renommé à la fin : un lecteur ne voit jamais un
+fichier à moitié écrit.
+"""
+import gzip
+import os
+import tempfile
+
+from django.conf import settings
+
+from core.utils.streaming_export import gzip_chunks
+
+
+def published_path(name):
+    return os.path.join(settings.PUBLISHED_FILES_ROOT, name)
+
+
+def published_url(name):
+    """URL absolue (sitemap index, robots.txt...)."""
+    base = settings.PUBLISHED_FILES_BASE_URL.rstrip("/")
+    return f"{base}{settings.PUBLISHED_FILES_URL}{name}"
+
+
+def write_file(name, chunks, compress=False):
+    """
+    Écrit les blocs d'octets dans name, compressés en gzip au fil de l'eau si
+    compress. Retourne le chemin du fichier.
+    """
+    path = published_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            for chunk in gzip_chunks(chunks) if compress else chunks:
+                tmp.write(chunk)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def write_with_gzip_variant(name, data):
+    """
+    Écrit name.gz (compressé une fois pour toutes) puis name : WhiteNoise sert
+    la variante .gz aux clients qui acceptent gzip, sans compression à la volée.
+    """
+    write_file(f"{name}.gz", [gzip.compress(data, compresslevel=9)])
+    return write_file(name, [data])
+
+
+def remove_file(name):
+    for path in (published_path(name), published_path(f"{name}.gz")):
+        if os.path.exists(path):
+            os.unlink(path)
@@ -0,0 +1,307 @@
+"""
+Limitation de débit (token bucket) partagée par tous les endpoints.
+
+- Un seul script Lua Redis par vérification : lecture, recharge et prise du
+  jeton sont atomiques (pas de get puis set concurrents) et coûtent un seul
+  aller-retour.
+- Un client refusé est mémorisé localement jusqu'à la fin de son délai : ses
+  requêtes suivantes sont rejetées sans appel Redis.
+- Si Redis est indisponible, un bucket en mémoire (par process) prend le relais.
+
+Les limites sont déclarées dans settings.RATE_LIMITS ({"scope": "3/15m"}) et
+appliquées par clé client : "ip" (X-Forwarded-For selon NUM_PROXIES, comme
+les throttles DRF), "user" (id, ou IP si anonyme) ou "phone" (phone_whatsapp
+de la requête). Deux points d'entrée : le décorateur rate_limit pour les
+méthodes de vues, et throttle() pour throttle_classes.
+
+Une limite suivie de "fixed" ("3/15m fixed") est une fenêtre fixe (compteur
+INCR + EXPIRE) : au plus N requêtes par période, sans rechargement progressif.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ratelimit"
+# Nombre maximal de clés gardées en mémoire (buckets de secours, rejets)
+LOCAL_MAX_KEYS = 10000
+RATE_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*(fixed)?\s*$")
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+TOKEN_BUCKET = "bucket"
+FIXED_WINDOW = "fixed"
+
+# Token bucket : KEYS[1] = état du bucket, ARGV = capacité, jetons par seconde.
+# Retourne le délai d'attente en secondes ("0" si un jeton a été pris).
+_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class LocalBuckets:
+    """Token buckets en mémoire, bornés en nombre de clés (LRU)."""
+
+    def __init__(self, max_keys=LOCAL_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + max(now - ts, 0) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def hit(self, key, limit, period):
+        """Fenêtre fixe : compte la requête ; retourne le délai d'attente (0 si autorisé)."""
+        now = time.monotonic()
+        with self._lock:
+            hits, until = self._buckets.pop(key, (0, now + period))
+            if until <= now:
+                hits, until = 0, now + period
+            hits += 1
+            self._buckets[key] = (hits, until)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return 0.0 if hits <= limit else until - now
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class Blocklist:
+    """Clients refusés, jusqu'à la fin de leur délai d'attente."""
+
+    def __init__(self, max_keys=LOCAL_MAX_KEYS):
+        self.max_keys = max_keys
+        self._until = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remaining(self, key):
+        with self._lock:
+            until = self._until.get(key)
+            if until is None:
+                return 0.0
+            wait = until - time.monotonic()
+            if wait <= 0:
+                del self._until[key]
+                return 0.0
+            return wait
+
+    def block(self, key, wait):
+        with self._lock:
+            self._until.pop(key, None)
+            self._until[key] = time.monotonic() + wait
+            if len(self._until) > self.max_keys:
+                self._until.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._until.clear()
+
+
+_local_buckets = LocalBuckets()
+_blocklist = Blocklist()
+
+
+def reset_local_state():
+    """Vide les buckets de secours et les rejets mémorisés (tests)."""
+    _local_buckets.clear()
+    _blocklist.clear()
+
+
+@lru_cache(maxsize=None)
+def parse_limit(rate):
+    """'3/15m' -> (TOKEN_BUCKET, 3, 900) ; '3/15m fixed' -> (FIXED_WINDOW, 3, 900)."""
+    match = RATE_RE.match(rate)
+    if not match:
+        raise ValueError(f"Limite invalide : {rate!r} (attendu par ex. '10/m', '3/15m' ou '3/15m fixed')")
+    count, multiplier, unit, fixed = match.groups()
+    period = int(multiplier or 1) * PERIODS[unit]
+    return FIXED_WINDOW if fixed else TOKEN_BUCKET, int(count), period
+
+
+def parse_rate(rate):
+    """'3/15m' -> (capacité 3, 3 jetons par 900 secondes)."""
+    _, count, period = parse_limit(rate)
+    return count, count / period
+
+
+def get_limit(scope):
+    rate = getattr(settings, "RATE_LIMITS", {}).get(scope)
+    return parse_limit(rate) if rate else None
+
+
+def take_token(key, capacity, rate):
+    """Prend un jeton ; retourne le délai d'attente en secondes (0 si autorisé)."""
+    try:
+        conn = get_redis_connection("default")
+        return float(conn.register_script(_BUCKET_SCRIPT)(keys=[key], args=[capacity, rate]))
+    except RedisError as exc:
+        logger.warning("Rate limiter falling back to local buckets for %s: %s", key, exc)
+        return _local_buckets.take(key, capacity, rate)
+
+
+def count_hit(key, limit, period):
+    """
+    Fenêtre fixe ouverte par la première requête : compte celle-ci et retourne
+    le délai jusqu'à la fin de la fenêtre si limit est dépassé (0 sinon).
+    """
+    try:
+        pipe = get_redis_connection("default").pipeline()
+        pipe.set(key, 0, ex=period, nx=True)
+        pipe.incr(key)
+        pipe.ttl(key)
+        _, hits, ttl = pipe.execute()
+    except RedisError as exc:
+        logger.warning("Rate limiter falling back to local windows for %s: %s", key, exc)
+        return _local_buckets.hit(key, limit, period)
+    return 0.0 if hits <= limit else float(max(ttl, 1))
+
+
+# --- Clés client -------------------------------------------------------------
+
+_ident = BaseThrottle()
+
+
+def client_ip(request):
+    # Derrière le proxy de l'hébergeur, REMOTE_ADDR est celle du proxy :
+    # X-Forwarded-For est lu selon REST_FRAMEWORK["NUM_PROXIES"]
+    return _ident.get_ident(request) or "unknown"
+
+
+def client_user(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{client_ip(request)}"
+
+
+def client_phone(request):
+    data = getattr(request, "data", None) or {}
+    phone = "".join(str(data.get("phone_whatsapp") or "").split()).lstrip("+")
+    return phone or None
+
+
+KEY_FUNCTIONS = {
+    "ip": client_ip,
+    "user": client_user,
+    "phone": client_phone,
+}
+
+
+def check(scope, request, key="ip"):
+    """
+    Délai d'attente imposé à ce client pour ce scope (0 si la requête passe).
+    Sans limite configurée ou sans valeur de clé (numéro absent), rien n'est
+    limité.
+    """
+    limit = get_limit(scope)
+    ident = KEY_FUNCTIONS[key](request)
+    if limit is None or ident is None:
+        return 0.0
+
+    bucket_key = f"{KEY_PREFIX}:{scope}:{ident}"
+    wait = _blocklist.remaining(bucket_key)
+    if wait:
+        return wait
+    kind, count, period = limit
+    if kind == FIXED_WINDOW:
+        wait = count_hit(bucket_key, count, period)
+    else:
+        wait = take_token(bucket_key, count, count / period)
+    if wait:
+        _blocklist.block(bucket_key, wait)
+    return wait
+
+
+def format_wait(wait):
+    if wait >= 60:
+        return f"{math.ceil(wait / 60)} minutes"
+    return f"{math.ceil(wait)} secondes"
+
+
+def too_many_requests(wait):
+    response = Response(
+        {"error": f"Trop de tentatives. Réessayez dans {format_wait(wait)}."},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+    )
+    response["Retry-After"] = str(math.ceil(wait))
+    return response
+
+
+def rate_limit(scope, key="ip"):
+    """Décorateur pour les méthodes de vues (post, get...) : 429 si la limite est atteinte."""
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(view, request, *args, **kwargs):
+            wait = check(scope, request, key)
+            if wait:
+                return too_many_requests(wait)
+            return view_method(view, request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class RedisRateThrottle(BaseThrottle):
+    """Throttle DRF sur les mêmes limites ; scope et key définis par throttle()."""
+
+    scope = None
+    key = "ip"
+
+    def allow_request(self, request, view):
+        self.wait_seconds = check(self.scope, request, self.key)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+@lru_cache(maxsize=None)
+def throttle(scope, key="ip"):
+    """Classe de throttle pour throttle_classes, ex. [throttle("analytics_ingest")]."""
+    return type(
+        f"{scope.title().replace('_', '')}Throttle",
+        (RedisRateThrottle,),
+        {"scope": scope, "key": key},
+    )
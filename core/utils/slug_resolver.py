@@ -0,0 +1,140 @@
+"""
+Résolution slug -> id partagée (listings et businesses).
+
+Deux niveaux : un LRU en mémoire par process (TTL court) puis Redis via le
+cache Django. La base n'est interrogée qu'en cas de double miss, en une seule
+requête IN. Les signaux post_save / post_delete invalident les entrées.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+LOCAL_TTL = 30  # secondes, borne la fenêtre d'incohérence entre workers
+LOCAL_MAX_SIZE = 5000
+REDIS_TTL = 60 * 60
+# Slug inconnu : mis en cache (Redis uniquement) pour épargner la base
+MISSING = False
+
+
+class LocalLRUCache:
+    """LRU thread-safe avec expiration, propre à chaque process."""
+
+    def __init__(self, max_size=LOCAL_MAX_SIZE, ttl=LOCAL_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SlugResolver:
+    def __init__(self, namespace, fetch):
+        self.namespace = namespace
+        # fetch(slugs) -> {slug: valeur} depuis la base
+        self._fetch = fetch
+        self.local = LocalLRUCache()
+
+    def _key(self, slug):
+        return f"slug_resolver:{self.namespace}:{slug}"
+
+    def resolve(self, slugs):
+        """Retourne {slug: valeur} pour les slugs connus."""
+        slugs = {slug for slug in slugs if slug}
+        resolved = {}
+
+        pending = []
+        for slug in slugs:
+            value = self.local.get(slug)
+            if value is None:
+                pending.append(slug)
+            else:
+                resolved[slug] = value
+
+        if pending:
+            cached = cache.get_many([self._key(slug) for slug in pending])
+            still_missing = []
+            for slug in pending:
+                value = cached.get(self._key(slug))
+                if value is None:
+                    still_missing.append(slug)
+                elif value is not MISSING:
+                    resolved[slug] = value
+                    self.local.set(slug, value)
+
+            if still_missing:
+                fetched = self._fetch(still_missing)
+                cache.set_many(
+                    {self._key(slug): fetched.get(slug, MISSING) for slug in still_missing},
+                    REDIS_TTL,
+                )
+                for slug, value in fetched.items():
+                    resolved[slug] = value
+                    self.local.set(slug, value)
+
+        return resolved
+
+    def resolve_one(self, slug):
+        return self.resolve([slug]).get(slug)
+
+    def invalidate(self, *slugs):
+        slugs = [slug for slug in slugs if slug]
+        for slug in slugs:
+            self.local.delete(slug)
+        cache.delete_many([self._key(slug) for slug in slugs])
+
+    def invalidate_instance(self, instance):
+        """Invalide le slug de l'instance et, s'il vient de changer, l'ancien."""
+        # post_save : _loaded_values (DirtyFieldsMixin) contient encore l'ancien slug
+        previous = instance.__dict__.get("_loaded_values", {}).get("slug")
+        self.invalidate(instance.slug, previous)
+
+
+def _fetch_listings(slugs):
+    from listing.models import Listing
+
+    return {
+        slug: (listing_id, business_id)
+        for slug, listing_id, business_id in Listing.objects.filter(slug__in=slugs).order_by().values_list(
+            "slug", "id", "business_id"
+        )
+    }
+
+
+def _fetch_businesses(slugs):
+    from base_api.models import Business
+
+    return dict(Business.objects.filter(slug__in=slugs).values_list("slug", "id"))
+
+
+# slug -> (listing_id, business_id)
+listing_slugs = SlugResolver("listing", _fetch_listings)
+# slug -> business_id
+business_slugs = SlugResolver("business", _fetch_businesses)
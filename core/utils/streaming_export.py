@@ -0,0 +1,109 @@
+"""
+Exports CSV / JSON lines en streaming.
+
+Les lignes sont produites une à une (queryset.iterator(), curseur côté
+serveur sous PostgreSQL) et écrites au fil de l'eau dans la réponse : la
+mémoire utilisée ne dépend pas du nombre de lignes. Elles sont regroupées en
+blocs d'environ BUFFER_SIZE octets, éventuellement compressés en gzip au fil
+de l'eau.
+"""
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+}
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+GZIP_CONTENT_TYPE = "application/gzip"
+
+
+class Echo:
+    """Pseudo-fichier pour csv.writer : writerow() retourne la ligne au lieu de l'écrire."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(columns, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + "\n"
+
+
+def buffered(lines, size=BUFFER_SIZE):
+    """Regroupe les lignes en blocs d'octets : un write par bloc et non par ligne."""
+    buffer = []
+    length = 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(buffer).encode()
+            buffer = []
+            length = 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def gzip_chunks(chunks):
+    # wbits=31 : en-tête et somme de contrôle gzip
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class ClosingStream:
+    """
+    Contenu de la réponse : on_close est appelé à la fermeture de la réponse
+    (fin du flux, client déconnecté ou réponse jamais lue).
+    """
+
+    def __init__(self, chunks, on_close=None):
+        self.chunks = chunks
+        self.on_close = on_close
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        on_close, self.on_close = self.on_close, None
+        if hasattr(self.chunks, "close"):
+            self.chunks.close()
+        if on_close is not None:
+            on_close()
+
+
+def export_response(columns, rows, export_format, filename, compress=False, on_close=None):
+    """
+    rows : itérable de tuples dans l'ordre de columns (ex. values_list(...).iterator()).
+    compress : fichier .gz compressé au fil de l'eau.
+    on_close : appelé à la fermeture de la réponse (libération d'un verrou...).
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export inconnu : {export_format} (csv ou jsonl)")
+    lines = csv_lines(columns, rows) if export_format == "csv" else jsonl_lines(columns, rows)
+    chunks = buffered(lines)
+    filename = f"{filename}.{export_format}"
+    content_type = EXPORT_FORMATS[export_format]
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        content_type = GZIP_CONTENT_TYPE
+    response = StreamingHttpResponse(ClosingStream(chunks, on_close), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
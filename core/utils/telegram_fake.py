@@ -0,0 +1,79 @@
+"""
+Faux serveur de l'API Bot Telegram, pour les tests et le développement local.
+
+    python -m core.utils.telegram_fake 8081
+    TELEGRAM_API_URL=http://127.0.0.1:8081
+
+Chaque appel est enregistré dans FakeTelegramServer.requests ; fail_with_429
+simule la limite de débit de Telegram.
+"""
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTelegramServer:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.requests = []
+        # Nombre de prochains appels qui recevront un 429
+        self.fail_with_429 = 0
+        self.retry_after = 3
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                method = self.path.rsplit("/", 1)[-1]
+                with fake._lock:
+                    if fake.fail_with_429:
+                        fake.fail_with_429 -= 1
+                        status, body = 429, {
+                            "ok": False,
+                            "error_code": 429,
+                            "description": "Too Many Requests",
+                            "parameters": {"retry_after": fake.retry_after},
+                        }
+                    else:
+                        fake.requests.append({"method": method, "payload": payload})
+                        status, body = 200, {
+                            "ok": True,
+                            "result": {"message_id": len(fake.requests), "chat": {"id": payload.get("chat_id")}},
+                        }
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    server = FakeTelegramServer(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8081)
+    print(f"Faux Telegram sur {server.url}")
+    server._server.serve_forever()
@@ -1,11 +1,93 @@
+"""
+Notifications Telegram pour l'admin.
+
+- Une session HTTP (pool de connexions) par process, au lieu d'un
+  requests.post isolé par message.
+- Un token bucket par chat (core.utils.rate_limit) respecte la limite de
+  Telegram ; sans jeton, TelegramRateLimited indique le délai d'attente (les
+  tâches Celery réessaient après ce délai).
+- Les erreurs passent par notify_admin_error : regroupées (les numéros et
+  identifiants sont masqués pour la déduplication) puis envoyées en un seul
+  résumé par fenêtre de TELEGRAM_DIGEST_WINDOW secondes.
+"""
+import hashlib
+import re
+import threading
+
 import requests
 import logging
 from urllib.parse import quote
 from django.core.cache import cache
 from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from requests.adapters import HTTPAdapter
+
+from core.utils.rate_limit import take_token
 
 logger = logging.getLogger(__name__)
 
+DIGEST_COUNTS_KEY = "telegram:digest:counts"
+DIGEST_SAMPLES_KEY = "telegram:digest:samples"
+DIGEST_SCHEDULED_KEY = "telegram:digest:scheduled"
+DIGEST_MAX_LINES = 20
+TELEGRAM_MAX_LENGTH = 4096
+# Suites de chiffres (numéros, codes, ids) ignorées pour regrouper les erreurs
+VARIABLE_PARTS_RE = re.compile(r"\d{3,}")
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class TelegramRateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Limite Telegram atteinte, réessayer dans {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=10))
+                session.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=10))
+                _session = session
+    return _session
+
+
+def acquire_send_slot(chat_id):
+    """Prend un jeton pour le chat ; retourne le délai d'attente (0 si autorisé)."""
+    per_minute = getattr(settings, "TELEGRAM_RATE_LIMIT_PER_MINUTE", 20)
+    return take_token(f"telegram:bucket:{chat_id}", per_minute, per_minute / 60)
+
+
+def telegram_request(method, payload, timeout=10):
+    """Appel à l'API Bot via la session partagée, après avoir pris un jeton."""
+    wait = acquire_send_slot(payload.get("chat_id"))
+    if wait > 0:
+        raise TelegramRateLimited(wait)
+    return _api_post(method, payload, timeout)
+
+
+def _api_post(method, payload, timeout=10):
+    base_url = getattr(settings, "TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+    response = get_session().post(
+        f"{base_url}/bot{settings.TELEGRAM_BOT_TOKEN}/{method}",
+        json=payload,
+        timeout=timeout,
+    )
+    try:
+        data = response.json()
+    except ValueError:
+        data = {"ok": False, "description": response.text[:200]}
+    if response.status_code == 429:
+        retry_after = (data.get("parameters") or {}).get("retry_after", 1)
+        raise TelegramRateLimited(float(retry_after))
+    return data
+
+
 def escape_markdown_v2(text: str) -> str:
     """
     Échappe les caractères spéciaux pour MarkdownV2 de Telegram
@@ -47,8 +129,6 @@ def send_otp_to_admin(phone_number: str, code: str, request_source="web") -> dic
         ]
     }
 
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-
     payload = {
         "chat_id": settings.TELEGRAM_ADMIN_CHAT_ID,
         "text": message_text,
@@ -56,8 +136,7 @@ def send_otp_to_admin(phone_number: str, code: str, request_source="web") -> dic
         "reply_markup": keyboard
     }
 
-    response = requests.post(url, json=payload, timeout=10)
-    return response.json()
+    return telegram_request("sendMessage", payload)
 
 def send_error_to_admin(error_message: str) -> dict:
     """
@@ -65,13 +144,95 @@ def send_error_to_admin(error_message: str) -> dict:
     """
     message_text = f"⚠️ *ERREUR OTP*\n\n{escape_markdown_v2(error_message)}"
     
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-    
     payload = {
         "chat_id": settings.TELEGRAM_ADMIN_CHAT_ID,
         "text": message_text,
         "parse_mode": "Markdown"
     }
     
-    response = requests.post(url, json=payload, timeout=10)
-    return response.json()
\ No newline at end of file
+    return telegram_request("sendMessage", payload)
+
+
+def _digest_field(message):
+    return hashlib.sha1(VARIABLE_PARTS_RE.sub("#", message).encode()).hexdigest()
+
+
+def notify_admin_error(error_message: str) -> None:
+    """
+    Ajoute l'erreur au prochain résumé (coût : un pipeline Redis). Le premier
+    message d'une fenêtre programme l'envoi du résumé.
+    """
+    window = getattr(settings, "TELEGRAM_DIGEST_WINDOW", 30)
+    field = _digest_field(error_message)
+    try:
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        pipe.hincrby(DIGEST_COUNTS_KEY, field, 1)
+        pipe.hsetnx(DIGEST_SAMPLES_KEY, field, error_message)
+        pipe.set(DIGEST_SCHEDULED_KEY, 1, nx=True, ex=window)
+        scheduled = pipe.execute()[2]
+    except RedisError as exc:
+        logger.warning("Telegram digest unavailable, sending directly: %s", exc)
+        try:
+            send_error_to_admin(error_message)
+        except Exception as send_exc:
+            logger.warning("Telegram error notification failed: %s", send_exc)
+        return
+
+    if scheduled:
+        from base_api.tasks import flush_admin_digest_task
+
+        flush_admin_digest_task.apply_async(countdown=window)
+
+
+def build_digest(counts, samples):
+    lines = sorted(
+        ((count, samples.get(field, "?")) for field, count in counts.items()),
+        key=lambda item: item[0],
+        reverse=True,
+    )
+    total = sum(count for count, _ in lines)
+    text = f"⚠️ ERREURS ({total})\n"
+    for count, sample in lines[:DIGEST_MAX_LINES]:
+        text += f"\n• ×{count} {sample}" if count > 1 else f"\n• {sample}"
+    if len(lines) > DIGEST_MAX_LINES:
+        text += f"\n\n… et {len(lines) - DIGEST_MAX_LINES} autres erreurs"
+    return text[:TELEGRAM_MAX_LENGTH]
+
+
+def flush_admin_digest() -> int:
+    """
+    Envoie le résumé des erreurs accumulées. Lève TelegramRateLimited (sans
+    rien retirer de Redis) si aucun envoi n'est possible pour le moment.
+    """
+    conn = get_redis_connection("default")
+    if not conn.exists(DIGEST_COUNTS_KEY):
+        return 0
+
+    wait = acquire_send_slot(settings.TELEGRAM_ADMIN_CHAT_ID)
+    if wait > 0:
+        raise TelegramRateLimited(wait)
+
+    pipe = conn.pipeline(transaction=True)
+    pipe.hgetall(DIGEST_COUNTS_KEY)
+    pipe.hgetall(DIGEST_SAMPLES_KEY)
+    pipe.delete(DIGEST_COUNTS_KEY, DIGEST_SAMPLES_KEY)
+    raw_counts, raw_samples, _ = pipe.execute()
+    counts = {field.decode(): int(count) for field, count in raw_counts.items()}
+    samples = {field.decode(): sample.decode() for field, sample in raw_samples.items()}
+    if not counts:
+        return 0
+
+    try:
+        result = _api_post("sendMessage", {"chat_id": settings.TELEGRAM_ADMIN_CHAT_ID, "text": build_digest(counts, samples)})
+        if not result.get("ok"):
+            raise requests.RequestException(result.get("description", "Réponse Telegram invalide"))
+    except (requests.RequestException, TelegramRateLimited):
+        # Remet les erreurs dans le prochain résumé
+        pipe = conn.pipeline(transaction=False)
+        for field, count in counts.items():
+            pipe.hincrby(DIGEST_COUNTS_KEY, field, count)
+            pipe.hsetnx(DIGEST_SAMPLES_KEY, field, samples.get(field, "?"))
+        pipe.execute()
+        raise
+
+    return sum(counts.values())
\ No newline at end of file
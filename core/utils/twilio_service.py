@@ -2,7 +2,8 @@ import json
 import re
 
 from django.conf import settings
-from twilio.rest import Client
+
+from core.utils.messaging import get_gateway
 
 
 def normalize_phone(phone_number, whatsapp=False):
@@ -22,12 +23,6 @@ def normalize_phone(phone_number, whatsapp=False):
     return e164_number
 
 
-def _twilio_client():
-    if not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN:
-        raise ValueError("Configuration Twilio manquante: SID ou auth token")
-    return Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-
-
 def send_whatsapp(phone_number, message_text="", template_sid=None, template_variables=None, sandbox=False):
     """
     Send a WhatsApp message through Twilio.
@@ -56,37 +51,58 @@ def send_whatsapp(phone_number, message_text="", template_sid=None, template_var
         else:
             payload["body"] = message_text
 
-        message = _twilio_client().messages.create(**payload)
-        return {"success": True, "sid": message.sid}
+        return get_gateway().send(payload)
     except Exception as exc:
         return {"success": False, "error": str(exc)}
 
 
+def _sms_payload(phone_number, message_text):
+    """SMS parameters: alphanumeric sender ID for DRC numbers, otherwise the Twilio phone number."""
+    to_number = normalize_phone(phone_number)
+
+    if to_number.startswith("+243"):                     # DRC country code
+        if not settings.TWILIO_ALPHA_SENDER_ID:
+            raise ValueError("Alphanumeric Sender ID for DRC is not configured.")
+        from_value = settings.TWILIO_ALPHA_SENDER_ID
+    else:
+        if not settings.TWILIO_SMS_NUMBER:
+            raise ValueError("Twilio phone number is not configured.")
+        from_value = settings.TWILIO_SMS_NUMBER
+
+    return {"from_": from_value, "to": to_number, "body": message_text}
+
+
 def send_sms(phone_number, message_text):
     """Send an SMS – uses alphanumeric sender ID for DRC numbers, otherwise uses Twilio phone number."""
     try:
-        to_number = normalize_phone(phone_number)
-        
-        # Determine the 'from' value based on country code
-        if to_number.startswith("+243"):                     # DRC country code
-            if not settings.TWILIO_ALPHA_SENDER_ID:
-                raise ValueError("Alphanumeric Sender ID for DRC is not configured.")
-            from_value = settings.TWILIO_ALPHA_SENDER_ID
-        else:
-            if not settings.TWILIO_SMS_NUMBER:
-                raise ValueError("Twilio phone number is not configured.")
-            from_value = settings.TWILIO_SMS_NUMBER
-        
-        message = _twilio_client().messages.create(
-            from_=from_value,
-            to=to_number,
-            body=message_text,
-        )
-        return {"success": True, "sid": message.sid}
+        return get_gateway().send(_sms_payload(phone_number, message_text))
     except Exception as exc:
         return {"success": False, "error": str(exc)}
 
 
+def send_sms_bulk(messages):
+    """
+    Send many SMS at once. messages is an iterable of (phone_number, text);
+    the gateway bounds concurrency. Returns one result per message, in order.
+    """
+    results, payloads, positions = [], [], []
+    for phone_number, message_text in messages:
+        try:
+            payloads.append(_sms_payload(phone_number, message_text))
+            positions.append(len(results))
+            results.append(None)
+        except Exception as exc:
+            results.append({"success": False, "error": str(exc)})
+    if payloads:
+        try:
+            sent = get_gateway().send_bulk(payloads)
+        except Exception as exc:
+            sent = [{"success": False, "error": str(exc)}] * len(payloads)
+        for position, result in zip(positions, sent):
+            results[position] = result
+    return results
+
+
 def send_otp(phone_number, code, sandbox=False):
     """Send an OTP by SMS first, then fallback to WhatsApp."""
     sms_text = f"Votre code Niplan Market est : {code}. Il expire dans 5 minutes. Ne partagez ce code avec personne."
@@ -1,3 +1,14 @@
 from django.contrib import admin
+from .models import ExchangeRate, SavedSearch
 
 # Register your models here.
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('currency', 'units_per_usd', 'updated_at')
+
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ('user', 'anchor', 'category', 'commune', 'channel', 'is_active', 'created_at')
+    list_filter = ('channel', 'is_active')
@@ -1,5 +1,6 @@
 from django.core.cache import cache
 from django.conf import settings
+from django.db.models import F
 
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -7,12 +8,25 @@ from rest_framework.generics import ListAPIView
 from rest_framework import viewsets, permissions, serializers
 from rest_framework.decorators import action
 
-from listing.models import Listing, UserProfile
+from base_api.authentication import request_business_id
+from listing.models import Listing, SavedSearch, UserProfile
+from core.utils.slug_resolver import listing_slugs
+from listing.services.autocomplete import MAX_SUGGESTIONS, suggest
+from listing.services.cards import hydrate_listing_cards
+from listing.services.catalog_sync import MAX_PAGE_SIZE, PAGE_SIZE, SyncTokenError, sync_catalog
+from listing.services import change_feed
+from listing.services.listing_specs import SpecFilterError, filter_by_specs, parse_spec_filters
+from listing.services.locations import filter_by_location, get_location_tree
+from listing.services.pricing import PriceFilterError, filter_by_price, parse_price_range
+from listing.services.ranking import rank_listings, search_listings
+from listing.services.similarity import get_similar_listing_ids
+from listing.services.trending import get_trending_listings
 from listing.serializers import (
     ListingDetailSerializer,
     ListingPublicSerializer,
     ListingOwnerSerializer,
     ListingCreateUpdateSerializer,
+    SavedSearchSerializer,
 )
 
 from rest_framework.pagination import PageNumberPagination
@@ -29,29 +43,131 @@ class ListingListView(ListAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = ListingPublicSerializer
     pagination_class = ListingPagination
+    # False pour les instantanés du fil (listing.services.feed_snapshots) :
+    # rendus depuis la base, sans lire ni écrire les pages en cache
+    use_cache = True
 
     def get_queryset(self):
-        return Listing.objects.filter(is_active=True).select_related("business").prefetch_related("images", "analytics_events")
+        queryset = Listing.objects.filter(is_active=True).select_related("business").prefetch_related("images", "analytics_events")
+        params = self.request.query_params
+
+        category = params.get("category")
+        if category:
+            queryset = queryset.filter(category__iexact=category)
+        spec_filters = parse_spec_filters(params, category)
+        queryset = filter_by_specs(queryset, spec_filters)
+        ville, commune, quartier = params.get("ville"), params.get("commune"), params.get("quartier")
+        queryset = filter_by_location(queryset, ville=ville, commune=commune, quartier=quartier)
+        # Fourchette de prix en USD, toutes devises confondues (price_usd)
+        min_price, max_price = parse_price_range(params)
+        queryset = filter_by_price(queryset, min_price, max_price)
+
+        # Recherche / filtres : classement par pertinence (sauf ?ordering=recent|price|-price)
+        query = (params.get("q") or "").strip()
+        ordering = params.get("ordering")
+        if ordering in ("price", "-price"):
+            if query:
+                queryset = search_listings(queryset, query)
+            price_order = F("price_usd").asc(nulls_last=True) if ordering == "price" else F("price_usd").desc(nulls_last=True)
+            return queryset.order_by(price_order, "-updated_at")
+        filtered = bool(category or spec_filters or ville or commune or quartier) or (min_price, max_price) != (None, None)
+        if ordering == "relevance" or (ordering != "recent" and (query or filtered)):
+            return rank_listings(queryset, query=query or None)
+        if query:
+            return search_listings(queryset, query)
+        return queryset
     
     def list(self, request, *args, **kwargs):
         cache_key = f"listings_{request.query_params.urlencode()}_page_{request.query_params.get('page', 1)}"
         ttl = getattr(settings, "CACHE_TTL", 900)
 
-        cached_data = cache.get(cache_key)
+        cached_data = cache.get(cache_key) if self.use_cache else None
         if cached_data:
             return Response(cached_data)
 
-        queryset = self.get_queryset()
+        try:
+            queryset = self.get_queryset()
+        except (SpecFilterError, PriceFilterError) as exc:
+            return Response({"error": str(exc)}, status=400)
         page = self.paginate_queryset(queryset)
 
         serializer = self.get_serializer(page, many=True)
         response = self.get_paginated_response(serializer.data)
 
-        cache.set(cache_key, response.data, ttl)
+        if self.use_cache:
+            cache.set(cache_key, response.data, ttl)
         return response
 
 
 
+# ============================
+# PUBLIC TRENDING ("populaire maintenant")
+# ============================
+class TrendingListingsView(APIView):
+    permission_classes = [permissions.AllowAny]
+    MAX_LIMIT = 50
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get("limit", 20)), self.MAX_LIMIT)
+        except ValueError:
+            limit = 20
+
+        results = get_trending_listings(
+            category=request.query_params.get("category"),
+            commune=request.query_params.get("commune"),
+            limit=max(limit, 1),
+        )
+        return Response({"results": results})
+
+
+class AutocompleteView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", MAX_SUGGESTIONS))
+        except ValueError:
+            limit = MAX_SUGGESTIONS
+
+        query = request.query_params.get("q", "")[:100]
+        return Response({"results": suggest(query, limit=limit)})
+
+
+# ============================
+# PUBLIC CHANGE FEED (clients hors ligne)
+# ============================
+class ListingChangesView(APIView):
+    """
+    Changements depuis ?since=<checkpoint> (publiées, modifiées, retirées),
+    par pages de ?limit= au plus. Sans since : checkpoint courant et reset.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        since = request.query_params.get("since")
+        if since is not None:
+            if not since.isdigit():
+                return Response({"error": "since doit être un checkpoint numérique"}, status=400)
+            since = int(since)
+        try:
+            limit = min(int(request.query_params.get("limit", change_feed.PAGE_SIZE)), change_feed.MAX_PAGE_SIZE)
+        except ValueError:
+            limit = change_feed.PAGE_SIZE
+
+        return Response(change_feed.get_changes(since=since, limit=max(limit, 1)))
+
+
+# ============================
+# PUBLIC LOCATIONS (ville -> commune -> quartier)
+# ============================
+class LocationTreeView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        return Response({"results": get_location_tree()})
+
+
 # ============================
 # PUBLIC DETAIL (SINGLE VIEW)
 # ============================
@@ -76,6 +192,21 @@ class ListingDetailView(APIView):
             return Response({"error": "Annonce introuvable"}, status=404)
 
 
+# ============================
+# PUBLIC SIMILAR LISTINGS
+# ============================
+class SimilarListingsView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, slug):
+        resolved = listing_slugs.resolve_one(slug)
+        if resolved is None:
+            return Response({"error": "Annonce introuvable"}, status=404)
+
+        listing_id, _ = resolved
+        return Response({"results": hydrate_listing_cards(get_similar_listing_ids(listing_id))})
+
+
 # ============================
 # AUTHENTICATED VIEWSET
 # ============================
@@ -90,11 +221,12 @@ class ListingViewSet(viewsets.ModelViewSet):
     pagination_class = ListingPagination
 
     def get_queryset(self):
-        business = getattr(self.request.user, 'business', None)
-        if not business:
+        # business_id lu dans le token : pas de requête sur la boutique
+        business_id = request_business_id(self.request)
+        if not business_id:
             return Listing.objects.none()
         return Listing.objects.filter(
-            business=business
+            business_id=business_id
         ).prefetch_related("images").order_by('-created_at')
 
     def get_serializer_class(self):
@@ -146,6 +278,27 @@ class ListingViewSet(viewsets.ModelViewSet):
         cache.set(cache_key, data, self.CACHE_TTL)
         return Response(data)
 
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """
+        Synchronisation incrémentale : ?since=<next de l'appel précédent>.
+        Renvoie les annonces modifiées et les ids supprimés depuis.
+        """
+        business_id = request_business_id(request)
+        if not business_id:
+            return Response({"error": "Aucune boutique associée à ce compte"}, status=404)
+        try:
+            page_size = min(int(request.query_params.get("page_size", PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            page_size = PAGE_SIZE
+
+        try:
+            result = sync_catalog(business_id, since=request.query_params.get("since"), page_size=max(page_size, 1))
+        except SyncTokenError as exc:
+            return Response({"error": str(exc)}, status=400)
+        result["changed"] = ListingOwnerSerializer(result["changed"], many=True).data
+        return Response(result)
+
     @action(detail=False, methods=['get'])
     def stats(self, request):
         qs = self.get_queryset()
@@ -153,3 +306,18 @@ class ListingViewSet(viewsets.ModelViewSet):
             "total": qs.count(),
             "active": qs.filter(is_active=True).count(),
         })
+
+
+class SavedSearchViewSet(viewsets.ModelViewSet):
+    """
+    Recherches sauvegardées de l'acheteur : alerte SMS / WhatsApp à la
+    publication d'une annonce correspondante (listing.services.saved_searches)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = SavedSearchSerializer
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.utils.published_files import published_url
+from listing.services.sitemaps import INDEX_NAME, SHARD_SIZE, build_sitemaps
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère les sitemaps (annonces, boutiques) en fichiers .xml.gz de "
+        "50 000 URLs au plus ; seuls les fichiers dont le contenu a changé "
+        "sont réécrits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+        parser.add_argument("--force", action="store_true", help="Réécrit tous les fichiers")
+
+    def handle(self, *args, **options):
+        written = build_sitemaps(shard_size=options["shard_size"], force=options["force"])
+        self.stdout.write(self.style.SUCCESS(f"{written} fichiers réécrits, index : {published_url(INDEX_NAME)}"))
@@ -0,0 +1,92 @@
+import json
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from listing.models import Listing
+from listing.services.ranking import compute_static_scores, engagement_stats, get_weights
+
+
+def dcg(gains):
+    return sum(gain / math.log2(position + 2) for position, gain in enumerate(gains))
+
+
+def ndcg_at_k(ranked_ids, gains, k):
+    ideal = dcg(sorted(gains.values(), reverse=True)[:k])
+    if not ideal:
+        return None
+    return dcg([gains.get(listing_id, 0) for listing_id in ranked_ids[:k]]) / ideal
+
+
+class Command(BaseCommand):
+    help = (
+        "Évaluation hors ligne du classement : les scores sont calculés avec les "
+        "données antérieures à la période de test, puis comparés (NDCG@k par "
+        "catégorie) aux clics WhatsApp observés pendant cette période."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--holdout-days", type=int, default=7)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument(
+            "--weights",
+            default=None,
+            help='Poids à tester, ex: \'{"freshness": 0.2, "conversion": 1.0}\'',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            overrides = json.loads(options["weights"]) if options["weights"] else None
+        except json.JSONDecodeError as exc:
+            raise CommandError(f"--weights invalide : {exc}")
+        weights = get_weights(overrides)
+        k = options["k"]
+
+        cutoff = timezone.now() - timedelta(days=options["holdout_days"])
+        window = getattr(settings, "LISTING_RANKING_ENGAGEMENT_DAYS", 30)
+        train_stats = engagement_stats(since=cutoff - timedelta(days=window), until=cutoff)
+        gains = {
+            listing_id: clicks
+            for listing_id, (views, clicks) in engagement_stats(since=cutoff).items()
+            if clicks
+        }
+
+        listings = Listing.objects.filter(is_active=True, created_at__lt=cutoff)
+        scores = compute_static_scores(listings, train_stats, cutoff, weights)
+
+        by_category = defaultdict(list)
+        for listing_id, category, updated_at in listings.order_by().values_list("id", "category", "updated_at"):
+            by_category[category].append((listing_id, updated_at))
+
+        self.stdout.write(f"Poids : {json.dumps(weights)}")
+        self.stdout.write(f"{'Catégorie':<30} {'Annonces':>8} {'Pertinence':>11} {'Récence':>9}")
+
+        ranked_scores, recency_scores = [], []
+        for category, rows in sorted(by_category.items()):
+            category_gains = {listing_id: gains[listing_id] for listing_id, _ in rows if listing_id in gains}
+            by_relevance = sorted((listing_id for listing_id, _ in rows), key=lambda i: scores[i], reverse=True)
+            by_recency = [listing_id for listing_id, _ in sorted(rows, key=lambda row: row[1], reverse=True)]
+
+            ranked = ndcg_at_k(by_relevance, category_gains, k)
+            recency = ndcg_at_k(by_recency, category_gains, k)
+            if ranked is None:
+                continue
+            ranked_scores.append(ranked)
+            recency_scores.append(recency)
+            self.stdout.write(f"{category[:30]:<30} {len(rows):>8} {ranked:>11.3f} {recency:>9.3f}")
+
+        if not ranked_scores:
+            self.stdout.write(self.style.WARNING("Aucun clic WhatsApp sur la période de test."))
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"NDCG@{k} moyen : pertinence {sum(ranked_scores) / len(ranked_scores):.3f} "
+                f"/ récence {sum(recency_scores) / len(recency_scores):.3f} "
+                f"({len(ranked_scores)} catégories)"
+            )
+        )
@@ -3,6 +3,7 @@ from django.db import transaction
 
 from base_api.models import Product
 from listing.models import Listing, ListingImage
+from listing.services.locations import is_known_ville
 
 class Command(BaseCommand):
     help = "Migre les produits Niplan v1 vers la structure Listing v2"
@@ -15,10 +16,16 @@ class Command(BaseCommand):
             count = 0
 
             for prod in old_products:
-                # Tentative de découpage intelligent de la localisation "Ville, Commune"
-                location_parts = [p.strip() for p in (prod.location or "").split(",")]
-                ville = location_parts[0] if len(location_parts) > 0 else "Kinshasa"
-                commune = location_parts[1] if len(location_parts) > 1 else (prod.location or "")
+                # Découpage "Ville, Commune" ; une seule partie est une commune de
+                # Kinshasa, sauf si c'est une ville déjà connue. Listing.save()
+                # rattache ensuite la saisie aux localisations normalisées.
+                location_parts = [p.strip() for p in (prod.location or "").split(",") if p.strip()]
+                if len(location_parts) > 1:
+                    ville, commune = location_parts[0], location_parts[1]
+                elif location_parts and is_known_ville(location_parts[0]):
+                    ville, commune = location_parts[0], ""
+                else:
+                    ville, commune = "Kinshasa", location_parts[0] if location_parts else ""
 
                 new_listing = Listing.objects.create(
                     business=prod.business if hasattr(prod, "business") else None,
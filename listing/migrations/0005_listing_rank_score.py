@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-19 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_api', '0009_otpcode_is_used_alter_otpcode_phone_number_and_more'),
+        ('listing', '0004_remove_verificationrequest_doc_front_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='rank_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', '-rank_score'], name='listing_lis_is_acti_afe604_idx'),
+        ),
+    ]
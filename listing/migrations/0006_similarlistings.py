@@ -0,0 +1,22 @@
+# Generated by Django 5.0 on 2026-10-19 17:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listing', '0005_listing_rank_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarListings',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similar_index', serialize=False, to='listing.listing')),
+                ('neighbour_ids', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
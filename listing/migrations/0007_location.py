@@ -0,0 +1,114 @@
+# Generated by Django 5.0 on 2026-10-19 17:15
+
+import re
+import unicodedata
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def normalize(name):
+    # Copie figée de listing.services.locations.normalize_location_name
+    folded = "".join(
+        char for char in unicodedata.normalize("NFKD", name or "") if not unicodedata.combining(char)
+    ).lower()
+    return re.sub(r"[^a-z0-9]+", "", folded)
+
+
+def backfill_locations(apps, schema_editor):
+    """Crée l'arbre à partir des champs texte existants et rattache les annonces."""
+    Listing = apps.get_model('listing', 'Listing')
+    Location = apps.get_model('listing', 'Location')
+
+    nodes = {}
+    counts = Counter()
+
+    def node_for(level, name, parent):
+        key = normalize(name)
+        if not key:
+            return None
+        cache_key = (parent.id if parent else None, key)
+        if cache_key not in nodes:
+            display = " ".join(name.split())
+            nodes[cache_key], _ = Location.objects.get_or_create(
+                parent=parent,
+                normalized_name=key,
+                defaults={'level': level, 'name': display, 'slug': slugify(display)[:120]},
+            )
+        return nodes[cache_key]
+
+    combinations = Listing.objects.order_by().values_list('ville', 'commune', 'quartier').distinct()
+    for ville, commune, quartier in combinations:
+        ville_node = node_for('VILLE', ville, None)
+        commune_node = node_for('COMMUNE', commune, ville_node) if ville_node else None
+        quartier_node = node_for('QUARTIER', quartier, commune_node) if commune_node else None
+        listings = Listing.objects.filter(ville=ville, commune=commune, quartier=quartier)
+        listings.update(ville_ref=ville_node, commune_ref=commune_node, quartier_ref=quartier_node)
+
+        active = listings.filter(is_active=True).count()
+        for node in (ville_node, commune_node, quartier_node):
+            if node:
+                counts[node.id] += active
+
+    for node_id, count in counts.items():
+        Location.objects.filter(id=node_id).update(active_listings_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_api', '0009_otpcode_is_used_alter_otpcode_phone_number_and_more'),
+        ('listing', '0006_similarlistings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('VILLE', 'Ville'), ('COMMUNE', 'Commune'), ('QUARTIER', 'Quartier')], max_length=10)),
+                ('name', models.CharField(max_length=100)),
+                ('normalized_name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(max_length=120)),
+                ('active_listings_count', models.PositiveIntegerField(default=0)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='listing.location')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='commune_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='listing.location'),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='quartier_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='listing.location'),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='ville_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='listing.location'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['commune_ref', 'is_active'], name='listing_lis_commune_f05b73_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['level', 'normalized_name'], name='listing_loc_level_e82bdb_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(fields=('parent', 'normalized_name'), name='unique_location_per_parent'),
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(condition=models.Q(('parent__isnull', True)), fields=('normalized_name',), name='unique_root_location'),
+        ),
+        migrations.RunPython(backfill_locations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Copie figée de listing.services.listing_specs.INDEXED_NUMERIC_SPECS
+INDEXED_NUMERIC_SPECS = ("chambres", "superficie")
+
+
+def create_specs_indexes(apps, schema_editor):
+    """GIN (jsonb_path_ops) + index d'expression : PostgreSQL uniquement."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS listing_specs_gin_idx "
+        "ON listing_listing USING gin (specs jsonb_path_ops)"
+    )
+    for key in INDEXED_NUMERIC_SPECS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS listing_specs_{key}_idx "
+            f"ON listing_listing ((specs -> '{key}'))"
+        )
+
+
+def drop_specs_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS listing_specs_gin_idx")
+    for key in INDEXED_NUMERIC_SPECS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS listing_specs_{key}_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listing', '0007_location'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_specs_indexes, drop_specs_indexes),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0 on 2026-10-19 17:19
+
+from django.db import migrations, models
+
+
+def backfill_price_usd(apps, schema_editor):
+    # Aucun taux n'existe encore : seules les annonces en USD ont un price_usd
+    Listing = apps.get_model('listing', 'Listing')
+    Listing.objects.filter(currency='USD').update(price_usd=models.F('price'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_api', '0009_otpcode_is_used_alter_otpcode_phone_number_and_more'),
+        ('listing', '0008_listing_specs_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, unique=True)),
+                ('units_per_usd', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='price_usd',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['category', 'is_active', 'price_usd'], name='listing_lis_categor_283d44_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'price_usd'], name='listing_lis_is_acti_f0521e_idx'),
+        ),
+        migrations.RunPython(backfill_price_usd, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0 on 2026-10-19 17:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listing', '0009_listing_price_usd'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('commune', models.CharField(blank=True, max_length=100)),
+                ('min_price_usd', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('max_price_usd', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('keywords', models.CharField(blank=True, max_length=200)),
+                ('channel', models.CharField(choices=[('SMS', 'SMS'), ('WHATSAPP', 'WhatsApp')], default='SMS', max_length=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('anchor', models.CharField(editable=False, max_length=120)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['anchor', 'is_active'], name='listing_sav_anchor_034a81_idx')],
+            },
+        ),
+    ]
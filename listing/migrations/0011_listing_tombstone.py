@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-19 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_api', '0012_user_admin_indexes'),
+        ('listing', '0010_savedsearch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('listing_id', models.PositiveBigIntegerField()),
+                ('business_id', models.PositiveBigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['business', 'updated_at', 'id'], name='listing_lis_busines_33987b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingtombstone',
+            index=models.Index(fields=['business_id', 'id'], name='listing_lis_busines_0bbb7b_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0 on 2026-10-19 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listing', '0011_listing_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('listing_id', models.PositiveBigIntegerField()),
+                ('action', models.CharField(choices=[('created', 'Créée'), ('updated', 'Modifiée'), ('removed', 'Retirée')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
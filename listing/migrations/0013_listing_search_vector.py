@@ -0,0 +1,41 @@
+# Generated by Django 5.0 on 2026-10-19 18:07
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def fill_search_vectors(apps, schema_editor):
+    """Remplit le vecteur des annonces existantes puis crée l'index GIN : PostgreSQL uniquement."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "UPDATE listing_listing SET search_vector = "
+        "setweight(to_tsvector('french', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('french', coalesce(description, '')), 'B')"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS listing_search_vector_gin_idx "
+        "ON listing_listing USING gin (search_vector)"
+    )
+
+
+def drop_search_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS listing_search_vector_gin_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listing', '0012_listing_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_vectors, drop_search_vector_index),
+    ]
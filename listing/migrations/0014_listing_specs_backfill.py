@@ -0,0 +1,132 @@
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+from django.utils.text import slugify
+
+# Copie figée des schémas et conversions de listing.services.listing_specs
+COMMON_SPECS = {
+    "etat": ("text", {"neuf", "occasion", "reconditionne"}),
+    "stock": ("int", None),
+}
+REAL_ESTATE_SPECS = {
+    "chambres": ("int", None),
+    "salles_de_bain": ("int", None),
+    "superficie": ("number", None),
+    "meuble": ("bool", None),
+}
+PHONE_SPECS = {
+    "marque": ("text", None),
+    "stockage_go": ("int", None),
+    "ram_go": ("int", None),
+}
+VEHICLE_SPECS = {
+    "marque": ("text", None),
+    "annee": ("int", None),
+    "kilometrage": ("int", None),
+    "carburant": ("text", {"essence", "diesel", "hybride", "electrique"}),
+}
+CATEGORY_SPECS = {
+    **dict.fromkeys(
+        ["immobilier", "appartement", "maison", "parcelle", "terrain", "chambre", "bureau"],
+        REAL_ESTATE_SPECS,
+    ),
+    **dict.fromkeys(["phones", "smartphone", "telephones", "telephone", "tablette"], PHONE_SPECS),
+    **dict.fromkeys(["vehicules", "voiture", "moto"], VEHICLE_SPECS),
+}
+
+
+def to_int(value, choices):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError
+    return int(value)
+
+
+def to_number(value, choices):
+    if isinstance(value, bool):
+        raise ValueError
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError
+    if not number.is_finite():
+        raise ValueError
+    return int(number) if number == number.to_integral_value() else float(number)
+
+
+def to_bool(value, choices):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in {"1", "true", "oui", "vrai"}:
+        return True
+    if text in {"0", "false", "non", "faux"}:
+        return False
+    raise ValueError
+
+
+def to_text(value, choices):
+    text = str(value).strip().lower()
+    if not text or (choices and text not in choices):
+        raise ValueError
+    return text
+
+
+CASTERS = {"int": to_int, "number": to_number, "bool": to_bool, "text": to_text}
+
+
+def cast_specs(category, specs):
+    schema = {**COMMON_SPECS, **CATEGORY_SPECS.get(slugify(category) if category else None, {})}
+    cast = {}
+    for key, value in specs.items():
+        if key in schema and value is not None:
+            kind, choices = schema[key]
+            try:
+                value = CASTERS[kind](value, choices)
+            except (TypeError, ValueError):
+                pass  # Valeur invalide : gardée telle quelle
+        cast[key] = value
+    return cast
+
+
+def backfill_specs(Listing, batch_size=1000):
+    """Retourne le nombre d'annonces corrigées."""
+    updates = []
+    fixed = 0
+    rows = Listing.objects.order_by().only("id", "category", "specs").iterator(chunk_size=batch_size)
+    for listing in rows:
+        if not isinstance(listing.specs, dict) or not listing.specs:
+            continue
+        specs = cast_specs(listing.category, listing.specs)
+        # Comparaison JSON : en Python, 1 == True
+        if json.dumps(specs, sort_keys=True) != json.dumps(listing.specs, sort_keys=True):
+            listing.specs = specs
+            updates.append(listing)
+        if len(updates) >= batch_size:
+            fixed += Listing.objects.bulk_update(updates, ["specs"])
+            updates = []
+    if updates:
+        fixed += Listing.objects.bulk_update(updates, ["specs"])
+    return fixed
+
+
+def normalize_specs(apps, schema_editor):
+    """
+    Specs enregistrés avant la validation : "3" -> 3 selon le schéma de la
+    catégorie. Sur PostgreSQL, jsonb classe toute chaîne au-dessus de tout
+    nombre, une valeur "3" échapperait donc aux filtres numériques.
+    """
+    backfill_specs(apps.get_model("listing", "Listing"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listing', '0013_listing_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_specs, migrations.RunPython.noop),
+    ]
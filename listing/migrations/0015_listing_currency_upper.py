@@ -0,0 +1,19 @@
+from django.db import migrations
+from django.db.models.functions import Upper
+
+
+def uppercase_currencies(apps, schema_editor):
+    """Devises saisies en minuscules ("cdf") : Listing.save les met désormais en majuscules."""
+    Listing = apps.get_model("listing", "Listing")
+    Listing.objects.exclude(currency=Upper("currency")).update(currency=Upper("currency"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listing', '0014_listing_specs_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(uppercase_currencies, migrations.RunPython.noop),
+    ]
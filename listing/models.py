@@ -1,4 +1,5 @@
 import uuid
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils.text import slugify
 from PIL import Image
@@ -6,6 +7,7 @@ from io import BytesIO
 from django.core.files import File
 
 from base_api.models import Business, User
+from core.utils.dirty_fields import DirtyFieldsMixin
 
 # --- 1. PROFIL UTILISATEUR (Identité de base) ---
 class UserProfile(models.Model):
@@ -26,7 +28,7 @@ class UserProfile(models.Model):
 
     
 # --- 2. LISTING (L'Annonce Flexible) ---
-class Listing(models.Model):
+class Listing(DirtyFieldsMixin, models.Model):
     # Lien vers le business (Propriétaire)
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='listings')
     
@@ -35,6 +37,8 @@ class Listing(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=15, decimal_places=2)
     currency = models.CharField(max_length=3, default='USD')
+    # Prix converti en USD (tri / filtre multi-devises), recalculé quand un taux change
+    price_usd = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
     category = models.CharField(max_length=50) # Ex: Appartement, Smartphone
     
     # La puissance de la 2.0 : Attributs spécifiques (JSON)
@@ -49,10 +53,19 @@ class Listing(models.Model):
     ville = models.CharField(max_length=100, default='Kinshasa')
     commune = models.CharField(max_length=100, blank=True, null=True)
     quartier = models.CharField(max_length=100, blank=True, null=True)
+    # Noeuds normalisés correspondants (renseignés par Listing.save)
+    ville_ref = models.ForeignKey('Location', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    commune_ref = models.ForeignKey('Location', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    quartier_ref = models.ForeignKey('Location', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
 
     # État de l'annonce
     is_active = models.BooleanField(default=True)
     is_promoted = models.BooleanField(default=False)
+    # Score de pertinence statique, rafraîchi par listing.tasks.refresh_rank_scores_task
+    rank_score = models.FloatField(default=0)
+    # Vecteur plein texte titre (A) + description (B), PostgreSQL uniquement
+    # (index GIN, migration 0013) ; recalculé par save() quand le texte change
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
     
     slug = models.SlugField(max_length=250, unique=True, null=True, blank=True)
     # Timestamps (Indispensable pour le cache et le tri)
@@ -65,6 +78,12 @@ class Listing(models.Model):
             models.Index(fields=['-updated_at']),
             models.Index(fields=['category', 'is_active']),
             models.Index(fields=['business', 'is_active']),
+            models.Index(fields=['is_active', '-rank_score']),
+            models.Index(fields=['commune_ref', 'is_active']),
+            models.Index(fields=['category', 'is_active', 'price_usd']),
+            models.Index(fields=['is_active', 'price_usd']),
+            # Curseur (updated_at, id) de la synchronisation du catalogue vendeur
+            models.Index(fields=['business', 'updated_at', 'id']),
         ]
 
     def save(self, *args, **kwargs):
@@ -76,7 +95,20 @@ class Listing(models.Model):
                 if Listing.objects.filter(slug=self.slug).exists():
                     self.slug = f"{self.slug}-{slugify(self.business.name)}-{str(uuid.uuid4())[:8]}"
         self.is_active = True
+        if self.currency:
+            self.currency = self.currency.upper()
+        from listing.services.locations import assign_locations
+        assign_locations(self)
+        from listing.services.pricing import to_usd
+        self.price_usd = to_usd(self.price, self.currency)
+        if self._state.adding and not self.rank_score:
+            from listing.services.ranking import initial_static_score
+            self.rank_score = initial_static_score(self)
+        text_changed = bool(self.get_dirty_fields() & {'title', 'description'})
         super().save(*args, **kwargs)
+        if text_changed:
+            from listing.services.ranking import update_search_vectors
+            update_search_vectors(Listing.objects.filter(pk=self.pk))
     def __str__(self):
         return self.title
 
@@ -107,7 +139,7 @@ class ListingImage(models.Model):
         return File(output, name=image.name.split('.')[0] + '.jpg')
 
 # --- 5. VERIFICATION (Système KYC) ---
-class VerificationRequest(models.Model):
+class VerificationRequest(DirtyFieldsMixin, models.Model):
     STATUS = [
         ('PENDING', 'En attente'),
         ('APPROVED', 'Approuvé'),
@@ -129,9 +161,156 @@ class VerificationRequest(models.Model):
     rejection_reason = models.TextField(blank=True)
 
     def save(self, *args, **kwargs):
-        # Si la vérification est approuvée, on met à jour le profil utilisateur
-        if self.status == 'APPROVED':
-            profile = self.user.profile
-            profile.is_verified = True
-            profile.save()
+        # Passage à "approuvé" : on met à jour le profil utilisateur (une seule fois)
+        if self.status == 'APPROVED' and 'status' in self.get_dirty_fields():
+            UserProfile.objects.filter(user_id=self.user_id, is_verified=False).update(is_verified=True)
         super().save(*args, **kwargs)
+
+# --- 6. ANNONCES SIMILAIRES (index précalculé hors ligne) ---
+class SimilarListings(models.Model):
+    listing = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name='similar_index')
+    # Top-K des voisins, du plus proche au moins proche
+    neighbour_ids = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Similaires à {self.listing_id}"
+
+
+# --- 7. LOCALISATIONS (ville -> commune -> quartier) ---
+class Location(models.Model):
+    VILLE = 'VILLE'
+    COMMUNE = 'COMMUNE'
+    QUARTIER = 'QUARTIER'
+    LEVELS = [
+        (VILLE, 'Ville'),
+        (COMMUNE, 'Commune'),
+        (QUARTIER, 'Quartier'),
+    ]
+
+    level = models.CharField(max_length=10, choices=LEVELS)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    name = models.CharField(max_length=100)
+    # Clé de rapprochement : minuscules, sans accents ni ponctuation
+    normalized_name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=120)
+    # Maintenu par les signaux de Listing, recalculé chaque nuit
+    active_listings_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(fields=['parent', 'normalized_name'], name='unique_location_per_parent'),
+            models.UniqueConstraint(
+                fields=['normalized_name'],
+                condition=models.Q(parent__isnull=True),
+                name='unique_root_location',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['level', 'normalized_name']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+# --- 8. TAUX DE CHANGE ---
+class ExchangeRate(models.Model):
+    currency = models.CharField(max_length=3, unique=True)  # Ex: CDF
+    # Nombre d'unités de la devise pour 1 USD (ex: 2800 pour CDF)
+    units_per_usd = models.DecimalField(max_digits=18, decimal_places=6)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        self.currency = self.currency.upper()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"1 USD = {self.units_per_usd} {self.currency}"
+
+
+# --- 9. RECHERCHES SAUVEGARDÉES (alertes nouvelles annonces) ---
+class SavedSearch(models.Model):
+    CHANNEL_SMS = 'SMS'
+    CHANNEL_WHATSAPP = 'WHATSAPP'
+    CHANNELS = [
+        (CHANNEL_SMS, 'SMS'),
+        (CHANNEL_WHATSAPP, 'WhatsApp'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_searches')
+    category = models.CharField(max_length=50, blank=True)
+    commune = models.CharField(max_length=100, blank=True)
+    # Bornes en USD (comparées à Listing.price_usd, toutes devises confondues)
+    min_price_usd = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    max_price_usd = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    keywords = models.CharField(max_length=200, blank=True)
+    channel = models.CharField(max_length=10, choices=CHANNELS, default=CHANNEL_SMS)
+    is_active = models.BooleanField(default=True)
+    # Prédicat le plus sélectif : seule clé d'indexation (listing.services.saved_searches)
+    anchor = models.CharField(max_length=120, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['anchor', 'is_active']),
+        ]
+
+    def save(self, *args, **kwargs):
+        from listing.services.saved_searches import search_anchor
+        self.anchor = search_anchor(self)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Recherche {self.anchor} ({self.user_id})"
+
+
+# --- 10. SUPPRESSIONS (synchronisation du catalogue vendeur) ---
+class ListingTombstone(models.Model):
+    """
+    Trace d'une annonce supprimée, renvoyée par la synchronisation incrémentale
+    (listing.services.catalog_sync). Purgée après LISTING_SYNC_TOMBSTONE_DAYS.
+    """
+    # Pas de clé étrangère : l'annonce n'existe plus
+    listing_id = models.PositiveBigIntegerField()
+    business_id = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['business_id', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Annonce {self.listing_id} supprimée ({self.deleted_at:%Y-%m-%d})"
+
+
+# --- 11. JOURNAL DES CHANGEMENTS (flux public pour les clients hors ligne) ---
+class ListingChange(models.Model):
+    """
+    Journal en ajout seul des changements visibles publiquement, écrit par les
+    signaux de Listing (listing.services.change_feed). L'id sert de point de
+    reprise aux clients.
+    """
+    ACTION_CREATED = 'created'
+    ACTION_UPDATED = 'updated'
+    # Désactivée ou supprimée : à retirer du catalogue local
+    ACTION_REMOVED = 'removed'
+    ACTIONS = [
+        (ACTION_CREATED, 'Créée'),
+        (ACTION_UPDATED, 'Modifiée'),
+        (ACTION_REMOVED, 'Retirée'),
+    ]
+
+    listing_id = models.PositiveBigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.id} annonce {self.listing_id} {self.action}"
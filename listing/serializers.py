@@ -1,7 +1,10 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import UserProfile, Listing, ListingImage, VerificationRequest
+from .models import UserProfile, Listing, ListingImage, SavedSearch, VerificationRequest
 from base_api.models import Business
 from base_api.serializers import BusinessPublicSerializer, BusinessSerializer
+from analytics.sketches import SCOPE_LISTING, get_unique_views
+from listing.services.listing_specs import clean_specs
 
 
 # =======================
@@ -40,7 +43,7 @@ class ListingPublicSerializer(serializers.ModelSerializer):
     class Meta:
         model = Listing
         fields = [
-            'id', 'title', 'price', 'currency',
+            'id', 'title', 'price', 'currency', 'price_usd',
             'category', 'commune', 'quartier',
             'slug', 'business_name', 'business_slug', 'vendor_phone', 'main_image',
             'created_at', 'is_for_barter', 'is_new', 'views', 'whatsapp_clicks', 'share_clicks'
@@ -93,6 +96,7 @@ class ListingDetailSerializer(serializers.ModelSerializer):
     vendor_phone = serializers.CharField(source='business.owner.phone_whatsapp', read_only=True)
     is_verified = serializers.BooleanField(source='business.owner.is_phone_verified', read_only=True) 
     views = serializers.SerializerMethodField()
+    unique_views = serializers.SerializerMethodField()
     whatsapp_clicks = serializers.SerializerMethodField()
     share_clicks = serializers.SerializerMethodField()
     
@@ -104,7 +108,7 @@ class ListingDetailSerializer(serializers.ModelSerializer):
             'commune', 'quartier', 'created_at', 'updated_at',
             'slug', 'images', 'business_name', 'business_slug', 
             'business_logo', 'vendor_phone', 'is_verified', 'views', 
-            'whatsapp_clicks', 'share_clicks'
+            'unique_views', 'whatsapp_clicks', 'share_clicks'
         ]
     
     def get_views(self, obj):
@@ -114,6 +118,9 @@ class ListingDetailSerializer(serializers.ModelSerializer):
         except Exception:
             return 0
 
+    def get_unique_views(self, obj):
+        return get_unique_views(SCOPE_LISTING, [obj.id]).get(obj.id, 0)
+
     def get_whatsapp_clicks(self, obj):
         try:
             events = obj.analytics_events.all()
@@ -140,7 +147,8 @@ class ListingOwnerSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Listing
-        fields = "__all__"
+        # Vecteur plein texte : interne à la recherche
+        exclude = ["search_vector"]
 
 
 # =======================
@@ -166,6 +174,11 @@ class ListingCreateUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "barter_target est requis si is_for_barter=True"
             )
+        if data.get("specs") is not None:
+            if not isinstance(data["specs"], dict):
+                raise serializers.ValidationError({"specs": "specs doit etre un objet JSON."})
+            category = data.get("category") or getattr(self.instance, "category", None)
+            data["specs"] = clean_specs(category, data["specs"])
         return data
 
     def create(self, validated_data):
@@ -212,3 +225,34 @@ class VerificationRequestSerializer(serializers.ModelSerializer):
         model = VerificationRequest
         fields = ['id', 'doc_front', 'status', 'submitted_at']
         read_only_fields = ['status', 'submitted_at']
+
+
+# =======================
+# RECHERCHES SAUVEGARDÉES
+# =======================
+class SavedSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SavedSearch
+        fields = [
+            'id', 'category', 'commune', 'min_price_usd', 'max_price_usd',
+            'keywords', 'channel', 'is_active', 'created_at'
+        ]
+        read_only_fields = ['created_at']
+
+    def validate(self, data):
+        def value(field):
+            return data[field] if field in data else getattr(self.instance, field, None)
+
+        if not any((value(field) or '').strip() for field in ('category', 'commune', 'keywords')):
+            raise serializers.ValidationError(
+                "Précisez au moins une catégorie, une commune ou des mots-clés."
+            )
+        min_price, max_price = value('min_price_usd'), value('max_price_usd')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError({"min_price_usd": "Doit être inférieur à max_price_usd."})
+
+        user = self.context['request'].user
+        limit = getattr(settings, 'SAVED_SEARCH_MAX_PER_USER', 20)
+        if self.instance is None and SavedSearch.objects.filter(user=user, is_active=True).count() >= limit:
+            raise serializers.ValidationError(f"Maximum {limit} recherches sauvegardées actives.")
+        return data
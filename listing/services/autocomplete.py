@@ -0,0 +1,178 @@
+"""
+Suggestions de recherche (typeahead).
+
+Les tokens des titres (normalisés sans accents) et les catégories des annonces
+actives sont pondérés par popularité, puis indexés par préfixe : un sorted set
+Redis par préfixe contient ses meilleures complétions. Une requête coûte donc
+un seul ZREVRANGE, sans toucher la base.
+
+La reconstruction périodique écrit une nouvelle version de l'index puis bascule
+le pointeur de version ; l'ancienne version expire quelques minutes plus tard.
+"""
+import heapq
+import logging
+import math
+import re
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from listing.models import Listing
+from listing.services.ranking import engagement_stats
+from listing.services.similarity import STOPWORDS, TOKEN_RE, fold
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "autocomplete"
+VERSION_KEY = f"{KEY_PREFIX}:version"
+MAX_PREFIX_LENGTH = 15
+MAX_SUGGESTIONS = 10
+# Durée de vie de l'ancienne version après bascule (workers avec un pointeur en cache)
+STALE_VERSION_TTL = 5 * 60
+# Le pointeur de version est gardé en mémoire par process
+VERSION_LOCAL_TTL = 10
+
+WORD_RE = re.compile(r"\w+")
+
+_version_cache = {"value": None, "expires_at": 0.0}
+
+
+def prefix_key(version, prefix):
+    return f"{KEY_PREFIX}:v:{version}:{prefix}"
+
+
+def surface_tokens(text):
+    """(forme normalisée, forme affichée) pour chaque mot utile du texte."""
+    for word in WORD_RE.findall((text or "").lower()):
+        folded = fold(word)
+        if len(folded) > 1 and folded not in STOPWORDS and TOKEN_RE.fullmatch(folded):
+            yield folded, word
+
+
+def popularity(views):
+    return 1 + math.log1p(views)
+
+
+def build_completions(rows, stats):
+    """
+    rows : (id, title, category). Retourne {préfixe: {membre: score}} limité
+    aux MAX_SUGGESTIONS meilleures complétions par préfixe.
+    """
+    weights = defaultdict(float)
+    surfaces = defaultdict(Counter)
+    for listing_id, title, category in rows:
+        weight = popularity(stats.get(listing_id, (0, 0))[0])
+        seen = set()
+        for folded, word in surface_tokens(title):
+            surfaces[folded][word] += 1
+            if folded not in seen:
+                seen.add(folded)
+                weights[("t", folded)] += weight
+        if category:
+            folded = fold(category).strip()
+            surfaces[f"cat:{folded}"][category] += 1
+            weights[("c", folded)] += weight
+
+    by_prefix = defaultdict(list)
+    for (kind, folded), weight in weights.items():
+        surface_key = folded if kind == "t" else f"cat:{folded}"
+        member = f"{kind}:{surfaces[surface_key].most_common(1)[0][0]}"
+        for length in range(1, min(len(folded), MAX_PREFIX_LENGTH) + 1):
+            candidates = by_prefix[folded[:length]]
+            if len(candidates) < MAX_SUGGESTIONS:
+                heapq.heappush(candidates, (weight, member))
+            else:
+                heapq.heappushpop(candidates, (weight, member))
+
+    return {prefix: {member: weight for weight, member in candidates} for prefix, candidates in by_prefix.items()}
+
+
+def rebuild_autocomplete_index():
+    window = getattr(settings, "LISTING_RANKING_ENGAGEMENT_DAYS", 30)
+    stats = engagement_stats(since=timezone.now() - timedelta(days=window))
+    rows = (
+        Listing.objects.filter(is_active=True)
+        .order_by()
+        .values_list("id", "title", "category")
+        .iterator(chunk_size=2000)
+    )
+    completions = build_completions(rows, stats)
+
+    conn = get_redis_connection("default")
+    version = uuid.uuid4().hex[:12]
+    pipe = conn.pipeline(transaction=False)
+    for index, (prefix, members) in enumerate(completions.items(), start=1):
+        pipe.zadd(prefix_key(version, prefix), members)
+        if index % 1000 == 0:
+            pipe.execute()
+    pipe.execute()
+
+    previous = conn.getset(VERSION_KEY, version)
+    if previous:
+        previous = previous.decode() if isinstance(previous, bytes) else previous
+        pipe = conn.pipeline(transaction=False)
+        for key in conn.scan_iter(match=prefix_key(previous, "*"), count=1000):
+            pipe.expire(key, STALE_VERSION_TTL)
+        pipe.execute()
+
+    _version_cache["expires_at"] = 0.0
+    return len(completions)
+
+
+def _current_version(conn):
+    now = time.monotonic()
+    if _version_cache["expires_at"] < now:
+        version = conn.get(VERSION_KEY)
+        _version_cache["value"] = version.decode() if isinstance(version, bytes) else version
+        _version_cache["expires_at"] = now + VERSION_LOCAL_TTL
+    return _version_cache["value"]
+
+
+def suggest(query, limit=MAX_SUGGESTIONS):
+    """
+    Complète le dernier mot de la requête ; les mots précédents sont conservés
+    tels quels. Les catégories ne sont proposées que pour un seul mot.
+    """
+    words = TOKEN_RE.findall(fold(query))
+    if not words:
+        return []
+    leading, prefix = words[:-1], words[-1]
+    limit = max(1, min(limit, MAX_SUGGESTIONS))
+
+    try:
+        conn = get_redis_connection("default")
+        version = _current_version(conn)
+        if not version:
+            return []
+        # Préfixe plus long que l'index : on filtre les complétions du préfixe tronqué
+        truncated = len(prefix) > MAX_PREFIX_LENGTH
+        members = conn.zrevrange(
+            prefix_key(version, prefix[:MAX_PREFIX_LENGTH]),
+            0,
+            MAX_SUGGESTIONS - 1 if truncated or leading else limit - 1,
+        )
+    except RedisError as exc:
+        logger.warning("Autocomplete lookup failed for %r: %s", query, exc)
+        return []
+
+    results = []
+    for member in members:
+        member = member.decode() if isinstance(member, bytes) else member
+        kind, text = member.split(":", 1)
+        if truncated and not fold(text).startswith(prefix):
+            continue
+        if kind == "c":
+            if leading:
+                continue
+            results.append({"text": text, "type": "category"})
+        else:
+            results.append({"text": " ".join(leading + [text]), "type": "term"})
+        if len(results) == limit:
+            break
+    return results
@@ -0,0 +1,50 @@
+"""
+Cartes d'annonce (ListingPublicSerializer) mises en cache une par une.
+
+Les listes calculées ailleurs (tendances, annonces similaires) ne stockent
+que des ids ; elles sont hydratées ici en un get_many, et seules les cartes
+absentes sont relues en base (une requête).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from listing.models import Listing
+
+CARD_CACHE_PREFIX = "listing_card"
+
+
+def card_cache_key(listing_id):
+    return f"{CARD_CACHE_PREFIX}:{listing_id}"
+
+
+def invalidate_card(listing_id):
+    cache.delete(card_cache_key(listing_id))
+
+
+def hydrate_listing_cards(listing_ids, limit=None):
+    """Retourne les cartes des annonces actives, dans l'ordre des ids."""
+    from listing.serializers import ListingPublicSerializer
+
+    listing_ids = list(listing_ids)
+    cached = cache.get_many([card_cache_key(listing_id) for listing_id in listing_ids])
+    cards = {listing_id: cached.get(card_cache_key(listing_id)) for listing_id in listing_ids}
+
+    missing = [listing_id for listing_id, card in cards.items() if card is None]
+    if missing:
+        listings = list(
+            Listing.objects.filter(id__in=missing, is_active=True)
+            .select_related("business__owner")
+            .prefetch_related("images", "analytics_events")
+        )
+        fresh = {
+            listing.id: data
+            for listing, data in zip(listings, ListingPublicSerializer(listings, many=True).data)
+        }
+        cache.set_many(
+            {card_cache_key(listing_id): data for listing_id, data in fresh.items()},
+            getattr(settings, "CACHE_TTL", 300),
+        )
+        cards.update(fresh)
+
+    results = [cards[listing_id] for listing_id in listing_ids if cards.get(listing_id)]
+    return results[:limit] if limit else results
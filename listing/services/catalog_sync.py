@@ -0,0 +1,124 @@
+"""
+Synchronisation incrémentale du catalogue vendeur (dashboard mobile).
+
+Le client renvoie le jeton `next` de sa dernière synchronisation et ne reçoit
+que les annonces modifiées depuis (curseur (updated_at, id), index
+business/updated_at/id) et les ids des annonces supprimées (ListingTombstone,
+curseur sur l'id du tombstone). Sans jeton, ou si le jeton est plus ancien que
+la rétention des tombstones, la réponse repart de zéro (`reset`) : le client
+vide son catalogue local et le recharge page par page.
+"""
+import base64
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from listing.models import Listing, ListingTombstone
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+TOMBSTONE_PAGE_SIZE = 1000
+PURGE_BATCH_SIZE = 1000
+
+
+class SyncTokenError(ValueError):
+    pass
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, "LISTING_SYNC_TOMBSTONE_DAYS", 30))
+
+
+def encode_token(issued_at, updated_at, listing_id, tombstone_id):
+    payload = {
+        "s": issued_at.isoformat(),
+        "u": updated_at.isoformat() if updated_at else None,
+        "l": listing_id,
+        "t": tombstone_id,
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_token(token):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        issued_at = parse_datetime(payload["s"])
+        updated_at = parse_datetime(payload["u"]) if payload["u"] else None
+        listing_id, tombstone_id = int(payload["l"]), int(payload["t"])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise SyncTokenError("Jeton de synchronisation invalide")
+    if issued_at is None:
+        raise SyncTokenError("Jeton de synchronisation invalide")
+    return issued_at, updated_at, listing_id, tombstone_id
+
+
+def sync_catalog(business_id, since=None, page_size=PAGE_SIZE):
+    """
+    Retourne {"changed": [Listing], "deleted": [ids], "next", "has_more", "reset"}.
+    Le client applique changed puis deleted, et rappelle avec next tant que
+    has_more est vrai.
+    """
+    now = timezone.now()
+    state = decode_token(since) if since else None
+    reset = state is None or state[0] < now - tombstone_retention()
+    if reset:
+        # Catalogue complet : les suppressions antérieures sont sans objet
+        updated_at, listing_id = None, 0
+        tombstone_id = (
+            ListingTombstone.objects.filter(business_id=business_id).aggregate(last=Max("id"))["last"] or 0
+        )
+    else:
+        _, updated_at, listing_id, tombstone_id = state
+
+    listings = Listing.objects.filter(business_id=business_id)
+    if updated_at is not None:
+        listings = listings.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=listing_id))
+    changed = list(listings.prefetch_related("images").order_by("updated_at", "id")[:page_size + 1])
+
+    tombstones = list(
+        ListingTombstone.objects.filter(business_id=business_id, id__gt=tombstone_id)
+        .order_by("id")
+        .values_list("id", "listing_id")[:TOMBSTONE_PAGE_SIZE + 1]
+    )
+
+    has_more = len(changed) > page_size or len(tombstones) > TOMBSTONE_PAGE_SIZE
+    changed = changed[:page_size]
+    tombstones = tombstones[:TOMBSTONE_PAGE_SIZE]
+    if changed:
+        updated_at, listing_id = changed[-1].updated_at, changed[-1].id
+    if tombstones:
+        tombstone_id = tombstones[-1][0]
+
+    return {
+        "changed": changed,
+        "deleted": [deleted_listing_id for _, deleted_listing_id in tombstones],
+        "next": encode_token(now, updated_at, listing_id, tombstone_id),
+        "has_more": has_more,
+        "reset": reset,
+    }
+
+
+def record_deletion(listing):
+    ListingTombstone.objects.create(listing_id=listing.pk, business_id=listing.business_id)
+
+
+def purge_tombstones(batch_size=PURGE_BATCH_SIZE):
+    """Supprime par lots les tombstones plus anciens que la rétention."""
+    cutoff = timezone.now() - tombstone_retention()
+    stale = ListingTombstone.objects.filter(deleted_at__lt=cutoff).order_by()
+    deleted = 0
+    while True:
+        ids = list(stale.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += ListingTombstone.objects.filter(id__in=ids).delete()[0]
+    if deleted:
+        logger.info("Purged %s listing tombstones older than %s", deleted, cutoff)
+    return deleted
@@ -0,0 +1,153 @@
+"""
+Flux public des changements d'annonces (clients hors ligne).
+
+Les signaux de Listing ajoutent une ligne à ListingChange pour chaque
+changement visible publiquement : publication (ou réactivation), modification
+d'un champ de la carte, désactivation ou suppression. Le client garde l'id du
+dernier changement reçu (checkpoint) et ne demande que la suite, par pages
+bornées ; chaque annonce n'apparaît qu'une fois par page (dernier état), sous
+forme de carte (listing.services.cards) ou de simple id si elle est retirée.
+
+Sans checkpoint, ou si le checkpoint précède la rétention du journal, la
+réponse indique `reset` : le client recharge public/listings/ puis suit le
+flux à partir du checkpoint renvoyé.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from listing.models import Listing, ListingChange
+from listing.services.cards import hydrate_listing_cards
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+PURGE_BATCH_SIZE = 1000
+# Les changements plus récents ne sont pas encore servis : une transaction plus
+# ancienne (id inférieur) peut ne pas être encore validée
+SETTLE_SECONDS = 2
+
+# Champs de la carte publique (ListingPublicSerializer) : les autres
+# modifications (description, specs...) ne sont pas diffusées
+CARD_FIELDS = {
+    "title", "price", "currency", "price_usd", "category", "commune", "quartier",
+    "slug", "is_for_barter", "business",
+}
+
+
+def _was_active(listing):
+    return listing.__dict__.get("_loaded_values", {}).get("is_active", listing.is_active)
+
+
+def change_action(listing, created=False, deleted=False):
+    """Action à journaliser pour ce save / delete, ou None s'il est invisible du public."""
+    if created:
+        return ListingChange.ACTION_CREATED if listing.is_active else None
+    was_active = _was_active(listing)
+    if deleted:
+        return ListingChange.ACTION_REMOVED if was_active else None
+    if listing.is_active and not was_active:
+        return ListingChange.ACTION_CREATED
+    if was_active and not listing.is_active:
+        return ListingChange.ACTION_REMOVED
+    if listing.is_active and listing.get_dirty_fields() & CARD_FIELDS:
+        return ListingChange.ACTION_UPDATED
+    return None
+
+
+def record_change(listing, created=False, deleted=False):
+    """Journalise le changement ; retourne l'action (None si invisible du public)."""
+    action = change_action(listing, created=created, deleted=deleted)
+    if action:
+        ListingChange.objects.create(listing_id=listing.pk, action=action)
+    return action
+
+
+def record_image_change(listing_id):
+    # L'image principale fait partie de la carte
+    if Listing.objects.filter(pk=listing_id, is_active=True).exists():
+        ListingChange.objects.create(listing_id=listing_id, action=ListingChange.ACTION_UPDATED)
+        return ListingChange.ACTION_UPDATED
+    return None
+
+
+def record_bulk_update(listing_ids):
+    """
+    Journalise un UPDATE en masse (QuerySet.update ne déclenche pas les
+    signaux) : une ligne par annonce active parmi listing_ids.
+    """
+    active = Listing.objects.filter(id__in=listing_ids, is_active=True).values_list("id", flat=True)
+    changes = [ListingChange(listing_id=listing_id, action=ListingChange.ACTION_UPDATED) for listing_id in active]
+    ListingChange.objects.bulk_create(changes)
+    return len(changes)
+
+
+def retention():
+    return timedelta(days=getattr(settings, "LISTING_CHANGES_RETENTION_DAYS", 30))
+
+
+def _head():
+    return ListingChange.objects.aggregate(last=Max("id"))["last"] or 0
+
+
+def get_changes(since=None, limit=PAGE_SIZE):
+    """
+    Retourne {"changes", "checkpoint", "has_more", "reset"}. Chaque changement
+    vaut {"id", "action", "listing"} (carte) ou {"id", "action": "removed"}.
+    """
+    if since is None or since < (ListingChange.objects.aggregate(first=Min("id"))["first"] or 1) - 1:
+        return {"changes": [], "checkpoint": _head(), "has_more": False, "reset": True}
+
+    rows = list(
+        ListingChange.objects.filter(id__gt=since)
+        .order_by("id")
+        .values_list("id", "listing_id", "action", "created_at")[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    for index, (_, _, _, created_at) in enumerate(rows):
+        if created_at > settled:
+            rows, has_more = rows[:index], False
+            break
+    if not rows:
+        return {"changes": [], "checkpoint": since, "has_more": False, "reset": False}
+
+    # Dernier état de chaque annonce dans la page
+    latest = {}
+    for _, listing_id, action, _ in rows:
+        latest.pop(listing_id, None)
+        latest[listing_id] = action
+    upserts = [listing_id for listing_id, action in latest.items() if action != ListingChange.ACTION_REMOVED]
+    cards = {card["id"]: card for card in hydrate_listing_cards(upserts)}
+
+    changes = []
+    for listing_id, action in latest.items():
+        card = cards.get(listing_id)
+        if action == ListingChange.ACTION_REMOVED or card is None:
+            # Retirée entre-temps (changement suivant pas encore lu)
+            changes.append({"id": listing_id, "action": ListingChange.ACTION_REMOVED})
+        else:
+            changes.append({"id": listing_id, "action": action, "listing": card})
+    return {"changes": changes, "checkpoint": rows[-1][0], "has_more": has_more, "reset": False}
+
+
+def purge_changes(batch_size=PURGE_BATCH_SIZE):
+    """Supprime par lots les changements plus anciens que la rétention (sauf le dernier)."""
+    cutoff = timezone.now() - retention()
+    # Le dernier changement est toujours conservé : sans lui, un checkpoint
+    # antérieur à la purge ne serait plus détectable (journal vide)
+    stale = ListingChange.objects.filter(created_at__lt=cutoff, id__lt=_head()).order_by()
+    deleted = 0
+    while True:
+        ids = list(stale.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += ListingChange.objects.filter(id__in=ids).delete()[0]
+    if deleted:
+        logger.info("Purged %s listing changes older than %s", deleted, cutoff)
+    return deleted
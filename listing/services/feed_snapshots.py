@@ -0,0 +1,153 @@
+"""
+Instantanés JSON des premières pages de public/listings/.
+
+Les FEED_SNAPSHOT_PAGES premières pages du fil (toutes catégories, puis pour
+chacune des FEED_SNAPSHOT_CATEGORIES catégories les plus fournies) sont
+rendues par ListingListView elle-même, écrites en JSON avec leur variante .gz
+et servies en fichiers statiques (core.middleware.PublishedFilesMiddleware) :
+
+    feed/all/page-<n>.json
+    feed/category/<slug>/page-<n>.json
+    feed/index.json          (catégorie -> URLs des pages disponibles)
+
+Les liens next / previous pointent vers l'instantané quand la page cible en a
+un, sinon vers l'API : le client suit les liens et retombe sur la vue
+dynamique au-delà des pages pré-rendues (ou pour tout autre filtre).
+
+Une modification d'annonce programme une reconstruction après
+FEED_SNAPSHOT_DEBOUNCE_SECONDS ; les modifications suivantes pendant cette
+fenêtre ne programment rien de plus (une seule reconstruction par rafale).
+"""
+import json
+import logging
+import os
+import shutil
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.text import slugify
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework.test import APIRequestFactory
+
+from core.utils.published_files import published_path, published_url, write_file, write_with_gzip_variant
+from listing.models import Listing
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = "feed"
+INDEX_NAME = f"{SNAPSHOT_DIR}/index.json"
+SCHEDULED_KEY = "feed_snapshots:scheduled"
+FEED_PATH = "/api/v2/public/listings/"
+ALL = "all"
+
+
+def snapshot_name(category_slug, page):
+    if category_slug == ALL:
+        return f"{SNAPSHOT_DIR}/{ALL}/page-{page}.json"
+    return f"{SNAPSHOT_DIR}/category/{category_slug}/page-{page}.json"
+
+
+def top_categories(limit):
+    return list(
+        Listing.objects.filter(is_active=True)
+        .exclude(category="")
+        .values("category")
+        .annotate(total=Count("id"))
+        .order_by("-total", "category")
+        .values_list("category", flat=True)[:limit]
+    )
+
+
+def render_page(category, page):
+    """Données de la page telles que servies par l'API, ou None si la page n'existe pas."""
+    from listing.controllers.listingController import ListingListView
+
+    params = {"page": page}
+    if category:
+        params["category"] = category
+    api_url = urlsplit(settings.PUBLISHED_FILES_BASE_URL)
+    request = APIRequestFactory().get(
+        FEED_PATH, params, SERVER_NAME=api_url.hostname, secure=api_url.scheme == "https",
+    )
+    # Sans le cache des pages : une page encore en cache serait antérieure à la modification
+    response = ListingListView.as_view(use_cache=False)(request)
+    return response.data if response.status_code == 200 else None
+
+
+def _link_to_snapshot(link, category_slug, pages):
+    """Lien de pagination de l'API -> URL de l'instantané si la page en a un."""
+    if not link:
+        return link
+    page = int(parse_qs(urlsplit(link).query).get("page", ["1"])[0])
+    return published_url(snapshot_name(category_slug, page)) if page <= pages else link
+
+
+def build_feed(category, category_slug, pages):
+    """Écrit les pages d'un fil ; retourne la liste des URLs écrites."""
+    urls = []
+    for page in range(1, pages + 1):
+        data = render_page(category, page)
+        if data is None:
+            break
+        data["next"] = _link_to_snapshot(data.get("next"), category_slug, pages)
+        data["previous"] = _link_to_snapshot(data.get("previous"), category_slug, pages)
+        name = snapshot_name(category_slug, page)
+        write_with_gzip_variant(name, json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":")).encode())
+        urls.append(published_url(name))
+
+    # Pages devenues vides depuis la dernière reconstruction
+    directory = os.path.dirname(published_path(snapshot_name(category_slug, 1)))
+    kept = {os.path.basename(published_path(snapshot_name(category_slug, page))) for page in range(1, len(urls) + 1)}
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if filename.removesuffix(".gz") not in kept:
+                os.unlink(os.path.join(directory, filename))
+    return urls
+
+
+def build_feed_snapshots():
+    """Reconstruit tous les instantanés. Retourne le nombre de pages écrites."""
+    pages = getattr(settings, "FEED_SNAPSHOT_PAGES", 3)
+    categories = top_categories(getattr(settings, "FEED_SNAPSHOT_CATEGORIES", 5))
+
+    index = {ALL: build_feed(None, ALL, pages), "categories": {}}
+    for category in categories:
+        if slugify(category):
+            index["categories"][category] = build_feed(category, slugify(category), pages)
+
+    # Catégories sorties du classement
+    category_root = published_path(f"{SNAPSHOT_DIR}/category")
+    if os.path.isdir(category_root):
+        current = {slugify(category) for category in categories}
+        for category_slug in os.listdir(category_root):
+            if category_slug not in current:
+                shutil.rmtree(os.path.join(category_root, category_slug), ignore_errors=True)
+
+    index["generated_at"] = timezone.now()
+    write_file(INDEX_NAME, [json.dumps(index, cls=DjangoJSONEncoder).encode()])
+    return len(index[ALL]) + sum(len(urls) for urls in index["categories"].values())
+
+
+def schedule_rebuild():
+    """
+    Programme une reconstruction dans FEED_SNAPSHOT_DEBOUNCE_SECONDS, sauf si
+    une reconstruction est déjà programmée.
+    """
+    window = getattr(settings, "FEED_SNAPSHOT_DEBOUNCE_SECONDS", 30)
+    try:
+        scheduled = get_redis_connection("default").set(SCHEDULED_KEY, 1, nx=True, ex=window)
+    except RedisError as exc:
+        # Rattrapé par la reconstruction périodique (CELERY_BEAT_SCHEDULE)
+        logger.warning("Feed snapshot rebuild not scheduled: %s", exc)
+        return False
+
+    if scheduled:
+        from listing.tasks import rebuild_feed_snapshots_task
+
+        transaction.on_commit(lambda: rebuild_feed_snapshots_task.apply_async(countdown=window))
+    return bool(scheduled)
@@ -1,3 +1,8 @@
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from django.db import connection
+from django.utils.text import slugify
 from rest_framework import serializers
 
 from listing.services.listing_types import (
@@ -37,3 +42,184 @@ def validate_listing_payload(data):
         data.setdefault("currency", "USD")
 
     return data
+
+
+# =======================
+# SCHEMAS DES SPECS PAR CATÉGORIE
+# =======================
+SPEC_INT = "int"
+SPEC_NUMBER = "number"
+SPEC_BOOL = "bool"
+SPEC_TEXT = "text"
+
+NUMERIC_LOOKUPS = {"exact", "gt", "gte", "lt", "lte"}
+
+# Attributs communs à toutes les catégories
+COMMON_SPECS = {
+    "etat": (SPEC_TEXT, {"neuf", "occasion", "reconditionne"}),
+    "stock": (SPEC_INT, None),
+}
+
+REAL_ESTATE_SPECS = {
+    "chambres": (SPEC_INT, None),
+    "salles_de_bain": (SPEC_INT, None),
+    "superficie": (SPEC_NUMBER, None),
+    "meuble": (SPEC_BOOL, None),
+}
+
+PHONE_SPECS = {
+    "marque": (SPEC_TEXT, None),
+    "stockage_go": (SPEC_INT, None),
+    "ram_go": (SPEC_INT, None),
+}
+
+VEHICLE_SPECS = {
+    "marque": (SPEC_TEXT, None),
+    "annee": (SPEC_INT, None),
+    "kilometrage": (SPEC_INT, None),
+    "carburant": (SPEC_TEXT, {"essence", "diesel", "hybride", "electrique"}),
+}
+
+# slug de catégorie -> attributs spécifiques
+CATEGORY_SPECS = {
+    **dict.fromkeys(
+        ["immobilier", "appartement", "maison", "parcelle", "terrain", "chambre", "bureau"],
+        REAL_ESTATE_SPECS,
+    ),
+    **dict.fromkeys(["phones", "smartphone", "telephones", "telephone", "tablette"], PHONE_SPECS),
+    **dict.fromkeys(["vehicules", "voiture", "moto"], VEHICLE_SPECS),
+}
+
+# Clés numériques les plus filtrées : index d'expression sur PostgreSQL
+# (voir la migration listing 0008_listing_specs_indexes)
+INDEXED_NUMERIC_SPECS = ("chambres", "superficie")
+
+
+class SpecFilterError(ValueError):
+    pass
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError
+    return int(value)
+
+
+def _to_number(value):
+    if isinstance(value, bool):
+        raise ValueError
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError
+    if not number.is_finite():
+        raise ValueError
+    return int(number) if number == number.to_integral_value() else float(number)
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in {"1", "true", "oui", "vrai"}:
+        return True
+    if text in {"0", "false", "non", "faux"}:
+        return False
+    raise ValueError
+
+
+def _text_caster(choices):
+    def cast(value):
+        text = str(value).strip().lower()
+        if not text or (choices and text not in choices):
+            raise ValueError
+        return text
+    return cast
+
+
+_CASTERS = {SPEC_INT: _to_int, SPEC_NUMBER: _to_number, SPEC_BOOL: _to_bool}
+
+
+@lru_cache(maxsize=None)
+def compiled_spec_schema(category_slug=None):
+    """
+    {clé: (type, conversion)} pour une catégorie, compilé une seule fois par
+    process. Sans catégorie : union de tous les schémas (filtre global).
+    """
+    if category_slug is None:
+        schema = dict(COMMON_SPECS)
+        for specs in CATEGORY_SPECS.values():
+            schema.update(specs)
+    else:
+        schema = {**COMMON_SPECS, **CATEGORY_SPECS.get(category_slug, {})}
+    return {
+        key: (kind, _CASTERS.get(kind) or _text_caster(frozenset(choices or ())))
+        for key, (kind, choices) in schema.items()
+    }
+
+
+def spec_schema_for(category):
+    return compiled_spec_schema(slugify(category) if category else None)
+
+
+def cast_specs(category, specs):
+    """
+    Convertit les attributs connus au type du schéma (ex: "3" -> 3) pour que
+    les comparaisons JSON soient numériques. Les clés inconnues sont gardées.
+    Retourne (specs convertis, clés invalides) ; une valeur invalide est
+    gardée telle quelle.
+    """
+    schema = spec_schema_for(category)
+    cast, invalid = {}, []
+    for key, value in specs.items():
+        if key in schema and value is not None:
+            try:
+                value = schema[key][1](value)
+            except (TypeError, ValueError):
+                invalid.append(key)
+        cast[key] = value
+    return cast, invalid
+
+
+def clean_specs(category, specs):
+    cleaned, invalid = cast_specs(category, specs)
+    if invalid:
+        raise serializers.ValidationError({"specs": {key: f"Valeur invalide pour {key}." for key in invalid}})
+    return cleaned
+
+
+def parse_spec_filters(params, category=None):
+    """
+    Lit les paramètres "specs.<clé>[__<lookup>]" (ex: specs.chambres__gte=3)
+    et retourne [(clé, lookup, valeur)] validés contre le schéma.
+    """
+    schema = spec_schema_for(category)
+    filters = []
+    for param, raw in params.items():
+        if not param.startswith("specs."):
+            continue
+        key, _, lookup = param[len("specs."):].partition("__")
+        lookup = lookup or "exact"
+        if key not in schema:
+            raise SpecFilterError(f"Filtre inconnu : {param}")
+        kind, cast = schema[key]
+        allowed = NUMERIC_LOOKUPS if kind in (SPEC_INT, SPEC_NUMBER) else {"exact"}
+        if lookup not in allowed:
+            raise SpecFilterError(f"Opérateur non supporté : {param}")
+        try:
+            filters.append((key, lookup, cast(raw)))
+        except (TypeError, ValueError):
+            raise SpecFilterError(f"Valeur invalide pour {param}")
+    return filters
+
+
+def filter_by_specs(queryset, filters):
+    for key, lookup, value in filters:
+        if lookup == "exact" and connection.vendor == "postgresql":
+            # Containment (@>) : servi par l'index GIN jsonb_path_ops
+            queryset = queryset.filter(specs__contains={key: value})
+        else:
+            queryset = queryset.filter(**{f"specs__{key}__{lookup}": value})
+    return queryset
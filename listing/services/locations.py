@@ -0,0 +1,213 @@
+"""
+Hiérarchie normalisée des localisations (ville -> commune -> quartier).
+
+Les champs texte de Listing restent l'entrée utilisateur ; à l'écriture, ils
+sont rattachés à un noeud Location (correspondance exacte sans accents ni
+ponctuation, puis approchée pour absorber les fautes de frappe). Seule une
+correspondance exacte remplace la saisie par le nom canonique : une
+correspondance approchée reste une supposition.
+
+Chaque noeud porte le nombre d'annonces actives, ajusté par delta dans les
+signaux. Les écritures en masse (update, bulk_update) ne passent pas par les
+signaux : une tâche nocturne recalcule les compteurs.
+"""
+import difflib
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Subquery, Value
+from django.db.models.functions import Greatest
+from django.utils.text import slugify
+
+from listing.models import Listing, Location
+from listing.services.similarity import fold
+
+TREE_CACHE_KEY = "location_tree"
+# Ratio minimal (difflib) pour rattacher une saisie à un noeud existant
+FUZZY_CUTOFF = 0.85
+LOCATION_FIELDS = (
+    (Location.VILLE, "ville", "ville_ref"),
+    (Location.COMMUNE, "commune", "commune_ref"),
+    (Location.QUARTIER, "quartier", "quartier_ref"),
+)
+SNAPSHOT_FIELDS = {"is_active", "ville", "commune", "quartier", "ville_ref_id", "commune_ref_id", "quartier_ref_id"}
+NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+DIGITS_RE = re.compile(r"[0-9]+")
+
+
+def normalize_location_name(name):
+    """'Kasa-Vubu', 'kasavubu ', 'Kasa Vubu' -> 'kasavubu'."""
+    return NON_ALNUM_RE.sub("", fold(name))
+
+
+def clean_display_name(name):
+    return " ".join((name or "").split())
+
+
+def close_match(key, candidates):
+    """
+    Noeud le plus proche de la saisie (faute de frappe), ou None. Les numéros
+    doivent être identiques : 'quartier2' n'est pas une variante de 'quartier1'.
+    """
+    digits = DIGITS_RE.findall(key)
+    candidates = [candidate for candidate in candidates if DIGITS_RE.findall(candidate) == digits]
+    close = difflib.get_close_matches(key, candidates, n=1, cutoff=FUZZY_CUTOFF)
+    return close[0] if close else None
+
+
+def resolve_location(name, level, parent=None):
+    """Retourne le noeud correspondant à la saisie, en le créant si besoin."""
+    key = normalize_location_name(name)
+    if not key:
+        return None
+
+    siblings = Location.objects.filter(level=level, parent=parent)
+    candidates = dict(siblings.values_list("normalized_name", "id"))
+    if key not in candidates:
+        key = close_match(key, candidates) or key
+    if key in candidates:
+        return siblings.get(id=candidates[key])
+
+    display = clean_display_name(name)
+    try:
+        with transaction.atomic():
+            return Location.objects.create(
+                level=level,
+                parent=parent,
+                name=display,
+                normalized_name=key,
+                slug=slugify(display)[:120],
+            )
+    except IntegrityError:
+        # Créé en parallèle par un autre worker
+        return siblings.get(normalized_name=key)
+
+
+def is_known_ville(name):
+    return Location.objects.filter(
+        level=Location.VILLE, normalized_name=normalize_location_name(name)
+    ).exists()
+
+
+def location_text(listing):
+    return tuple(getattr(listing, field) for _, field, _ in LOCATION_FIELDS)
+
+
+def assign_locations(listing):
+    """
+    Rattache l'annonce aux noeuds et canonicalise les champs texte. Appelé par
+    Listing.save(), uniquement si la saisie a changé depuis le chargement.
+    """
+    refs_missing = listing.ville_ref_id is None and listing.ville
+    if not refs_missing and getattr(listing, "_location_text", None) == location_text(listing):
+        return
+
+    parent = None
+    for level, field, ref_field in LOCATION_FIELDS:
+        node = resolve_location(getattr(listing, field), level, parent) if parent or level == Location.VILLE else None
+        setattr(listing, ref_field, node)
+        if node and node.normalized_name == normalize_location_name(getattr(listing, field)):
+            # Même nom à l'orthographe près : on garde la graphie canonique
+            setattr(listing, field, node.name)
+        parent = node
+
+
+def snapshot(listing):
+    """Etat pris en compte dans les compteurs, mémorisé au chargement / après save."""
+    if SNAPSHOT_FIELDS & listing.get_deferred_fields():
+        # Instance partielle (.only / .defer) : ne pas déclencher de requête
+        return
+    listing._location_state = (listing.is_active, listing.ville_ref_id, listing.commune_ref_id, listing.quartier_ref_id)
+    listing._location_text = location_text(listing)
+
+
+def _contributions(state):
+    if not state or not state[0]:
+        return Counter()
+    return Counter(node_id for node_id in state[1:] if node_id)
+
+
+def update_counts(listing, created=False, deleted=False):
+    if not created and not hasattr(listing, "_location_state"):
+        # Etat précédent inconnu : laissé au recalcul nocturne
+        return
+    previous = None if created else listing._location_state
+    snapshot(listing)
+    current = None if deleted else listing._location_state
+
+    delta = _contributions(current)
+    delta.subtract(_contributions(previous))
+
+    by_value = defaultdict(list)
+    for node_id, value in delta.items():
+        if value:
+            by_value[value].append(node_id)
+    for value, node_ids in by_value.items():
+        Location.objects.filter(id__in=node_ids).update(
+            active_listings_count=Greatest(F("active_listings_count") + value, Value(0))
+        )
+    if by_value:
+        cache.delete(TREE_CACHE_KEY)
+
+
+def recount_locations():
+    """Recalcul complet des compteurs (rattrape les écritures en masse)."""
+    counts = Counter()
+    active = Listing.objects.filter(is_active=True).order_by()
+    for _, _, ref_field in LOCATION_FIELDS:
+        rows = active.filter(**{f"{ref_field}__isnull": False}).values(ref_field).annotate(total=Count("id"))
+        counts.update({row[ref_field]: row["total"] for row in rows})
+
+    nodes = list(Location.objects.only("id", "active_listings_count"))
+    changed = [node for node in nodes if node.active_listings_count != counts.get(node.id, 0)]
+    for node in changed:
+        node.active_listings_count = counts.get(node.id, 0)
+    Location.objects.bulk_update(changed, ["active_listings_count"], batch_size=1000)
+    cache.delete(TREE_CACHE_KEY)
+    return len(changed)
+
+
+def get_location_tree():
+    """Arbre complet avec compteurs, servi depuis le cache."""
+    tree = cache.get(TREE_CACHE_KEY)
+    if tree is not None:
+        return tree
+
+    children = defaultdict(list)
+    for node in Location.objects.order_by("name").values(
+        "id", "parent_id", "level", "name", "slug", "active_listings_count"
+    ):
+        children[node.pop("parent_id")].append(node)
+
+    def build(parent_id):
+        return [
+            {
+                "id": node["id"],
+                "name": node["name"],
+                "slug": node["slug"],
+                "level": node["level"],
+                "count": node["active_listings_count"],
+                "children": build(node["id"]),
+            }
+            for node in children.get(parent_id, [])
+        ]
+
+    tree = build(None)
+    cache.set(TREE_CACHE_KEY, tree, getattr(settings, "CACHE_TTL", 900))
+    return tree
+
+
+def filter_by_location(queryset, *, ville=None, commune=None, quartier=None):
+    """Filtre sur les clés étrangères (indexées) au lieu des champs texte."""
+    for level, value, ref_field in (
+        (Location.VILLE, ville, "ville_ref"),
+        (Location.COMMUNE, commune, "commune_ref"),
+        (Location.QUARTIER, quartier, "quartier_ref"),
+    ):
+        if value:
+            nodes = Location.objects.filter(level=level, normalized_name=normalize_location_name(value))
+            queryset = queryset.filter(**{f"{ref_field}__in": Subquery(nodes.values("id"))})
+    return queryset
@@ -0,0 +1,144 @@
+"""
+Conversion des prix en USD.
+
+Listing.price_usd est calculé à l'écriture à partir des taux de ExchangeRate
+(mis en cache). Quand un taux change, la tâche recompute_prices_usd_task
+recalcule la colonne en SQL, par lots d'ids, sans charger les annonces. Seules
+les annonces dont le prix USD change sont réécrites : leur updated_at avance
+(synchronisation du catalogue vendeur) et le flux public des changements les
+reçoit, comme pour un save().
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from listing.models import ExchangeRate, Listing
+from listing.services.cards import CARD_CACHE_PREFIX
+from listing.services.change_feed import record_bulk_update
+from listing.services.feed_snapshots import schedule_rebuild
+
+BASE_CURRENCY = "USD"
+RATES_CACHE_KEY = "exchange_rates"
+RATES_CACHE_TTL = 60 * 60
+CENT = Decimal("0.01")
+RECOMPUTE_BATCH_SIZE = 1000
+
+
+def get_rates():
+    """{devise: unités pour 1 USD}, depuis le cache."""
+    rates = cache.get(RATES_CACHE_KEY)
+    if rates is None:
+        rates = dict(ExchangeRate.objects.values_list("currency", "units_per_usd"))
+        cache.set(RATES_CACHE_KEY, rates, RATES_CACHE_TTL)
+    return rates
+
+
+def invalidate_rates():
+    cache.delete(RATES_CACHE_KEY)
+
+
+def to_usd(price, currency, rates=None):
+    """None si le prix est absent ou si la devise n'a pas de taux."""
+    if price is None:
+        return None
+    try:
+        price = Decimal(price)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+    currency = (currency or BASE_CURRENCY).upper()
+    if currency == BASE_CURRENCY:
+        return price.quantize(CENT)
+    rate = (get_rates() if rates is None else rates).get(currency)
+    if not rate:
+        return None
+    return (price / rate).quantize(CENT)
+
+
+class PriceFilterError(ValueError):
+    pass
+
+
+def parse_price_range(params):
+    """?min_price= / ?max_price= exprimés en USD."""
+    bounds = []
+    for param in ("min_price", "max_price"):
+        raw = params.get(param)
+        if raw in (None, ""):
+            bounds.append(None)
+            continue
+        try:
+            value = Decimal(raw)
+        except InvalidOperation:
+            raise PriceFilterError(f"Valeur invalide pour {param}")
+        if not value.is_finite() or value < 0:
+            raise PriceFilterError(f"Valeur invalide pour {param}")
+        bounds.append(value)
+    return tuple(bounds)
+
+
+def filter_by_price(queryset, min_price=None, max_price=None):
+    if min_price is not None:
+        queryset = queryset.filter(price_usd__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price_usd__lte=max_price)
+    return queryset
+
+
+def _update_changed(listings, price_usd, now, batch_size):
+    """
+    Réécrit price_usd (et updated_at) des annonces où il change, par lots
+    d'ids, et journalise chaque lot dans le flux des changements.
+    """
+    if price_usd is None:
+        changed = listings.filter(price_usd__isnull=False)
+    else:
+        changed = listings.exclude(price_usd=price_usd)
+    updated = last_id = 0
+    while True:
+        ids = list(changed.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return updated
+        last_id = ids[-1]
+        updated += Listing.objects.filter(id__in=ids).update(price_usd=price_usd, updated_at=now)
+        record_bulk_update(ids)
+
+
+def recompute_prices_usd(currency=None, batch_size=RECOMPUTE_BATCH_SIZE):
+    """
+    Recalcule price_usd en SQL. Sans argument, toutes les devises ; les
+    annonces dans une devise sans taux passent à NULL. Retourne le nombre
+    d'annonces dont le prix USD a changé.
+    """
+    # Devises en majuscules, comme Listing.save et ExchangeRate.save
+    currency = currency.upper() if currency else None
+    invalidate_rates()
+    rates = dict(ExchangeRate.objects.values_list("currency", "units_per_usd"))
+    listings = Listing.objects.order_by()
+    now = timezone.now()
+    updated = 0
+
+    if currency in (None, BASE_CURRENCY):
+        updated += _update_changed(listings.filter(currency=BASE_CURRENCY), F("price"), now, batch_size)
+
+    for code, rate in rates.items():
+        if currency not in (None, code) or code == BASE_CURRENCY:
+            continue
+        converted = Round(F("price") / Value(rate, output_field=DecimalField()), 2)
+        updated += _update_changed(listings.filter(currency=code), converted, now, batch_size)
+
+    if currency is None:
+        stale = listings.exclude(currency__in=[BASE_CURRENCY, *rates])
+        updated += _update_changed(stale, None, now, batch_size)
+    elif currency != BASE_CURRENCY and currency not in rates:
+        updated += _update_changed(listings.filter(currency=currency), None, now, batch_size)
+
+    if updated:
+        # Les cartes, les pages de liste et les instantanés exposent price_usd
+        cache.delete_pattern(f"{CARD_CACHE_PREFIX}:*")
+        cache.delete_pattern("listings_*")
+        schedule_rebuild()
+    return updated
@@ -0,0 +1,167 @@
+"""
+Classement par pertinence des annonces.
+
+Le score "statique" (fraîcheur, promotion, vendeur vérifié, conversion
+WhatsApp) est précalculé dans Listing.rank_score par une tâche périodique.
+À la requête, on ne combine plus que cette colonne avec le score textuel.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+from django.utils import timezone
+
+from listing.models import Listing
+
+# Lissage bayésien du taux de conversion : une annonce sans vue vaut le prior
+CONVERSION_PRIOR = 0.05
+CONVERSION_PRIOR_VIEWS = 20
+
+
+def get_weights(overrides=None):
+    """Poids de settings.LISTING_RANKING_WEIGHTS (seule source), éventuellement surchargés."""
+    return {**settings.LISTING_RANKING_WEIGHTS, **(overrides or {})}
+
+
+def freshness(created_at, now):
+    half_life = getattr(settings, "LISTING_FRESHNESS_HALF_LIFE_DAYS", 14)
+    age_days = max((now - created_at).total_seconds(), 0) / 86400
+    return 2 ** (-age_days / half_life)
+
+
+def conversion_rate(clicks, views):
+    return (clicks + CONVERSION_PRIOR * CONVERSION_PRIOR_VIEWS) / (views + CONVERSION_PRIOR_VIEWS)
+
+
+def static_score(*, created_at, is_promoted, is_verified, views, clicks, now, weights):
+    return (
+        weights["freshness"] * freshness(created_at, now)
+        + weights["promoted"] * bool(is_promoted)
+        + weights["verified"] * bool(is_verified)
+        + weights["conversion"] * conversion_rate(clicks, views)
+    )
+
+
+def engagement_stats(since=None, until=None):
+    """{listing_id: (vues, clics WhatsApp)} sur la période, en une requête GROUP BY."""
+    from analytics.models import AnalyticsEvent
+
+    events = AnalyticsEvent.objects.filter(listing__isnull=False)
+    if since:
+        events = events.filter(created_at__gte=since)
+    if until:
+        events = events.filter(created_at__lt=until)
+
+    rows = (
+        events.order_by()
+        .values("listing_id")
+        .annotate(
+            views=Count("id", filter=Q(event_type="listing_view")),
+            clicks=Count("id", filter=Q(event_type="whatsapp_click")),
+        )
+    )
+    return {row["listing_id"]: (row["views"], row["clicks"]) for row in rows}
+
+
+def scoring_rows(queryset):
+    return queryset.order_by().values_list(
+        "id",
+        "created_at",
+        "is_promoted",
+        "business__owner__is_phone_verified",
+        "business__owner__profile__is_verified",
+    )
+
+
+def compute_static_scores(queryset, stats, now, weights=None):
+    weights = weights or get_weights()
+    scores = {}
+    for listing_id, created_at, is_promoted, phone_verified, profile_verified in scoring_rows(queryset):
+        views, clicks = stats.get(listing_id, (0, 0))
+        scores[listing_id] = static_score(
+            created_at=created_at,
+            is_promoted=is_promoted,
+            is_verified=phone_verified or profile_verified,
+            views=views,
+            clicks=clicks,
+            now=now,
+            weights=weights,
+        )
+    return scores
+
+
+def refresh_static_scores(chunk_size=1000):
+    """Recalcule Listing.rank_score pour toutes les annonces actives."""
+    now = timezone.now()
+    window = getattr(settings, "LISTING_RANKING_ENGAGEMENT_DAYS", 30)
+    stats = engagement_stats(since=now - timedelta(days=window))
+    scores = compute_static_scores(Listing.objects.filter(is_active=True), stats, now)
+
+    updates = [Listing(id=listing_id, rank_score=score) for listing_id, score in scores.items()]
+    # bulk_update ne déclenche ni save() ni les signaux (pas d'invalidation de cache)
+    Listing.objects.bulk_update(updates, ["rank_score"], batch_size=chunk_size)
+    return len(updates)
+
+
+def initial_static_score(listing):
+    """Score provisoire d'une nouvelle annonce, avant le prochain rafraîchissement."""
+    from base_api.models import Business
+
+    verified = (
+        Business.objects.filter(pk=listing.business_id)
+        .values_list("owner__is_phone_verified", "owner__profile__is_verified")
+        .first()
+    ) or ()
+    now = timezone.now()
+    return static_score(
+        created_at=listing.created_at or now,
+        is_promoted=listing.is_promoted,
+        is_verified=any(verified),
+        views=0,
+        clicks=0,
+        now=now,
+        weights=get_weights(),
+    )
+
+
+def update_search_vectors(queryset):
+    """Recalcule Listing.search_vector (PostgreSQL uniquement) en un UPDATE."""
+    if connection.vendor != "postgresql":
+        return 0
+    from django.contrib.postgres.search import SearchVector
+
+    vector = SearchVector("title", weight="A", config="french") + SearchVector(
+        "description", weight="B", config="french"
+    )
+    return queryset.update(search_vector=vector)
+
+
+def search_listings(queryset, query):
+    """Filtre sur le texte et annote text_rank (plein texte sur PostgreSQL)."""
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        # Vecteur stocké : le filtre @@ passe par l'index GIN
+        search_query = SearchQuery(query, config="french", search_type="websearch")
+        return queryset.filter(search_vector=search_query).annotate(
+            text_rank=SearchRank(F("search_vector"), search_query)
+        )
+
+    return queryset.filter(Q(title__icontains=query) | Q(description__icontains=query)).annotate(
+        text_rank=Case(
+            When(title__icontains=query, then=Value(1.0)),
+            default=Value(0.5),
+            output_field=FloatField(),
+        )
+    )
+
+
+def rank_listings(queryset, query=None, weights=None):
+    weights = weights or get_weights()
+    if query:
+        queryset = search_listings(queryset, query)
+        relevance = F("text_rank") * weights["text"] + F("rank_score")
+    else:
+        relevance = F("rank_score")
+    return queryset.annotate(relevance=relevance).order_by("-relevance", "-updated_at")
@@ -0,0 +1,244 @@
+"""
+Alertes "nouvelle annonce" pour les recherches sauvegardées.
+
+Chaque recherche est indexée sous un seul prédicat, le plus sélectif (un mot
+clé, sinon la commune, sinon la catégorie) : SavedSearch.anchor. Une nouvelle
+annonce calcule toutes les clés qu'elle pourrait satisfaire (ses mots, sa
+commune, sa catégorie) et ne lit que les recherches indexées sous ces clés,
+via l'index (anchor, is_active). Les autres prédicats sont vérifiés en
+mémoire sur ces seuls candidats.
+
+Les correspondances sont mises en attente dans Redis par destinataire, puis
+envoyées périodiquement en un seul message par destinataire et par canal. Un
+destinataire ne quitte la file qu'une fois son message envoyé : un échec est
+retenté au passage suivant (dans la limite de PENDING_TTL).
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.text import slugify
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from listing.models import Listing, SavedSearch
+from listing.services.locations import normalize_location_name
+from listing.services.similarity import tokenize
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "saved_search"
+PENDING_RECIPIENTS_KEY = f"{KEY_PREFIX}:pending"
+PENDING_TTL = 7 * 24 * 3600
+# Au-delà, les mots de la description ne génèrent plus de clés candidates
+MAX_LISTING_TERMS = 300
+SEND_BATCH_SIZE = 500
+
+# Retire les annonces envoyées (KEYS[1]) puis, si plus rien n'attend, le
+# destinataire de la liste (KEYS[2]). Atomique face à queue_alerts.
+_ACK_SCRIPT = """
+if #ARGV > 1 then
+    redis.call('SREM', KEYS[1], unpack(ARGV, 2))
+end
+if redis.call('SCARD', KEYS[1]) == 0 then
+    redis.call('SREM', KEYS[2], ARGV[1])
+end
+return 1
+"""
+
+
+def pending_key(recipient):
+    return f"{KEY_PREFIX}:pending:{recipient}"
+
+
+def keyword_tokens(keywords):
+    return sorted(set(tokenize(keywords)))
+
+
+def search_anchor(search):
+    tokens = keyword_tokens(search.keywords)
+    if tokens:
+        # Le mot le plus long est en général le plus rare
+        return f"kw:{max(tokens, key=lambda token: (len(token), token))}"[:120]
+    if normalize_location_name(search.commune):
+        return f"commune:{normalize_location_name(search.commune)}"[:120]
+    if slugify(search.category):
+        return f"category:{slugify(search.category)}"[:120]
+    return ""
+
+
+class ListingFacts:
+    __slots__ = ("category", "commune", "price_usd", "tokens")
+
+    def __init__(self, listing):
+        self.category = slugify(listing.category or "")
+        self.commune = normalize_location_name(listing.commune)
+        self.price_usd = listing.price_usd
+        self.tokens = set(tokenize(listing.title))
+        for token in tokenize(listing.description):
+            if len(self.tokens) >= MAX_LISTING_TERMS:
+                break
+            self.tokens.add(token)
+
+    def anchors(self):
+        keys = {f"kw:{token}"[:120] for token in self.tokens}
+        if self.commune:
+            keys.add(f"commune:{self.commune}"[:120])
+        if self.category:
+            keys.add(f"category:{self.category}"[:120])
+        return keys
+
+
+def search_matches(search, facts):
+    if search.category and slugify(search.category) != facts.category:
+        return False
+    if search.commune and normalize_location_name(search.commune) != facts.commune:
+        return False
+    if search.min_price_usd is not None or search.max_price_usd is not None:
+        if facts.price_usd is None:
+            return False
+        if search.min_price_usd is not None and facts.price_usd < search.min_price_usd:
+            return False
+        if search.max_price_usd is not None and facts.price_usd > search.max_price_usd:
+            return False
+    return set(keyword_tokens(search.keywords)) <= facts.tokens
+
+
+def match_listing(listing):
+    """Recherches actives satisfaites par l'annonce (hors celles de son vendeur)."""
+    facts = ListingFacts(listing)
+    candidates = (
+        SavedSearch.objects.filter(anchor__in=facts.anchors(), is_active=True)
+        .exclude(user__business__id=listing.business_id)
+        .only("id", "user_id", "category", "commune", "min_price_usd", "max_price_usd", "keywords", "channel")
+    )
+    return [search for search in candidates if search_matches(search, facts)]
+
+
+def queue_alerts(listing):
+    """Met l'annonce en attente pour chaque destinataire concerné (un par user et canal)."""
+    if not listing.is_active:
+        return 0
+    recipients = {f"{search.channel}:{search.user_id}" for search in match_listing(listing)}
+    if not recipients:
+        return 0
+    try:
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        for recipient in recipients:
+            pipe.sadd(pending_key(recipient), listing.pk)
+            pipe.expire(pending_key(recipient), PENDING_TTL)
+        pipe.sadd(PENDING_RECIPIENTS_KEY, *recipients)
+        pipe.execute()
+    except RedisError as exc:
+        logger.warning("Saved search alerts not queued for listing %s: %s", listing.pk, exc)
+        return 0
+    return len(recipients)
+
+
+def _read_pending(conn, recipients):
+    """{destinataire: ids des annonces en attente}, sans rien retirer de Redis."""
+    pipe = conn.pipeline(transaction=False)
+    for recipient in recipients:
+        pipe.smembers(pending_key(recipient))
+    return {
+        recipient: {int(listing_id) for listing_id in members}
+        for recipient, members in zip(recipients, pipe.execute())
+    }
+
+
+def _ack_pending(conn, pending):
+    """Retire de la file les annonces traitées de ces destinataires."""
+    script = conn.register_script(_ACK_SCRIPT)
+    pipe = conn.pipeline(transaction=False)
+    for recipient, listing_ids in pending.items():
+        script(
+            keys=[pending_key(recipient), PENDING_RECIPIENTS_KEY],
+            args=[recipient, *sorted(listing_ids)],
+            client=pipe,
+        )
+    pipe.execute()
+
+
+def listing_url(listing):
+    return settings.SAVED_SEARCH_LISTING_URL.format(slug=listing.slug)
+
+
+def format_price(price):
+    return f"{price:,.0f}" if price == int(price) else f"{price:,.2f}"
+
+
+def alert_message(listings):
+    limit = getattr(settings, "SAVED_SEARCH_ALERT_MAX_LISTINGS", 3)
+    if len(listings) == 1:
+        header = "Niplan : nouvelle annonce pour votre recherche"
+    else:
+        header = f"Niplan : {len(listings)} nouvelles annonces pour vos recherches"
+    lines = [header]
+    for listing in listings[:limit]:
+        lines.append(f"- {listing.title} ({format_price(listing.price)} {listing.currency}) {listing_url(listing)}")
+    if len(listings) > limit:
+        lines.append(f"+ {len(listings) - limit} autres")
+    return "\n".join(lines)
+
+
+def _send_batch(conn, recipients):
+    from base_api.models import User
+    from core.utils.twilio_service import send_sms_bulk, send_whatsapp
+
+    pending = _read_pending(conn, recipients)
+    listing_ids = set().union(*pending.values())
+    listings = {
+        listing.id: listing
+        for listing in Listing.objects.filter(id__in=listing_ids, is_active=True).only(
+            "id", "title", "price", "currency", "slug", "created_at"
+        )
+    }
+    user_ids = {int(recipient.split(":", 1)[1]) for recipient in pending}
+    phones = dict(User.objects.filter(id__in=user_ids, is_active=True).values_list("id", "phone_whatsapp"))
+
+    # Rien à envoyer (annonces retirées, compte inactif) : traité d'office
+    done = {}
+    messages, senders = defaultdict(list), defaultdict(list)
+    for recipient, ids in pending.items():
+        channel, user_id = recipient.split(":", 1)
+        matched = sorted((listings[i] for i in ids if i in listings), key=lambda l: l.created_at, reverse=True)
+        phone = phones.get(int(user_id))
+        if matched and phone:
+            messages[channel].append((phone, alert_message(matched)))
+            senders[channel].append(recipient)
+        else:
+            done[recipient] = ids
+
+    results = send_sms_bulk(messages[SavedSearch.CHANNEL_SMS])
+    results += [send_whatsapp(phone, text) for phone, text in messages[SavedSearch.CHANNEL_WHATSAPP]]
+    sent = 0
+    for recipient, result in zip(senders[SavedSearch.CHANNEL_SMS] + senders[SavedSearch.CHANNEL_WHATSAPP], results):
+        if result.get("success"):
+            done[recipient] = pending[recipient]
+            sent += 1
+        else:
+            logger.warning("Saved search alert failed for %s: %s", result.get("to"), result.get("error"))
+
+    _ack_pending(conn, done)
+    return sent
+
+
+def send_pending_alerts():
+    """Un message par destinataire regroupant ses nouvelles annonces. Retourne le nombre d'envois."""
+    conn = get_redis_connection("default")
+    sent = 0
+    seen, batch = set(), []
+    # SSCAN tolère les retraits en cours de parcours, contrairement à une
+    # boucle sur SRANDMEMBER qui relirait sans fin les envois en échec
+    for recipient in conn.sscan_iter(PENDING_RECIPIENTS_KEY, count=SEND_BATCH_SIZE):
+        recipient = recipient.decode() if isinstance(recipient, bytes) else recipient
+        if recipient in seen:
+            continue
+        seen.add(recipient)
+        batch.append(recipient)
+        if len(batch) >= SEND_BATCH_SIZE:
+            sent += _send_batch(conn, batch)
+            batch = []
+    if batch:
+        sent += _send_batch(conn, batch)
+    return sent
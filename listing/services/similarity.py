@@ -0,0 +1,400 @@
+"""
+Index des annonces similaires.
+
+Chaque annonce est représentée par un vecteur TF-IDF creux (dict terme -> poids,
+normalisé L2) sur le titre, la description et la catégorie. La similarité
+combine le cosinus de ces vecteurs, la proximité de prix (en USD) et la
+localisation. Les candidats sont générés par un index inversé sur les termes
+les plus discriminants de chaque annonce, ce qui évite de comparer toutes les
+paires. Le top-K de chaque annonce est stocké dans SimilarListings.
+
+L'index (fréquences brutes de chaque annonce, fréquences documentaires,
+listes inversées) est conservé dans Redis : la reconstruction nocturne le
+réécrit en entier, la mise à jour incrémentale n'y modifie que les annonces
+marquées et ne lit que leurs candidats.
+"""
+import json
+import logging
+from abc import ABC, abstractmethod
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils.text import slugify
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from listing.models import Listing, SimilarListings
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 10
+# Termes de plus fort poids utilisés pour générer les candidats
+MAX_CANDIDATE_TERMS = 12
+WEIGHTS = {"text": 0.7, "price": 0.2, "location": 0.1}
+# Au-delà d'un facteur 4 entre les prix, la proximité de prix est nulle
+PRICE_RATIO_LIMIT = math.log(4)
+DIRTY_KEY = "similar:dirty"
+DIRTY_BATCH_SIZE = 500
+INDEX_PREFIX = "similar:index"
+# Annonce -> {"tf", "terms", "price", "ville", "commune"} (JSON)
+DOCS_KEY = f"{INDEX_PREFIX}:docs"
+# Terme -> nombre d'annonces qui le contiennent
+DF_KEY = f"{INDEX_PREFIX}:df"
+# Terme candidat -> ids des annonces (un set par terme)
+POSTINGS_PREFIX = f"{INDEX_PREFIX}:postings:"
+# Absent tant que l'index n'a pas été écrit en entier (ou si Redis a été vidé)
+READY_KEY = f"{INDEX_PREFIX}:ready"
+STORE_BATCH_SIZE = 1000
+ROW_FIELDS = ("id", "title", "description", "category", "price_usd", "ville", "commune")
+
+STOPWORDS = frozenset(
+    "au aux avec ce ces dans de des du en est et il la le les leur mais ne ou par pas "
+    "pour plus qui sa se ses son sur ta te tres un une vos votre the and for".split()
+)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text):
+    """Minuscules sans accents (é -> e)."""
+    normalized = unicodedata.normalize("NFKD", text or "")
+    return "".join(char for char in normalized if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(fold(text)) if len(token) > 1 and token not in STOPWORDS]
+
+
+def term_frequencies(title, description, category):
+    terms = Counter()
+    for token in tokenize(title):
+        terms[token] += 2
+    for token in tokenize(description):
+        terms[token] += 1
+    if category:
+        terms[f"cat:{slugify(category)}"] += 3
+    return terms
+
+
+def idf(document_frequency, total):
+    return math.log((1 + total) / (1 + document_frequency)) + 1
+
+
+def weigh(frequencies, document_frequency, total):
+    """Vecteur TF-IDF normalisé L2."""
+    vector = {term: tf * idf(document_frequency.get(term, 0), total) for term, tf in frequencies.items()}
+    norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+    return {term: weight / norm for term, weight in vector.items()}
+
+
+def candidate_terms(vector):
+    return sorted(vector, key=vector.get, reverse=True)[:MAX_CANDIDATE_TERMS]
+
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0.0) for term, weight in a.items())
+
+
+def price_proximity(a, b):
+    # Prix en USD (Listing.price_usd) : comparable quelle que soit la devise
+    if a.price <= 0 or b.price <= 0:
+        return 0.0
+    return max(0.0, 1 - abs(math.log(a.price / b.price)) / PRICE_RATIO_LIMIT)
+
+
+def location_proximity(a, b):
+    if a.commune and a.commune == b.commune:
+        return 1.0
+    if a.ville and a.ville == b.ville:
+        return 0.5
+    return 0.0
+
+
+class Document:
+    __slots__ = ("id", "frequencies", "vector", "terms", "price", "ville", "commune")
+
+    def __init__(self, listing_id, frequencies, price, ville, commune, terms=()):
+        self.id = listing_id
+        self.frequencies = frequencies
+        self.vector = {}
+        # Termes sous lesquels l'annonce est rangée dans l'index inversé
+        self.terms = list(terms)
+        self.price = float(price or 0)
+        self.ville = fold(ville).strip()
+        self.commune = fold(commune).strip()
+
+    @classmethod
+    def from_row(cls, row):
+        """row : valeurs de ROW_FIELDS."""
+        listing_id, title, description, category, price_usd, ville, commune = row
+        return cls(listing_id, term_frequencies(title, description, category), price_usd, ville, commune)
+
+    @classmethod
+    def loads(cls, listing_id, data):
+        data = json.loads(data)
+        return cls(listing_id, data["tf"], data["price"], data["ville"], data["commune"], data["terms"])
+
+    def dumps(self):
+        return json.dumps({
+            "tf": self.frequencies,
+            "terms": self.terms,
+            "price": self.price,
+            "ville": self.ville,
+            "commune": self.commune,
+        })
+
+    def index(self, document_frequency, total):
+        self.vector = weigh(self.frequencies, document_frequency, total)
+        self.terms = candidate_terms(self.vector)
+
+
+class BaseSimilarityIndex(ABC):
+    @abstractmethod
+    def document(self, listing_id):
+        """Document indexé de l'annonce, ou None."""
+
+    @abstractmethod
+    def candidates(self, document):
+        """Documents partageant un terme candidat avec document (hors lui-même)."""
+
+    @staticmethod
+    def score(a, b):
+        return (
+            WEIGHTS["text"] * cosine(a.vector, b.vector)
+            + WEIGHTS["price"] * price_proximity(a, b)
+            + WEIGHTS["location"] * location_proximity(a, b)
+        )
+
+    def neighbours(self, listing_id, k=TOP_K):
+        document = self.document(listing_id)
+        scored = [(self.score(document, other), other.id) for other in self.candidates(document)]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [other_id for score, other_id in scored[:k] if score > 0]
+
+
+class SimilarityIndex(BaseSimilarityIndex):
+    """Index complet en mémoire (reconstruction nocturne)."""
+
+    def __init__(self, rows):
+        self.documents = {row[0]: Document.from_row(row) for row in rows}
+        self.document_frequency = Counter()
+        for document in self.documents.values():
+            self.document_frequency.update(document.frequencies.keys())
+
+        self.postings = defaultdict(set)
+        for document in self.documents.values():
+            document.index(self.document_frequency, len(self.documents))
+            for term in document.terms:
+                self.postings[term].add(document.id)
+
+    def document(self, listing_id):
+        return self.documents.get(listing_id)
+
+    def candidates(self, document):
+        found = set()
+        for term in candidate_terms(document.vector):
+            found |= self.postings.get(term, set())
+        found.discard(document.id)
+        return [self.documents[listing_id] for listing_id in found]
+
+
+class RedisSimilarityIndex(BaseSimilarityIndex):
+    """Index stocké dans Redis, lu à la demande : seules les annonces et les termes utiles sont chargés."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.total = conn.hlen(DOCS_KEY)
+        self.documents = {}
+        self.document_frequency = {}
+
+    def load(self, listing_ids):
+        missing = [listing_id for listing_id in listing_ids if listing_id not in self.documents]
+        if missing:
+            loaded = []
+            for listing_id, data in zip(missing, self.conn.hmget(DOCS_KEY, missing)):
+                self.documents[listing_id] = Document.loads(listing_id, data) if data else None
+                if data:
+                    loaded.append(self.documents[listing_id])
+            terms = list({term for document in loaded for term in document.frequencies} - set(self.document_frequency))
+            if terms:
+                counts = self.conn.hmget(DF_KEY, terms)
+                self.document_frequency.update((term, int(count or 0)) for term, count in zip(terms, counts))
+            for document in loaded:
+                document.vector = weigh(document.frequencies, self.document_frequency, self.total)
+        return [self.documents[listing_id] for listing_id in listing_ids if self.documents.get(listing_id)]
+
+    def document(self, listing_id):
+        found = self.load([listing_id])
+        return found[0] if found else None
+
+    def candidates(self, document):
+        keys = [f"{POSTINGS_PREFIX}{term}" for term in candidate_terms(document.vector)]
+        found = {int(listing_id) for listing_id in self.conn.sunion(keys)} if keys else set()
+        found.discard(document.id)
+        return self.load(sorted(found))
+
+
+def load_index():
+    rows = (
+        Listing.objects.filter(is_active=True)
+        .order_by()
+        .values_list(*ROW_FIELDS)
+        .iterator(chunk_size=2000)
+    )
+    return SimilarityIndex(rows)
+
+
+def store_index(conn, index):
+    """Réécrit l'index Redis à partir de l'index complet."""
+    conn.delete(READY_KEY, DOCS_KEY, DF_KEY)
+    stale = []
+    for key in conn.scan_iter(match=f"{POSTINGS_PREFIX}*", count=STORE_BATCH_SIZE):
+        stale.append(key)
+        if len(stale) >= STORE_BATCH_SIZE:
+            conn.delete(*stale)
+            stale = []
+    if stale:
+        conn.delete(*stale)
+
+    pipe = conn.pipeline(transaction=False)
+    for count, document in enumerate(index.documents.values(), start=1):
+        pipe.hset(DOCS_KEY, document.id, document.dumps())
+        if count % STORE_BATCH_SIZE == 0:
+            pipe.execute()
+    for count, (term, listing_ids) in enumerate(index.postings.items(), start=1):
+        pipe.sadd(f"{POSTINGS_PREFIX}{term}", *listing_ids)
+        if count % STORE_BATCH_SIZE == 0:
+            pipe.execute()
+    for count, (term, frequency) in enumerate(index.document_frequency.items(), start=1):
+        pipe.hset(DF_KEY, term, frequency)
+        if count % STORE_BATCH_SIZE == 0:
+            pipe.execute()
+    pipe.set(READY_KEY, 1)
+    pipe.execute()
+
+
+def remove_documents(conn, listing_ids):
+    pipe = conn.pipeline(transaction=False)
+    for listing_id, data in zip(listing_ids, conn.hmget(DOCS_KEY, listing_ids)):
+        if not data:
+            continue
+        document = Document.loads(listing_id, data)
+        for term in document.frequencies:
+            pipe.hincrby(DF_KEY, term, -1)
+        for term in document.terms:
+            pipe.srem(f"{POSTINGS_PREFIX}{term}", listing_id)
+        pipe.hdel(DOCS_KEY, listing_id)
+    pipe.execute()
+
+
+def add_documents(conn, documents):
+    if not documents:
+        return
+    pipe = conn.pipeline(transaction=False)
+    for document in documents:
+        for term in document.frequencies:
+            pipe.hincrby(DF_KEY, term, 1)
+    pipe.execute()
+
+    terms = list({term for document in documents for term in document.frequencies})
+    document_frequency = {term: int(count or 0) for term, count in zip(terms, conn.hmget(DF_KEY, terms))}
+    total = conn.hlen(DOCS_KEY) + len(documents)
+    for document in documents:
+        document.index(document_frequency, total)
+        for term in document.terms:
+            pipe.sadd(f"{POSTINGS_PREFIX}{term}", document.id)
+        pipe.hset(DOCS_KEY, document.id, document.dumps())
+    pipe.execute()
+
+
+def _save_neighbours(index, listing_ids):
+    rows = [
+        SimilarListings(listing_id=listing_id, neighbour_ids=index.neighbours(listing_id))
+        for listing_id in listing_ids
+        if index.document(listing_id)
+    ]
+    SimilarListings.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["listing"],
+        update_fields=["neighbour_ids", "updated_at"],
+    )
+    return len(rows)
+
+
+def rebuild_similarity_index():
+    """Reconstruction complète (tâche nocturne)."""
+    index = load_index()
+    try:
+        store_index(get_redis_connection("default"), index)
+    except RedisError as exc:
+        # Les mises à jour incrémentales attendront la prochaine reconstruction
+        logger.warning("Similar index not stored in Redis: %s", exc)
+    with transaction.atomic():
+        SimilarListings.objects.exclude(listing_id__in=list(index.documents)).delete()
+        return _save_neighbours(index, list(index.documents))
+
+
+def mark_dirty(listing_id):
+    try:
+        get_redis_connection("default").sadd(DIRTY_KEY, listing_id)
+    except RedisError as exc:
+        logger.warning("Similar index dirty flag failed for %s: %s", listing_id, exc)
+
+
+def update_dirty_listings():
+    """
+    Mise à jour incrémentale : réindexe dans Redis les annonces modifiées depuis
+    le dernier passage, puis recalcule leur top-K et celui des voisins qu'elles
+    peuvent déplacer (avant et après modification). Seuls ces annonces et leurs
+    candidats sont lus. Les annonces ne quittent DIRTY_KEY qu'une fois traitées :
+    un échec les laisse pour le prochain passage.
+    """
+    conn = get_redis_connection("default")
+    dirty = [int(listing_id) for listing_id in conn.srandmember(DIRTY_KEY, DIRTY_BATCH_SIZE) or []]
+    if not dirty:
+        return 0
+    if not conn.exists(READY_KEY):
+        # Index absent de Redis (jamais construit, ou Redis vidé)
+        count = rebuild_similarity_index()
+        conn.srem(DIRTY_KEY, *dirty)
+        return count
+
+    # Annonces dont le top-K contient peut-être une version périmée
+    before = RedisSimilarityIndex(conn)
+    affected = set()
+    for listing_id in dirty:
+        if before.document(listing_id):
+            affected.update(before.neighbours(listing_id, k=TOP_K * 2))
+
+    rows = Listing.objects.filter(id__in=dirty, is_active=True).order_by().values_list(*ROW_FIELDS)
+    documents = [Document.from_row(row) for row in rows]
+    remove_documents(conn, dirty)
+    add_documents(conn, documents)
+
+    after = RedisSimilarityIndex(conn)
+    for document in documents:
+        affected.add(document.id)
+        # Les annonces les plus proches sont celles dont le top-K peut changer
+        affected.update(after.neighbours(document.id, k=TOP_K * 2))
+
+    removed = set(dirty) - {document.id for document in documents}
+    with transaction.atomic():
+        SimilarListings.objects.filter(listing_id__in=removed).delete()
+        count = _save_neighbours(after, affected - removed)
+    conn.srem(DIRTY_KEY, *dirty)
+    return count
+
+
+def get_similar_listing_ids(listing_id):
+    return (
+        SimilarListings.objects.filter(listing_id=listing_id)
+        .values_list("neighbour_ids", flat=True)
+        .first()
+        or []
+    )
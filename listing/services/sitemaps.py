@@ -0,0 +1,137 @@
+"""
+Sitemaps pré-générés (annonces et boutiques), servis en fichiers statiques.
+
+Chaque section est découpée en fichiers de SHARD_SIZE URLs au plus (limite du
+protocole sitemaps), par plages d'ids fixes : le fichier <section>-<n>.xml.gz
+couvre les ids de (n - 1) * SHARD_SIZE à n * SHARD_SIZE - 1. Une suppression
+ne décale donc pas les fichiers suivants. Les lignes sont lues par
+.iterator() : la mémoire ne dépend pas du nombre d'annonces.
+
+Un fichier n'est réécrit que si son contenu a changé : une empreinte des
+lignes (slug, updated_at) de la plage est comparée à celle du dernier passage
+(manifest.json). Un fichier inchangé garde son Last-Modified / ETag et le
+robot reçoit un 304.
+"""
+import hashlib
+import json
+import logging
+import os
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from base_api.models import Business
+from core.utils.published_files import published_path, published_url, remove_file, write_file
+from core.utils.streaming_export import CHUNK_SIZE, buffered
+from listing.models import Listing
+
+logger = logging.getLogger(__name__)
+
+SHARD_SIZE = 50000
+SITEMAP_DIR = "sitemaps"
+INDEX_NAME = f"{SITEMAP_DIR}/sitemap.xml"
+MANIFEST_NAME = f"{SITEMAP_DIR}/manifest.json"
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def sections():
+    """(nom, queryset, modèle d'URL publique avec {slug})."""
+    return [
+        (
+            "listings",
+            Listing.objects.filter(is_active=True, slug__gt=""),
+            settings.SITEMAP_LISTING_URL,
+        ),
+        (
+            "businesses",
+            Business.objects.filter(owner__is_active=True, slug__gt=""),
+            settings.SITEMAP_BUSINESS_URL,
+        ),
+    ]
+
+
+def shard_bounds(queryset, shard_size=SHARD_SIZE):
+    """(numéro, (premier id, dernier id exclu)) des plages fixes couvrant les ids présents."""
+    ids = queryset.order_by().aggregate(first=Min("id"), last=Max("id"))
+    if ids["first"] is None:
+        return
+    for number in range(ids["first"] // shard_size + 1, ids["last"] // shard_size + 2):
+        yield number, ((number - 1) * shard_size, number * shard_size)
+
+
+def shard_rows(queryset, bounds):
+    first, last = bounds
+    return (
+        queryset.filter(id__gte=first, id__lt=last)
+        .order_by("id")
+        .values_list("slug", "updated_at")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def fingerprint(rows, url_template):
+    """(empreinte, nombre de lignes)."""
+    digest = hashlib.sha256(url_template.encode())
+    count = 0
+    for count, (slug, updated_at) in enumerate(rows, start=1):
+        digest.update(f"{slug}|{updated_at.isoformat()}\n".encode())
+    return digest.hexdigest(), count
+
+
+def urlset_lines(rows, url_template):
+    yield f'{XML_HEADER}<urlset xmlns="{SITEMAP_NS}">\n'
+    for slug, updated_at in rows:
+        loc = escape(url_template.format(slug=slug))
+        yield f"<url><loc>{loc}</loc><lastmod>{updated_at.isoformat(timespec='seconds')}</lastmod></url>\n"
+    yield "</urlset>\n"
+
+
+def index_lines(shards):
+    yield f'{XML_HEADER}<sitemapindex xmlns="{SITEMAP_NS}">\n'
+    for name, entry in shards.items():
+        yield f"<sitemap><loc>{escape(published_url(name))}</loc><lastmod>{entry['lastmod']}</lastmod></sitemap>\n"
+    yield "</sitemapindex>\n"
+
+
+def _load_manifest():
+    try:
+        with open(published_path(MANIFEST_NAME)) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_sitemaps(shard_size=SHARD_SIZE, force=False):
+    """Régénère les fichiers modifiés et l'index. Retourne le nombre de fichiers écrits."""
+    previous = _load_manifest()
+    now = timezone.now().isoformat(timespec="seconds")
+    shards = {}
+    written = 0
+
+    for section, queryset, url_template in sections():
+        for number, bounds in shard_bounds(queryset, shard_size):
+            name = f"{SITEMAP_DIR}/{section}-{number}.xml.gz"
+            digest, count = fingerprint(shard_rows(queryset, bounds), url_template)
+            if not count:
+                # Plage vidée (suppressions) : le fichier éventuel est retiré plus bas
+                continue
+            entry = previous.get(name)
+            if not force and entry and entry["fingerprint"] == digest and os.path.exists(published_path(name)):
+                shards[name] = entry
+                continue
+            write_file(name, buffered(urlset_lines(shard_rows(queryset, bounds), url_template)), compress=True)
+            shards[name] = {"fingerprint": digest, "lastmod": now}
+            written += 1
+
+    stale = set(previous) - set(shards)
+    for name in stale:
+        remove_file(name)
+
+    if written or stale or force or not os.path.exists(published_path(INDEX_NAME)):
+        write_file(INDEX_NAME, buffered(index_lines(shards)))
+        write_file(MANIFEST_NAME, [json.dumps(shards, indent=1).encode()])
+        logger.info("Sitemaps: %s of %s files rewritten, %s removed", written, len(shards), len(stale))
+    return written
@@ -0,0 +1,229 @@
+"""
+Annonces tendance : score à décroissance exponentielle dans des sorted sets Redis.
+
+On utilise la "forward decay" : au lieu de faire décroître tous les scores,
+chaque nouvel événement vaut poids * 2^((t - epoch) / demi-vie). L'ordre est
+identique à celui d'une décroissance classique, sans jamais réécrire les
+scores existants. La tâche de reconstruction recalcule tout depuis
+AnalyticsEvent avec une nouvelle epoch, ce qui garde les exposants petits.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import slugify
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from listing.models import Listing
+from listing.services.cards import hydrate_listing_cards
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "trending"
+EPOCH_KEY = f"{KEY_PREFIX}:epoch"
+# listing_id -> "category|commune" (normalisés), pour que l'ingestion n'ait pas à lire la base
+META_KEY = f"{KEY_PREFIX}:meta"
+GLOBAL_KEY = f"{KEY_PREFIX}:global"
+
+EVENT_WEIGHTS = {
+    "listing_view": 1.0,
+    "share_click": 3.0,
+    "whatsapp_click": 5.0,
+}
+MAX_SET_SIZE = 2000
+
+# Lit l'epoch puis incrémente les sorted sets passés dans KEYS (global,
+# catégorie, commune) : toutes les clés touchées sont déclarées (Redis Cluster).
+_INCREMENT_SCRIPT = """
+local now = tonumber(redis.call('TIME')[1])
+local epoch = tonumber(redis.call('GET', KEYS[1]))
+if not epoch then
+    epoch = now
+    redis.call('SET', KEYS[1], epoch)
+end
+local increment = tonumber(ARGV[2]) * 2 ^ ((now - epoch) / tonumber(ARGV[3]))
+local max_size = tonumber(ARGV[4])
+for index = 2, #KEYS do
+    redis.call('ZINCRBY', KEYS[index], increment, ARGV[1])
+    if redis.call('ZCARD', KEYS[index]) > max_size then
+        redis.call('ZREMRANGEBYRANK', KEYS[index], 0, -(max_size + 1))
+    end
+end
+return #KEYS - 1
+"""
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _half_life_seconds():
+    return getattr(settings, "TRENDING_HALF_LIFE_HOURS", 24) * 3600
+
+
+def category_key(category):
+    return f"{KEY_PREFIX}:category:{slugify(category or '')}"
+
+
+def commune_key(commune):
+    return f"{KEY_PREFIX}:commune:{slugify(commune or '')}"
+
+
+def listing_meta(category, commune):
+    return f"{slugify(category or '')}|{slugify(commune or '')}"
+
+
+def meta_keys(meta):
+    """Sorted sets catégorie / commune correspondant à une valeur de META_KEY."""
+    if not meta:
+        return []
+    if isinstance(meta, bytes):
+        meta = meta.decode()
+    category, commune = meta.split("|")
+    keys = []
+    if category:
+        keys.append(f"{KEY_PREFIX}:category:{category}")
+    if commune:
+        keys.append(f"{KEY_PREFIX}:commune:{commune}")
+    return keys
+
+
+def record_engagements(events):
+    """
+    events : itérable de (listing_id, event_type). Deux allers-retours Redis :
+    lecture des méta (HMGET) puis un pipeline d'incréments.
+    """
+    events = [
+        (listing_id, event_type)
+        for listing_id, event_type in events
+        if listing_id and event_type in EVENT_WEIGHTS
+    ]
+    if not events:
+        return
+
+    try:
+        conn = _redis()
+        listing_ids = sorted({listing_id for listing_id, _ in events})
+        metas = dict(zip(listing_ids, conn.hmget(META_KEY, listing_ids)))
+        script = conn.register_script(_INCREMENT_SCRIPT)
+        pipe = conn.pipeline(transaction=False)
+        for listing_id, event_type in events:
+            script(
+                keys=[EPOCH_KEY, GLOBAL_KEY, *meta_keys(metas[listing_id])],
+                args=[listing_id, EVENT_WEIGHTS[event_type], _half_life_seconds(), MAX_SET_SIZE],
+                client=pipe,
+            )
+        pipe.execute()
+    except RedisError as exc:
+        logger.warning("Trending update failed for %s events: %s", len(events), exc)
+
+
+def sync_listing(listing, deleted=False):
+    """
+    Met à jour les méta (ou retire l'annonce) après un save / delete, et la
+    retire des sets catégorie / commune qu'elle ne doit plus occuper.
+    """
+    current = listing_meta(listing.category, listing.commune)
+    try:
+        conn = _redis()
+        previous = conn.hget(META_KEY, listing.pk)
+        pipe = conn.pipeline(transaction=True)
+        if listing.is_active and not deleted:
+            pipe.hset(META_KEY, listing.pk, current)
+            stale_keys = set(meta_keys(previous)) - set(meta_keys(current))
+        else:
+            pipe.hdel(META_KEY, listing.pk)
+            pipe.zrem(GLOBAL_KEY, listing.pk)
+            # Méta absentes (Redis vidé) : les champs de l'annonce servent de repli
+            stale_keys = set(meta_keys(previous)) | set(meta_keys(current))
+        for key in stale_keys:
+            pipe.zrem(key, listing.pk)
+        pipe.execute()
+    except RedisError as exc:
+        logger.warning("Trending sync failed for listing %s: %s", listing.pk, exc)
+
+
+def top_listing_ids(category=None, commune=None, limit=20):
+    if category:
+        key = category_key(category)
+    elif commune:
+        key = commune_key(commune)
+    else:
+        key = GLOBAL_KEY
+    return [int(member) for member in _redis().zrevrange(key, 0, limit - 1)]
+
+
+def get_trending_listings(category=None, commune=None, limit=20):
+    """Top N depuis le sorted set, hydraté par le cache des cartes d'annonce."""
+    try:
+        # Marge pour les annonces désactivées entre deux reconstructions
+        listing_ids = top_listing_ids(category, commune, limit * 2)
+    except RedisError as exc:
+        logger.warning("Trending read failed: %s", exc)
+        return []
+    return hydrate_listing_cards(listing_ids, limit=limit)
+
+
+def rebuild_trending_scores():
+    """
+    Recalcule tous les scores depuis AnalyticsEvent avec une nouvelle epoch,
+    puis remplace les sorted sets de façon atomique.
+    """
+    from analytics.models import AnalyticsEvent
+
+    now = timezone.now()
+    epoch = int(now.timestamp())
+    half_life = _half_life_seconds()
+    since = now - timedelta(days=getattr(settings, "TRENDING_WINDOW_DAYS", 7))
+
+    meta = {
+        listing_id: listing_meta(category, commune)
+        for listing_id, category, commune in Listing.objects.filter(is_active=True)
+        .order_by()
+        .values_list("id", "category", "commune")
+        .iterator(chunk_size=2000)
+    }
+
+    scores = defaultdict(lambda: defaultdict(float))
+    events = (
+        AnalyticsEvent.objects.filter(
+            listing__isnull=False,
+            event_type__in=EVENT_WEIGHTS,
+            created_at__gte=since,
+        )
+        .order_by()
+        .values_list("listing_id", "event_type", "created_at")
+        .iterator(chunk_size=5000)
+    )
+    for listing_id, event_type, created_at in events:
+        if listing_id not in meta:
+            continue
+        score = EVENT_WEIGHTS[event_type] * 2 ** ((created_at.timestamp() - epoch) / half_life)
+        category, commune = meta[listing_id].split("|")
+        scores[GLOBAL_KEY][listing_id] += score
+        if category:
+            scores[f"{KEY_PREFIX}:category:{category}"][listing_id] += score
+        if commune:
+            scores[f"{KEY_PREFIX}:commune:{commune}"][listing_id] += score
+
+    conn = _redis()
+    stale_keys = set(conn.scan_iter(match=f"{KEY_PREFIX}:category:*")) | set(
+        conn.scan_iter(match=f"{KEY_PREFIX}:commune:*")
+    )
+    stale_keys = {key.decode() if isinstance(key, bytes) else key for key in stale_keys} - set(scores)
+
+    pipe = conn.pipeline(transaction=True)
+    pipe.delete(GLOBAL_KEY, META_KEY, *stale_keys)
+    for key, members in scores.items():
+        top = dict(sorted(members.items(), key=lambda item: item[1], reverse=True)[:MAX_SET_SIZE])
+        pipe.delete(key)
+        pipe.zadd(key, top)
+    if meta:
+        pipe.hset(META_KEY, mapping=meta)
+    pipe.set(EPOCH_KEY, epoch)
+    pipe.execute()
+
+    return len(scores[GLOBAL_KEY]) if GLOBAL_KEY in scores else 0
@@ -1,11 +1,109 @@
 # signals.py
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
 
-from .models import Listing
+from core.utils.slug_resolver import listing_slugs
+from .models import ExchangeRate, Listing, ListingImage
+from .services.catalog_sync import record_deletion
+from .services.change_feed import record_change, record_image_change
+from .services.feed_snapshots import schedule_rebuild as schedule_feed_snapshots
+from .services.cards import invalidate_card
+from .services.locations import snapshot, update_counts
+from .services.pricing import invalidate_rates
+from .services.similarity import mark_dirty
+from .services.trending import sync_listing
 
 @receiver([post_save, post_delete], sender=Listing)
 def clear_listing_cache(sender, instance, **kwargs):
     # On vide tout le cache des recherches pour forcer l'actualisation
-    cache.delete_pattern("listings_*")
\ No newline at end of file
+    cache.delete_pattern("listings_*")
+
+
+@receiver([post_save, post_delete], sender=Listing)
+def invalidate_listing_lookups(sender, instance, **kwargs):
+    listing_slugs.invalidate_instance(instance)
+    invalidate_card(instance.pk)
+
+
+@receiver(post_save, sender=Listing)
+def sync_trending_on_save(sender, instance, **kwargs):
+    sync_listing(instance)
+
+
+@receiver(post_delete, sender=Listing)
+def sync_trending_on_delete(sender, instance, **kwargs):
+    sync_listing(instance, deleted=True)
+
+
+@receiver([post_save, post_delete], sender=Listing)
+def mark_similarity_dirty(sender, instance, **kwargs):
+    # Recalculé par listing.tasks.update_similar_listings_task
+    mark_dirty(instance.pk)
+
+
+@receiver(post_init, sender=Listing)
+def snapshot_location(sender, instance, **kwargs):
+    snapshot(instance)
+
+
+@receiver(post_save, sender=Listing)
+def update_location_counts_on_save(sender, instance, created, **kwargs):
+    update_counts(instance, created=created)
+
+
+@receiver(post_delete, sender=Listing)
+def update_location_counts_on_delete(sender, instance, **kwargs):
+    update_counts(instance, deleted=True)
+
+
+@receiver([post_save, post_delete], sender=ExchangeRate)
+def recompute_prices_on_rate_change(sender, instance, **kwargs):
+    from .tasks import recompute_prices_usd_task
+
+    invalidate_rates()
+    currency = instance.currency
+    transaction.on_commit(lambda: recompute_prices_usd_task.delay(currency))
+
+
+@receiver(post_save, sender=Listing)
+def notify_saved_searches_on_publish(sender, instance, created, **kwargs):
+    if not created or not instance.is_active:
+        return
+    from .tasks import notify_subscribers_task
+
+    listing_id = instance.pk
+    transaction.on_commit(lambda: notify_subscribers_task.delay(listing_id))
+
+@receiver(post_delete, sender=Listing)
+def record_listing_tombstone(sender, instance, **kwargs):
+    # Annonce supprimée : transmise aux clients par la synchronisation du catalogue
+    record_deletion(instance)
+
+
+@receiver([post_save, post_delete], sender=ListingImage)
+def touch_listing_on_image_change(sender, instance, **kwargs):
+    # Une image ajoutée / retirée ne modifie aucun champ de l'annonce : updated_at
+    # est avancé pour que la synchronisation du catalogue la renvoie, et les
+    # caches qui exposent les images (pages de liste, carte) sont vidés
+    Listing.objects.filter(pk=instance.listing_id).update(updated_at=timezone.now())
+    cache.delete_pattern("listings_*")
+    invalidate_card(instance.listing_id)
+    if record_image_change(instance.listing_id):
+        schedule_feed_snapshots()
+
+
+@receiver(post_save, sender=Listing)
+def record_public_change_on_save(sender, instance, created, **kwargs):
+    # Journal du flux public (listing.services.change_feed) ; un changement
+    # visible programme aussi la reconstruction des instantanés du fil
+    if record_change(instance, created=created):
+        schedule_feed_snapshots()
+
+
+@receiver(post_delete, sender=Listing)
+def record_public_change_on_delete(sender, instance, **kwargs):
+    if record_change(instance, deleted=True):
+        schedule_feed_snapshots()
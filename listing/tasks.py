@@ -1,10 +1,105 @@
 from celery import shared_task
 from .models import Listing
+from .services.autocomplete import rebuild_autocomplete_index
+from .services.catalog_sync import purge_tombstones
+from .services.change_feed import purge_changes
+from .services.feed_snapshots import build_feed_snapshots
+from .services.locations import recount_locations
+from .services.pricing import recompute_prices_usd
+from .services.ranking import refresh_static_scores
+from .services.saved_searches import queue_alerts, send_pending_alerts
+from .services.similarity import rebuild_similarity_index, update_dirty_listings
+from .services.sitemaps import build_sitemaps
+from .services.trending import rebuild_trending_scores
 import time
 
 @shared_task
 def notify_subscribers_task(listing_id):
-    listing = Listing.objects.get(id=listing_id)
-    # Simulation d'un travail lourd (envoi de 1000 emails ou SMS)
-    # ... logique d'envoi ...
-    return f"Notifications envoyées pour {listing.title}"
+    # Déclenchée à la publication (listing.signals) : met l'annonce en attente
+    # pour les recherches sauvegardées qu'elle satisfait
+    listing = Listing.objects.filter(id=listing_id).first()
+    if listing is None:
+        return "Annonce introuvable"
+    count = queue_alerts(listing)
+    return f"Annonce {listing.title} en attente pour {count} destinataires"
+
+
+@shared_task
+def send_saved_search_alerts_task():
+    # Un message par destinataire pour toutes ses annonces en attente
+    count = send_pending_alerts()
+    return f"{count} alertes de recherches sauvegardées envoyées"
+
+
+@shared_task
+def rebuild_trending_task():
+    # Recalcule les scores tendance depuis AnalyticsEvent (nouvelle epoch)
+    count = rebuild_trending_scores()
+    return f"Scores tendance recalculés pour {count} annonces"
+
+
+@shared_task
+def refresh_rank_scores_task():
+    # Fraîcheur, promotion, vérification et conversion -> Listing.rank_score
+    count = refresh_static_scores()
+    return f"Scores de pertinence recalculés pour {count} annonces"
+
+
+@shared_task
+def update_similar_listings_task():
+    # Mise à jour incrémentale de l'index des annonces similaires
+    count = update_dirty_listings()
+    return f"Annonces similaires recalculées pour {count} annonces"
+
+
+@shared_task
+def rebuild_similar_listings_task():
+    count = rebuild_similarity_index()
+    return f"Index des annonces similaires reconstruit ({count} annonces)"
+
+
+@shared_task
+def rebuild_autocomplete_task():
+    # Index des suggestions de recherche (préfixes -> complétions populaires)
+    count = rebuild_autocomplete_index()
+    return f"Index d'autocomplétion reconstruit ({count} préfixes)"
+
+
+@shared_task
+def recount_locations_task():
+    # Rattrape les compteurs d'annonces actives modifiées en masse (update, bulk_update)
+    count = recount_locations()
+    return f"Compteurs corrigés pour {count} localisations"
+
+
+@shared_task
+def recompute_prices_usd_task(currency=None):
+    # Déclenchée par un changement de taux (listing.signals)
+    count = recompute_prices_usd(currency)
+    return f"Prix USD recalculés pour {count} annonces"
+
+
+@shared_task
+def purge_listing_tombstones_task():
+    count = purge_tombstones()
+    return f"{count} suppressions d'annonces purgées"
+
+
+@shared_task
+def purge_listing_changes_task():
+    count = purge_changes()
+    return f"{count} changements d'annonces purgés"
+
+
+@shared_task
+def build_sitemaps_task():
+    # Seuls les fichiers dont le contenu a changé sont réécrits
+    count = build_sitemaps()
+    return f"{count} fichiers sitemap réécrits"
+
+
+@shared_task
+def rebuild_feed_snapshots_task():
+    # Programmée (avec anti-rebond) par listing.signals, et périodiquement
+    count = build_feed_snapshots()
+    return f"{count} pages du fil pré-rendues"
@@ -1,4 +1,1009 @@
-from django.test import TestCase
+import gzip
+import importlib
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework.test import APITestCase
+
+from analytics.services import create_analytics_event
+from listing.models import (
+    ExchangeRate,
+    Listing,
+    ListingChange,
+    ListingImage,
+    ListingTombstone,
+    Location,
+    SavedSearch,
+    SimilarListings,
+    UserProfile,
+    VerificationRequest,
+)
+from listing.services.autocomplete import rebuild_autocomplete_index
+from listing.services.cards import card_cache_key
+from listing.services.catalog_sync import encode_token, purge_tombstones
+from listing.services.change_feed import purge_changes
+from listing.services.feed_snapshots import build_feed_snapshots
+from listing.serializers import ListingCreateUpdateSerializer
+from listing.services.locations import recount_locations
+from listing.services.pricing import recompute_prices_usd
+from listing.services.ranking import refresh_static_scores
+from listing.services.saved_searches import match_listing, queue_alerts, send_pending_alerts
+from listing.services.similarity import (
+    DIRTY_KEY,
+    load_index,
+    price_proximity,
+    rebuild_similarity_index,
+    update_dirty_listings,
+)
+from listing.services.sitemaps import build_sitemaps
+from listing.services.trending import rebuild_trending_scores, sync_listing, top_listing_ids
+
+User = get_user_model()
 
 
 # Listing-specific tests live here. Analytics tests live in analytics/tests.py.
+class TrendingListingsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            phone_whatsapp="243899530506",
+            password="testpassword123",
+        )
+        self.business = self.user.business
+        self.phone = Listing.objects.create(
+            business=self.business,
+            title="iPhone 13 Pro",
+            description="Super telephone",
+            price=1200.00,
+            category="Phones",
+            commune="Gombe",
+        )
+        self.house = Listing.objects.create(
+            business=self.business,
+            title="Maison 3 chambres",
+            description="Belle maison",
+            price=90000.00,
+            category="Immobilier",
+            commune="Ngaliema",
+        )
+
+    def _engage(self, listing, event_type, times=1):
+        for _ in range(times):
+            create_analytics_event(event_type=event_type, source="listing_card", listing=listing)
+
+    def test_trending_orders_by_weighted_engagement(self):
+        self._engage(self.phone, "listing_view", times=3)
+        self._engage(self.house, "whatsapp_click")
+
+        response = self.client.get("/api/v2/public/listings/trending/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["slug"] for item in response.data["results"]], [self.house.slug, self.phone.slug])
+
+        response = self.client.get("/api/v2/public/listings/trending/", {"category": "Phones"})
+        self.assertEqual([item["slug"] for item in response.data["results"]], [self.phone.slug])
+
+        response = self.client.get("/api/v2/public/listings/trending/", {"commune": "ngaliema"})
+        self.assertEqual([item["slug"] for item in response.data["results"]], [self.house.slug])
+
+    def test_rebuild_restores_scores_from_events(self):
+        self._engage(self.phone, "share_click", times=2)
+        self._engage(self.house, "listing_view")
+        cache.clear()
+
+        self.assertEqual(rebuild_trending_scores(), 2)
+        self.assertEqual(top_listing_ids(), [self.phone.id, self.house.id])
+        self.assertEqual(top_listing_ids(commune="Gombe"), [self.phone.id])
+
+    def test_deleted_listing_leaves_trending(self):
+        self._engage(self.phone, "listing_view")
+        self._engage(self.house, "listing_view")
+
+        self.house.delete()
+
+        response = self.client.get("/api/v2/public/listings/trending/")
+        self.assertEqual([item["slug"] for item in response.data["results"]], [self.phone.slug])
+        self.assertEqual(top_listing_ids(commune="Ngaliema"), [])
+        self.assertEqual(top_listing_ids(category="Immobilier"), [])
+
+    def test_moved_listing_leaves_previous_sets(self):
+        self._engage(self.phone, "listing_view")
+
+        self.phone.category = "Electronique"
+        self.phone.commune = "Limete"
+        self.phone.save()
+
+        self.assertEqual(top_listing_ids(category="Phones"), [])
+        self.assertEqual(top_listing_ids(commune="Gombe"), [])
+        self._engage(self.phone, "listing_view")
+        self.assertEqual(top_listing_ids(category="Electronique"), [self.phone.id])
+        self.assertEqual(top_listing_ids(commune="Limete"), [self.phone.id])
+
+    def test_deactivated_listing_leaves_category_sets(self):
+        self._engage(self.phone, "listing_view")
+
+        self.phone.is_active = False
+        sync_listing(self.phone)
+
+        self.assertEqual(top_listing_ids(), [])
+        self.assertEqual(top_listing_ids(category="Phones"), [])
+        self.assertEqual(top_listing_ids(commune="Gombe"), [])
+
+
+class ListingRankingTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            phone_whatsapp="243899530506",
+            password="testpassword123",
+        )
+        self.business = self.user.business
+        self.plain = Listing.objects.create(
+            business=self.business,
+            title="Samsung Galaxy",
+            description="Telephone comme un iPhone",
+            price=300.00,
+            category="Phones",
+        )
+        self.promoted = Listing.objects.create(
+            business=self.business,
+            title="iPhone 12",
+            description="Bon etat",
+            price=600.00,
+            category="Phones",
+            is_promoted=True,
+        )
+        self.other = Listing.objects.create(
+            business=self.business,
+            title="iPhone 11",
+            description="Occasion",
+            price=400.00,
+            category="Phones",
+        )
+
+    def test_search_ranks_title_match_and_promotion_first(self):
+        response = self.client.get("/api/v2/public/listings/", {"q": "iphone"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item["slug"] for item in response.data["results"]],
+            [self.promoted.slug, self.other.slug, self.plain.slug],
+        )
+
+    def test_refresh_uses_whatsapp_conversion(self):
+        for _ in range(20):
+            create_analytics_event(event_type="whatsapp_click", source="listing_card", listing=self.plain)
+
+        self.assertEqual(refresh_static_scores(), 3)
+
+        response = self.client.get("/api/v2/public/listings/", {"category": "phones"})
+        self.assertEqual(response.data["results"][0]["slug"], self.plain.slug)
+
+    def test_initial_score_matches_refresh(self):
+        User.objects.filter(pk=self.user.pk).update(is_phone_verified=True)
+        listing = Listing.objects.create(
+            business=self.business,
+            title="Pixel 7",
+            description="Neuf",
+            price=500.00,
+            category="Phones",
+        )
+        initial = listing.rank_score
+
+        refresh_static_scores()
+
+        listing.refresh_from_db()
+        self.assertAlmostEqual(initial, listing.rank_score, places=4)
+
+    def test_search_vector_refreshed_only_when_text_changes(self):
+        listing = Listing.objects.get(pk=self.plain.pk)
+        with patch("listing.services.ranking.update_search_vectors") as update:
+            listing.price = 250
+            listing.save()
+            update.assert_not_called()
+
+            listing.title = "Samsung Galaxy S21"
+            listing.save()
+            update.assert_called_once()
+
+    def test_evaluate_ranking_command(self):
+        out = StringIO()
+        Listing.objects.update(created_at=timezone.now() - timedelta(days=10))
+        create_analytics_event(event_type="whatsapp_click", source="listing_card", listing=self.other)
+
+        call_command("evaluate_ranking", "--k", "3", stdout=out)
+
+        self.assertIn("NDCG@3 moyen", out.getvalue())
+
+
+class SimilarListingsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            phone_whatsapp="243899530506",
+            password="testpassword123",
+        )
+        self.business = self.user.business
+        self.iphone = Listing.objects.create(
+            business=self.business,
+            title="iPhone 13 Pro 256Go",
+            description="Téléphone Apple débloqué",
+            price=900.00,
+            category="Phones",
+            commune="Gombe",
+        )
+        self.iphone_mini = Listing.objects.create(
+            business=self.business,
+            title="iPhone 13 mini",
+            description="Apple, très bon état",
+            price=700.00,
+            category="Phones",
+            commune="Gombe",
+        )
+        self.samsung = Listing.objects.create(
+            business=self.business,
+            title="Samsung Galaxy S21",
+            description="Téléphone Android",
+            price=500.00,
+            category="Phones",
+            commune="Limete",
+        )
+        self.house = Listing.objects.create(
+            business=self.business,
+            title="Maison 3 chambres",
+            description="Belle maison avec jardin",
+            price=90000.00,
+            category="Immobilier",
+            commune="Gombe",
+        )
+
+    def test_similar_listings_ranked_by_text_price_and_location(self):
+        self.assertEqual(rebuild_similarity_index(), 4)
+
+        response = self.client.get(f"/api/v2/public/listings/{self.iphone.slug}/similar/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item["slug"] for item in response.data["results"]],
+            [self.iphone_mini.slug, self.samsung.slug],
+        )
+
+    def test_incremental_update_picks_up_new_listing(self):
+        rebuild_similarity_index()
+        update_dirty_listings()
+
+        ipad = Listing.objects.create(
+            business=self.business,
+            title="iPhone 13 Pro Max",
+            description="Apple débloqué",
+            price=950.00,
+            category="Phones",
+            commune="Gombe",
+        )
+        update_dirty_listings()
+
+        self.assertEqual(SimilarListings.objects.get(listing=self.iphone).neighbour_ids[0], ipad.id)
+
+    def test_incremental_update_reads_only_dirty_listings(self):
+        rebuild_similarity_index()
+        update_dirty_listings()
+
+        self.iphone_mini.delete()
+        with patch("listing.services.similarity.load_index", side_effect=AssertionError("full scan")):
+            update_dirty_listings()
+
+        self.assertEqual(SimilarListings.objects.get(listing=self.iphone).neighbour_ids, [self.samsung.id])
+        self.assertFalse(SimilarListings.objects.filter(listing_id=self.iphone_mini.pk).exists())
+
+    def test_failed_update_keeps_dirty_listings(self):
+        rebuild_similarity_index()
+        update_dirty_listings()
+        mini_id = self.iphone_mini.pk
+        self.iphone_mini.delete()
+
+        with patch("listing.services.similarity._save_neighbours", side_effect=DatabaseError("down")):
+            with self.assertRaises(DatabaseError):
+                update_dirty_listings()
+        self.assertEqual(get_redis_connection("default").smembers(DIRTY_KEY), {str(mini_id).encode()})
+
+        update_dirty_listings()
+        self.assertEqual(get_redis_connection("default").scard(DIRTY_KEY), 0)
+        self.assertFalse(SimilarListings.objects.filter(listing_id=mini_id).exists())
+
+    def test_price_proximity_compares_usd_prices(self):
+        ExchangeRate.objects.create(currency="CDF", units_per_usd=2500)
+        samsung_cdf = Listing.objects.create(
+            business=self.business,
+            title="Samsung Galaxy S21",
+            description="Téléphone Android",
+            price=1250000,
+            currency="CDF",
+            category="Phones",
+            commune="Limete",
+        )
+        index = load_index()
+
+        self.assertEqual(price_proximity(index.document(self.samsung.id), index.document(samsung_cdf.id)), 1.0)
+
+    def test_similar_listings_unknown_slug(self):
+        response = self.client.get("/api/v2/public/listings/inconnue/similar/")
+
+        self.assertEqual(response.status_code, 404)
+
+
+class AutocompleteTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            phone_whatsapp="243899530506",
+            password="testpassword123",
+        )
+        self.business = self.user.business
+        self.phones = [
+            Listing.objects.create(
+                business=self.business,
+                title=title,
+                description="Bon état",
+                price=300.00,
+                category="Téléphones",
+                commune="Gombe",
+            )
+            for title in ("Téléphone Samsung A52", "Téléphone Tecno Spark", "Tablette Samsung")
+        ]
+        self.tv = Listing.objects.create(
+            business=self.business,
+            title="Télévision LG 55 pouces",
+            description="Neuve",
+            price=600.00,
+            category="Électronique",
+            commune="Limete",
+        )
+        rebuild_autocomplete_index()
+
+    def test_prefix_is_accent_folded_and_ranked_by_popularity(self):
+        response = self.client.get("/api/v2/public/listings/autocomplete/", {"q": "tele"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"text": "Téléphones", "type": "category"},
+                {"text": "téléphone", "type": "term"},
+                {"text": "télévision", "type": "term"},
+            ],
+        )
+
+    def test_completes_last_word_of_multi_word_query(self):
+        response = self.client.get("/api/v2/public/listings/autocomplete/", {"q": "telephone sam"})
+
+        self.assertEqual(response.data["results"], [{"text": "telephone samsung", "type": "term"}])
+
+    def test_popular_listing_terms_rank_first(self):
+        for _ in range(10):
+            create_analytics_event(event_type="listing_view", source="listing_card", listing=self.tv)
+        rebuild_autocomplete_index()
+
+        results = self.client.get("/api/v2/public/listings/autocomplete/", {"q": "te", "limit": 1}).data["results"]
+
+        self.assertEqual(results, [{"text": "télévision", "type": "term"}])
+
+
+class LocationHierarchyTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            phone_whatsapp="243899530506",
+            password="testpassword123",
+        )
+        self.business = self.user.business
+
+    def _listing(self, title, **location):
+        return Listing.objects.create(
+            business=self.business,
+            title=title,
+            description="Annonce",
+            price=100.00,
+            category="Phones",
+            **location,
+        )
+
+    def test_spellings_are_canonicalized_to_one_node(self):
+        first = self._listing("iPhone 12", commune="Gombé", quartier="Golf")
+        second = self._listing("iPhone 11", commune=" gombe ", quartier="golf")
+        third = self._listing("iPhone X", commune="Gombee")
+
+        self.assertEqual(first.commune_ref_id, second.commune_ref_id)
+        self.assertEqual(first.commune_ref_id, third.commune_ref_id)
+        self.assertEqual(first.quartier_ref_id, second.quartier_ref_id)
+        self.assertEqual(second.commune, "Gombé")
+        # Correspondance approchée : la saisie n'est pas réécrite
+        self.assertEqual(third.commune, "Gombee")
+        self.assertEqual(Location.objects.get(id=first.commune_ref_id).active_listings_count, 3)
+        self.assertEqual(Location.objects.get(id=first.quartier_ref_id).active_listings_count, 2)
+
+    def test_numbered_quartiers_are_not_merged(self):
+        first = self._listing("Maison", commune="Ndjili", quartier="Quartier 1")
+        second = self._listing("Parcelle", commune="Ndjili", quartier="Quartier 2")
+        third = self._listing("Studio", commune="Ndjili", quartier="quartier 1")
+
+        self.assertNotEqual(first.quartier_ref_id, second.quartier_ref_id)
+        self.assertEqual(first.quartier_ref_id, third.quartier_ref_id)
+        self.assertEqual(second.quartier, "Quartier 2")
+        self.assertEqual(Location.objects.get(id=second.quartier_ref_id).active_listings_count, 1)
+
+    def test_counts_follow_moves_and_deletes(self):
+        listing = self._listing("Maison", commune="Limete")
+        other = self._listing("Parcelle", commune="Limete")
+        limete = Location.objects.get(id=listing.commune_ref_id)
+
+        listing.commune = "Ngaliema"
+        listing.save()
+        other.delete()
+
+        limete.refresh_from_db()
+        self.assertEqual(limete.active_listings_count, 0)
+        self.assertEqual(Location.objects.get(id=listing.commune_ref_id).active_listings_count, 1)
+        self.assertEqual(Location.objects.get(id=listing.ville_ref_id).active_listings_count, 1)
+
+    def test_tree_endpoint_and_location_filter(self):
+        self._listing("iPhone 12", commune="Gombe")
+        self._listing("Maison", commune="Limete")
+
+        tree = self.client.get("/api/v2/public/locations/").data["results"]
+        self.assertEqual(len(tree), 1)
+        self.assertEqual(tree[0]["name"], "Kinshasa")
+        self.assertEqual(tree[0]["count"], 2)
+        self.assertEqual([(node["name"], node["count"]) for node in tree[0]["children"]], [("Gombe", 1), ("Limete", 1)])
+
+        response = self.client.get("/api/v2/public/listings/", {"commune": "gombé"})
+        self.assertEqual([item["title"] for item in response.data["results"]], ["iPhone 12"])
+
+    def test_recount_fixes_bulk_updates(self):
+        listing = self._listing("iPhone 12", commune="Gombe")
+        Listing.objects.filter(id=listing.id).update(is_active=False)
+
+        self.assertEqual(recount_locations(), 2)
+        self.assertEqual(Location.objects.get(id=listing.commune_ref_id).active_listings_count, 0)
+
+
+class SpecFiltersTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            phone_whatsapp="243899530506",
+            password="testpassword123",
+        )
+        self.business = self.user.business
+        for title, chambres, etat in (("Studio", 1, "neuf"), ("Villa", 4, "occasion"), ("Duplex", 3, "neuf")):
+            Listing.objects.create(
+                business=self.business,
+                title=title,
+                description="Maison à louer",
+                price=500.00,
+                category="Immobilier",
+                specs={"chambres": chambres, "etat": etat},
+            )
+
+    def test_numeric_and_exact_spec_filters(self):
+        response = self.client.get(
+            "/api/v2/public/listings/",
+            {"category": "Immobilier", "specs.chambres__gte": "3", "specs.etat": "Neuf", "ordering": "recent"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["title"] for item in response.data["results"]], ["Duplex"])
+
+    def test_invalid_spec_filters_are_rejected(self):
+        unknown = self.client.get("/api/v2/public/listings/", {"category": "Immobilier", "specs.couleur": "rouge"})
+        bad_value = self.client.get("/api/v2/public/listings/", {"specs.chambres__gte": "beaucoup"})
+        bad_lookup = self.client.get("/api/v2/public/listings/", {"specs.etat__gte": "neuf"})
+
+        self.assertEqual(unknown.status_code, 400)
+        self.assertIn("error", unknown.data)
+        self.assertEqual(bad_value.status_code, 400)
+        self.assertEqual(bad_lookup.status_code, 400)
+
+    def test_specs_are_coerced_on_write(self):
+        payload = {
+            "title": "Appartement",
+            "description": "Centre-ville",
+            "price": "300.00",
+            "category": "Appartement",
+            "specs": {"chambres": "2", "meuble": "oui", "vue": "fleuve"},
+        }
+        serializer = ListingCreateUpdateSerializer(data=payload)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data["specs"], {"chambres": 2, "meuble": True, "vue": "fleuve"})
+
+        payload["specs"] = {"chambres": "beaucoup"}
+        serializer = ListingCreateUpdateSerializer(data=payload)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("chambres", serializer.errors["specs"])
+
+    def test_backfill_casts_legacy_string_specs(self):
+        Listing.objects.filter(title="Studio").update(specs={"chambres": "1", "etat": "Neuf", "vue": "fleuve"})
+        Listing.objects.filter(title="Duplex").update(specs={"chambres": "beaucoup"})
+
+        migration = importlib.import_module("listing.migrations.0014_listing_specs_backfill")
+        self.assertEqual(migration.backfill_specs(Listing), 1)
+        self.assertEqual(Listing.objects.get(title="Studio").specs, {"chambres": 1, "etat": "neuf", "vue": "fleuve"})
+        # Valeur inconvertible : gardée telle quelle
+        self.assertEqual(Listing.objects.get(title="Duplex").specs, {"chambres": "beaucoup"})
+
+
+class PriceUsdTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            phone_whatsapp="243899530506",
+            password="testpassword123",
+        )
+        self.business = self.user.business
+        ExchangeRate.objects.create(currency="cdf", units_per_usd=2800)
+        self.usd = self._listing("Frigo", 100, "USD")
+        self.cdf_high = self._listing("Télévision", 560000, "CDF")
+        self.cdf_low = self._listing("Fer à repasser", 56000, "CDF")
+
+    def _listing(self, title, price, currency):
+        return Listing.objects.create(
+            business=self.business,
+            title=title,
+            description="Électroménager",
+            price=price,
+            currency=currency,
+            category="Electromenager",
+        )
+
+    def test_price_usd_computed_on_save(self):
+        self.assertEqual(self.usd.price_usd, Decimal("100.00"))
+        self.assertEqual(self.cdf_high.price_usd, Decimal("200.00"))
+        self.assertEqual(self.cdf_low.price_usd, Decimal("20.00"))
+
+    def test_price_sort_and_range_across_currencies(self):
+        by_price = self.client.get("/api/v2/public/listings/", {"ordering": "price"}).data["results"]
+        in_range = self.client.get("/api/v2/public/listings/", {"min_price": "50", "max_price": "150"}).data["results"]
+        invalid = self.client.get("/api/v2/public/listings/", {"min_price": "abc"})
+
+        self.assertEqual([item["title"] for item in by_price], ["Fer à repasser", "Frigo", "Télévision"])
+        self.assertEqual([item["title"] for item in in_range], ["Frigo"])
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_rate_change_recomputes_in_bulk(self):
+        rate = ExchangeRate.objects.get(currency="CDF")
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            rate.units_per_usd = 2000
+            rate.save()
+        self.assertEqual(len(callbacks), 1)
+
+        updated_at = Listing.objects.get(pk=self.cdf_high.pk).updated_at
+        last_change = ListingChange.objects.latest("id").id
+
+        self.assertEqual(recompute_prices_usd("CDF", batch_size=1), 2)
+
+        self.cdf_high.refresh_from_db()
+        self.usd.refresh_from_db()
+        self.assertEqual(self.cdf_high.price_usd, Decimal("280.00"))
+        self.assertEqual(self.usd.price_usd, Decimal("100.00"))
+        # Visible de la synchronisation vendeur et du flux public
+        self.assertGreater(self.cdf_high.updated_at, updated_at)
+        self.assertEqual(
+            sorted(ListingChange.objects.filter(id__gt=last_change).values_list("listing_id", flat=True)),
+            sorted([self.cdf_high.id, self.cdf_low.id]),
+        )
+        # Taux inchangé : rien à réécrire
+        self.assertEqual(recompute_prices_usd("CDF"), 0)
+
+    def test_lowercase_currency_recomputed(self):
+        fan = self._listing("Ventilateur", 28000, "cdf")
+        self.assertEqual(fan.currency, "CDF")
+
+        ExchangeRate.objects.filter(currency="CDF").update(units_per_usd=1400)
+        self.assertEqual(recompute_prices_usd("cdf"), 3)
+
+        fan.refresh_from_db()
+        self.assertEqual(fan.price_usd, Decimal("20.00"))
+
+
+class DirtyFieldsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(phone_whatsapp="243899530506", password="testpassword123")
+        self.listing = Listing.objects.create(
+            business=self.user.business,
+            title="Frigo Samsung",
+            description="Très bon état",
+            price=100,
+            category="Electromenager",
+            specs={"etat": "occasion"},
+        )
+
+    def test_listing_noop_save_skips_write_and_signals(self):
+        listing = Listing.objects.get(pk=self.listing.pk)
+        with CaptureQueriesContext(connection) as queries:
+            listing.save()
+        self.assertEqual(len(queries), 0)
+
+        listing.specs["etat"] = "neuf"
+        listing.save()
+        self.assertEqual(Listing.objects.get(pk=self.listing.pk).specs, {"etat": "neuf"})
+
+    def test_verification_updates_profile_once(self):
+        UserProfile.objects.create(user=self.user, phone_number=self.user.phone_whatsapp)
+        request = VerificationRequest.objects.create(user=self.user, document_front="kyc/front/id.jpg")
+
+        request.status = "APPROVED"
+        request.save()
+        self.assertTrue(UserProfile.objects.get(user=self.user).is_verified)
+
+        with CaptureQueriesContext(connection) as queries:
+            VerificationRequest.objects.get(pk=request.pk).save()
+        self.assertEqual(len(queries), 1)  # le SELECT du get()
+
+
+class SavedSearchTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.vendor = User.objects.create_user(phone_whatsapp="243899530506", password="testpassword123")
+        self.buyer = User.objects.create_user(phone_whatsapp="243811111111", password="testpassword123", is_active=True)
+        self.other = User.objects.create_user(phone_whatsapp="243822222222", password="testpassword123", is_active=True)
+
+    def _listing(self, title, price=100, commune="Gombe"):
+        return Listing.objects.create(
+            business=self.vendor.business,
+            title=title,
+            description="Très bon état, garantie",
+            price=price,
+            category="Electromenager",
+            commune=commune,
+        )
+
+    def test_create_requires_a_predicate(self):
+        self.client.force_authenticate(self.buyer)
+
+        empty = self.client.post("/api/v2/saved-searches/", {"min_price_usd": "10"})
+        created = self.client.post("/api/v2/saved-searches/", {"keywords": "Frigo Samsung", "commune": "Gombe"})
+
+        self.assertEqual(empty.status_code, 400)
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(SavedSearch.objects.get(id=created.data["id"]).anchor, "kw:samsung")
+
+    def test_listing_matched_through_anchor_index(self):
+        match = SavedSearch.objects.create(user=self.buyer, keywords="frigo samsung", commune="gombe")
+        SavedSearch.objects.create(user=self.buyer, category="Electromenager", max_price_usd=50)
+        SavedSearch.objects.create(user=self.other, keywords="voiture")
+        SavedSearch.objects.create(user=self.vendor, keywords="frigo")
+        listing = self._listing("Frigo Samsung 300L")
+
+        with CaptureQueriesContext(connection) as queries:
+            matched = match_listing(listing)
+
+        self.assertEqual([search.id for search in matched], [match.id])
+        self.assertEqual(len(queries), 1)
+
+    @patch("core.utils.twilio_service.send_sms_bulk")
+    def test_alerts_batched_per_recipient(self, send_sms_bulk):
+        send_sms_bulk.return_value = [{"success": True}]
+        SavedSearch.objects.create(user=self.buyer, keywords="frigo")
+        SavedSearch.objects.create(user=self.buyer, commune="Limete")
+        first = self._listing("Frigo LG")
+        second = self._listing("Congélateur Hisense", commune="Limete")
+
+        self.assertEqual(queue_alerts(first), 1)
+        self.assertEqual(queue_alerts(second), 1)
+        self.assertEqual(send_pending_alerts(), 1)
+
+        (messages,), _ = send_sms_bulk.call_args
+        self.assertEqual(len(messages), 1)
+        phone, text = messages[0]
+        self.assertEqual(phone, self.buyer.phone_whatsapp)
+        self.assertIn("2 nouvelles annonces", text)
+        self.assertIn("Frigo LG", text)
+        self.assertIn("Congélateur Hisense", text)
+        self.assertEqual(send_pending_alerts(), 0)
+
+    @patch("core.utils.twilio_service.send_sms_bulk")
+    def test_failed_alerts_stay_queued(self, send_sms_bulk):
+        SavedSearch.objects.create(user=self.buyer, keywords="frigo")
+        SavedSearch.objects.create(user=self.other, keywords="frigo")
+        queue_alerts(self._listing("Frigo LG"))
+
+        send_sms_bulk.side_effect = lambda messages: [
+            {"success": phone == self.buyer.phone_whatsapp, "to": phone} for phone, _ in messages
+        ]
+        self.assertEqual(send_pending_alerts(), 1)
+
+        send_sms_bulk.side_effect = lambda messages: [{"success": True, "to": phone} for phone, _ in messages]
+        self.assertEqual(send_pending_alerts(), 1)
+        (messages,), _ = send_sms_bulk.call_args
+        self.assertEqual([phone for phone, _ in messages], [self.other.phone_whatsapp])
+        self.assertEqual(send_pending_alerts(), 0)
+
+
+class CatalogSyncTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.vendor = User.objects.create_user(phone_whatsapp="243899530506", password="testpassword123")
+        other = User.objects.create_user(phone_whatsapp="243811111111", password="testpassword123")
+        self.listings = [
+            Listing.objects.create(business=self.vendor.business, title=f"Annonce {i}", description="Neuf", price=10)
+            for i in range(3)
+        ]
+        Listing.objects.create(business=other.business, title="Autre boutique", description="Neuf", price=10)
+        self.client.force_authenticate(self.vendor)
+
+    def sync(self, **params):
+        return self.client.get("/api/v2/listings/sync/", params)
+
+    def test_full_sync_in_pages_then_delta(self):
+        first = self.sync(page_size=2)
+        second = self.sync(page_size=2, since=first.data["next"])
+        self.assertTrue(first.data["reset"])
+        self.assertTrue(first.data["has_more"])
+        self.assertFalse(second.data["has_more"])
+        self.assertEqual(
+            sorted(item["id"] for item in first.data["changed"] + second.data["changed"]),
+            [listing.id for listing in self.listings],
+        )
+
+        edited, deleted, _ = self.listings
+        edited.title = "Annonce modifiée"
+        edited.save()
+        deleted_id = deleted.id
+        deleted.delete()
+        delta = self.sync(since=second.data["next"])
+
+        self.assertFalse(delta.data["reset"])
+        self.assertEqual([item["title"] for item in delta.data["changed"]], ["Annonce modifiée"])
+        self.assertEqual(delta.data["deleted"], [deleted_id])
+        self.assertEqual(self.sync(since=delta.data["next"]).data["changed"], [])
+
+    def test_stale_or_invalid_token(self):
+        self.listings[0].delete()
+        stale = encode_token(timezone.now() - timedelta(days=31), timezone.now(), self.listings[1].id, 0)
+
+        response = self.sync(since=stale)
+
+        self.assertTrue(response.data["reset"])
+        self.assertEqual(response.data["deleted"], [])
+        self.assertEqual(len(response.data["changed"]), 2)
+        self.assertEqual(self.sync(since="pas-un-jeton").status_code, 400)
+
+    def test_purge_old_tombstones(self):
+        old_id, recent_id = self.listings[0].id, self.listings[1].id
+        self.listings[0].delete()
+        self.listings[1].delete()
+        ListingTombstone.objects.filter(listing_id=old_id).update(deleted_at=timezone.now() - timedelta(days=31))
+
+        self.assertEqual(purge_tombstones(), 1)
+        self.assertEqual(list(ListingTombstone.objects.values_list("listing_id", flat=True)), [recent_id])
+
+
+@patch("listing.services.change_feed.SETTLE_SECONDS", 0)
+class ChangeFeedTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.vendor = User.objects.create_user(phone_whatsapp="243899530506", password="testpassword123")
+        self.kept = self._listing("Frigo Samsung")
+        self.hidden = self._listing("Télévision LG")
+        self.checkpoint = self.changes().data["checkpoint"]
+
+    def _listing(self, title, **fields):
+        return Listing.objects.create(business=self.vendor.business, title=title, description="Neuf", price=10, **fields)
+
+    def changes(self, **params):
+        return self.client.get("/api/v2/public/listings/changes/", params)
+
+    def test_first_call_returns_head_checkpoint(self):
+        response = self.changes()
+
+        self.assertTrue(response.data["reset"])
+        self.assertEqual(response.data["checkpoint"], ListingChange.objects.latest("id").id)
+
+    def test_changes_since_checkpoint_are_compacted(self):
+        created = self._listing("Cuisinière")
+        created.price = 15
+        created.save()
+        self.kept.description = "Garantie 1 an"
+        self.kept.save()
+        hidden_id = self.hidden.id
+        self.hidden.delete()
+
+        response = self.changes(since=self.checkpoint)
+
+        self.assertFalse(response.data["reset"])
+        self.assertEqual(
+            [(change["id"], change["action"]) for change in response.data["changes"]],
+            [(created.id, "updated"), (hidden_id, "removed")],
+        )
+        self.assertEqual(response.data["changes"][0]["listing"]["price"], "15.00")
+        self.assertEqual(self.changes(since=response.data["checkpoint"]).data["changes"], [])
+
+    def test_image_removal_clears_list_and_card_caches(self):
+        ListingImage.objects.bulk_create([ListingImage(listing=self.kept, image="listings/frigo.jpg")])
+        cache.set("listings__page_1", {"results": []})
+        cache.set(card_cache_key(self.kept.id), {"id": self.kept.id})
+
+        ListingImage.objects.get(listing=self.kept).delete()
+
+        self.assertIsNone(cache.get("listings__page_1"))
+        self.assertIsNone(cache.get(card_cache_key(self.kept.id)))
+        changes = self.changes(since=self.checkpoint).data["changes"]
+        self.assertEqual([(change["id"], change["action"]) for change in changes], [(self.kept.id, "updated")])
+
+    def test_bounded_pages_and_invalid_checkpoint(self):
+        for title in ("Radio", "Ventilateur", "Lampe"):
+            self._listing(title)
+
+        first = self.changes(since=self.checkpoint, limit=2)
+        second = self.changes(since=first.data["checkpoint"], limit=2)
+
+        self.assertEqual(len(first.data["changes"]), 2)
+        self.assertTrue(first.data["has_more"])
+        self.assertEqual([change["listing"]["title"] for change in second.data["changes"]], ["Lampe"])
+        self.assertFalse(second.data["has_more"])
+        self.assertEqual(self.changes(since="hier").status_code, 400)
+
+    def test_checkpoint_older_than_retention_resets(self):
+        self._listing("Radio")
+        self._listing("Lampe")
+        ListingChange.objects.update(created_at=timezone.now() - timedelta(days=31))
+
+        # Le dernier changement est conservé : il borne les checkpoints encore valides
+        self.assertEqual(purge_changes(), 3)
+        self.assertTrue(self.changes(since=self.checkpoint).data["reset"])
+
+    def test_recent_changes_wait_to_settle(self):
+        self._listing("Radio")
+
+        with patch("listing.services.change_feed.SETTLE_SECONDS", 60):
+            response = self.changes(since=self.checkpoint)
+
+        self.assertEqual(response.data["changes"], [])
+        self.assertEqual(response.data["checkpoint"], self.checkpoint)
+
+
+class SitemapTest(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        settings_override = override_settings(PUBLISHED_FILES_ROOT=self.root, PUBLISHED_FILES_BASE_URL="https://api.test")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        vendor = User.objects.create_user(phone_whatsapp="243899530506", password="testpassword123", is_active=True)
+        self.business_shard = f"businesses-{vendor.business.id // 2 + 1}.xml.gz"
+        self.listings = [
+            # Ids fixés : avec shard_size=2, [11] -> listings-6, [12, 13] -> listings-7
+            Listing.objects.create(id=11 + i, business=vendor.business, title=f"Annonce {i}", description="Neuf", price=10)
+            for i in range(3)
+        ]
+
+    def read(self, name):
+        with open(os.path.join(self.root, "sitemaps", name), "rb") as sitemap:
+            data = sitemap.read()
+        return gzip.decompress(data).decode() if name.endswith(".gz") else data.decode()
+
+    def test_shards_written_once_and_regenerated_on_change(self):
+        self.assertEqual(build_sitemaps(shard_size=2), 3)
+        index = self.read("sitemap.xml")
+        first_shard = self.read("listings-6.xml.gz")
+        mtime = os.path.getmtime(os.path.join(self.root, "sitemaps", "listings-6.xml.gz"))
+
+        self.assertIn("<loc>https://api.test/published/sitemaps/listings-7.xml.gz</loc>", index)
+        self.assertIn(f"<loc>https://api.test/published/sitemaps/{self.business_shard}</loc>", index)
+        self.assertIn(f"/listing/{self.listings[0].slug}</loc><lastmod>", first_shard)
+        self.assertNotIn(self.listings[2].slug, first_shard)
+        self.assertEqual(build_sitemaps(shard_size=2), 0)
+
+        self.listings[2].title = "Annonce modifiée"
+        self.listings[2].save()
+        self.assertEqual(build_sitemaps(shard_size=2), 1)
+        self.assertEqual(os.path.getmtime(os.path.join(self.root, "sitemaps", "listings-6.xml.gz")), mtime)
+
+        # Plages d'ids fixes : supprimer une annonce ne décale pas les fichiers suivants
+        second_mtime = os.path.getmtime(os.path.join(self.root, "sitemaps", "listings-7.xml.gz"))
+        self.listings[0].delete()
+        self.assertEqual(build_sitemaps(shard_size=2), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "sitemaps", "listings-6.xml.gz")))
+        self.assertEqual(os.path.getmtime(os.path.join(self.root, "sitemaps", "listings-7.xml.gz")), second_mtime)
+        self.assertNotIn("listings-6.xml.gz", self.read("sitemap.xml"))
+
+    def test_files_served_without_restart(self):
+        build_sitemaps()
+        first = self.client.get("/published/sitemaps/sitemap.xml")
+        Listing.objects.all().delete()
+        build_sitemaps()
+        second = self.client.get("/published/sitemaps/sitemap.xml")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertIn(b"listings-1.xml.gz", b"".join(first.streaming_content))
+        self.assertNotIn(b"listings-1.xml.gz", b"".join(second.streaming_content))
+        self.assertEqual(self.client.get("/published/../manage.py").status_code, 404)
+
+
+@patch("listing.controllers.listingController.ListingPagination.page_size", 2)
+class FeedSnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        settings_override = override_settings(
+            PUBLISHED_FILES_ROOT=self.root,
+            PUBLISHED_FILES_BASE_URL="https://api.test",
+            ALLOWED_HOSTS=["api.test", "testserver"],
+            FEED_SNAPSHOT_PAGES=2,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.vendor = User.objects.create_user(phone_whatsapp="243899530506", password="testpassword123", is_active=True)
+        self.listings = [self._listing(f"Téléphone {i}", "Phones") for i in range(5)]
+        self.listings.append(self._listing("Canapé", "Maison"))
+
+    def _listing(self, title, category):
+        return Listing.objects.create(
+            business=self.vendor.business, title=title, description="Neuf", price=10, category=category,
+        )
+
+    def read(self, name):
+        with open(os.path.join(self.root, "feed", name)) as snapshot:
+            return json.load(snapshot)
+
+    def test_pages_rendered_with_static_links(self):
+        self.assertEqual(build_feed_snapshots(), 5)
+
+        first, second = self.read("all/page-1.json"), self.read("all/page-2.json")
+        index = self.read("index.json")
+        self.assertEqual(first["count"], 6)
+        self.assertEqual(first["next"], "https://api.test/published/feed/all/page-2.json")
+        self.assertEqual(second["previous"], "https://api.test/published/feed/all/page-1.json")
+        self.assertEqual(second["next"], "https://api.test/api/v2/public/listings/?page=3")
+        self.assertEqual(len(index["categories"]["Phones"]), 2)
+        self.assertEqual(len(index["categories"]["Maison"]), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.root, "feed", "all", "page-1.json.gz")))
+
+        Listing.objects.filter(category="Phones").delete()
+        build_feed_snapshots()
+        self.assertFalse(os.path.exists(os.path.join(self.root, "feed", "all", "page-2.json")))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "feed", "category", "phones")))
+
+    def test_pages_rendered_from_database_not_view_cache(self):
+        cache.set("listings_page=1_page_1", {"count": 0, "next": None, "previous": None, "results": []})
+
+        build_feed_snapshots()
+
+        self.assertEqual(self.read("all/page-1.json")["count"], 6)
+        self.assertEqual(cache.get("listings_page=1_page_1")["count"], 0)
+
+    def test_snapshot_served_precompressed(self):
+        build_feed_snapshots()
+
+        response = self.client.get("/published/feed/all/page-1.json", HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(b"".join(response.streaming_content)))["count"], 6)
+
+    def test_burst_of_edits_schedules_one_rebuild(self):
+        # Les créations du setUp ont déjà programmé une reconstruction
+        cache.clear()
+        with patch("listing.tasks.rebuild_feed_snapshots_task.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                for listing in self.listings[:3]:
+                    listing.price = 20
+                    listing.save()
+
+        apply_async.assert_called_once_with(countdown=30)
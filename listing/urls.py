@@ -1,16 +1,28 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .controllers.listingController import (
+    AutocompleteView,
+    ListingChangesView,
     ListingListView,
     ListingDetailView,
     ListingViewSet,
+    LocationTreeView,
+    SavedSearchViewSet,
+    SimilarListingsView,
+    TrendingListingsView,
 )
 
 router = DefaultRouter()
 router.register(r'listings', ListingViewSet, basename='listing')
+router.register(r'saved-searches', SavedSearchViewSet, basename='saved-search')
 
 urlpatterns = [
     path('public/listings/', ListingListView.as_view(), name='public-listings'),
+    path('public/listings/trending/', TrendingListingsView.as_view(), name='public-listings-trending'),
+    path('public/listings/autocomplete/', AutocompleteView.as_view(), name='public-listings-autocomplete'),
+    path('public/listings/changes/', ListingChangesView.as_view(), name='public-listing-changes'),
     path('public/listings/<slug:slug>/', ListingDetailView.as_view(), name='public-listing-detail'),
+    path('public/listings/<slug:slug>/similar/', SimilarListingsView.as_view(), name='public-listing-similar'),
+    path('public/locations/', LocationTreeView.as_view(), name='public-locations'),
     path('', include(router.urls)),
 ]